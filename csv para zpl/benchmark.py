@@ -0,0 +1,440 @@
+"""Medições de desempenho dos conversores CSV -> ZPL
+
+Gera catálogos sintéticos no formato do entrada.csv (cabeçalho com colunas
+extras, nomes entre aspas com vírgulas e aspas duplicadas, nomes longos,
+GTINs vazios e quantidade ímpar de linhas) e mede cada implementação num
+processo separado: linhas/s, pico de memória (RSS), bytes por etiqueta e
+tempo até o primeiro byte de saída. O resultado vai para um JSON, para
+comparar execuções e pegar regressões.
+
+Motores medidos:
+    main    conversor.converter_arquivo (o caminho usado por main.py e cli.py)
+    teste2  teste2.process_csv (ZPL_Generator)
+    ean13   gerar_etiquetas de etiquetas_ean13.py (o antigo csv.py)
+
+O subcomando partida mede o tempo de abrir o Python e chegar ao fim dos
+caminhos sem interface (cli.py --help e uma conversão pequena), que deve
+ficar abaixo de LIMITE_PARTIDA.
+
+Uso:
+    python benchmark.py motores --tamanhos 1001 100001 1000001 -o resultados.json
+    python benchmark.py motores --tamanhos 10000001 --motores main --dados /tmp/catalogos
+    python benchmark.py leitor --linhas 200000 --colunas 60
+    python benchmark.py registros --linhas 1000001
+    python benchmark.py partida --repeticoes 15
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from conversor import (CABECALHOS, ColunasRegistros, escrever_em_blocos, ler_registros,
+                       preparar_etiquetas)
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+
+TAMANHOS_PADRAO = (1001, 10001, 100001, 1000001)
+MOTORES = ("main", "teste2", "ean13")
+
+# Tempo máximo de cada medição; teste2 e etiquetas_ean13.py guardam tudo em memória
+TEMPO_LIMITE = 1800
+
+# Tempo máximo de partida dos caminhos sem interface, em segundos
+LIMITE_PARTIDA = 0.100
+
+# Módulos que o caminho sem interface não deve carregar
+MODULOS_PESADOS = ("tkinter", "PIL", "numpy", "barcode", "sqlite3")
+
+_PALAVRAS = (
+    "Cartucho Torneira Fita Espuma Dupla Face Conj Mangueira Trancada Premium "
+    "Verde Azul Color Neon Pop Blister Jardim Adaptador Registro Engate Rapido "
+    "Esguicho Regulavel Suporte Parede Kit Irrigacao Gotejamento"
+).split()
+
+
+def gerar_catalogo(caminho, linhas, semente=0, fracao_aspas=0.05, fracao_longos=0.02,
+                   fracao_sem_gtin=0.03):
+    """Grava um CSV com o formato do entrada.csv e devolve o caminho"""
+    aleatorio = random.Random(semente)
+    with open(caminho, 'w', encoding='utf-8', newline='') as arquivo:
+        arquivo.write("sku,local,gtin,nome,Nome,,,\r\n")
+        bloco = []
+        for i in range(linhas):
+            sku = str(20000 + i)
+            local = f"B{aleatorio.randint(1, 9)}{aleatorio.choice('ABCJP')}{aleatorio.randint(1, 9)}"
+            if aleatorio.random() < 0.05:
+                local += f" | B{aleatorio.randint(1, 9)}C{aleatorio.randint(1, 9)}"
+            gtin = "" if aleatorio.random() < fracao_sem_gtin else str(7890000000000 + i)
+
+            quantidade = 40 if aleatorio.random() < fracao_longos else aleatorio.randint(2, 6)
+            nome = " ".join(aleatorio.choice(_PALAVRAS) for _ in range(quantidade))
+            if aleatorio.random() < fracao_aspas:
+                # Como nas exportações reais: medida com aspas e vírgula decimal
+                nome = f'{nome} 3/4"" X 1,5Mm'
+                campo_nome = f'" {nome}"'
+                campo_composto = f'"{sku} | {nome}"'
+            else:
+                campo_nome = f" {nome}"
+                campo_composto = f"{sku} | {nome}"
+
+            bloco.append(f"{sku},{local},{gtin},{campo_nome},{campo_composto},{sku},{campo_nome},\r\n")
+            if len(bloco) == 10000:
+                arquivo.write("".join(bloco))
+                bloco.clear()
+        arquivo.write("".join(bloco))
+    return caminho
+
+
+class MedidorSaida:
+    """Arquivo de saída que anota o tempo até o primeiro write e conta os ^XZ"""
+
+    def __init__(self, caminho, inicio):
+        self.arquivo = open(caminho, 'w', encoding='utf-8')
+        self.inicio = inicio
+        self.primeiro_byte = None
+        self.etiquetas = 0
+        self._cauda = ""
+
+    def write(self, texto):
+        if self.primeiro_byte is None and texto:
+            self.primeiro_byte = time.perf_counter() - self.inicio
+        # A cauda cobre um ^XZ dividido entre dois writes
+        self.etiquetas += (self._cauda + texto).count("^XZ")
+        self._cauda = texto[-2:]
+        return self.arquivo.write(texto)
+
+    def close(self):
+        self.arquivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _motor_main(csv_path, saida):
+    with open(csv_path, 'r', encoding='utf-8') as file:
+        prefixo, etiquetas = preparar_etiquetas(file)
+        saida.write(prefixo)
+        escrever_em_blocos(etiquetas, saida)
+
+
+def _motor_teste2(csv_path, saida):
+    from teste2 import process_csv
+    saida.write(process_csv(csv_path))
+
+
+def _motor_ean13(csv_path, saida):
+    import etiquetas_ean13
+
+    def abrir(caminho, modo='r', *args, **kwargs):
+        # O CSV é lido normalmente; a escrita do .zpl vai para o medidor
+        return saida if 'w' in modo else open(caminho, modo, *args, **kwargs)
+
+    # Globais do módulo têm precedência sobre os builtins open e print
+    etiquetas_ean13.open = abrir
+    etiquetas_ean13.print = lambda *args, **kwargs: None
+    etiquetas_ean13.gerar_etiquetas(csv_path, None)
+
+
+_FUNCOES_MOTOR = {"main": _motor_main, "teste2": _motor_teste2, "ean13": _motor_ean13}
+
+
+def _pico_rss():
+    """Pico de memória residente do processo em bytes (None onde não há resource)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KiB, macOS em bytes
+    return pico if sys.platform == "darwin" else pico * 1024
+
+
+def medir_motor(motor, csv_path, saida_path):
+    """Roda um motor neste processo e devolve as medições"""
+    inicio = time.perf_counter()
+    with MedidorSaida(saida_path, inicio) as saida:
+        _FUNCOES_MOTOR[motor](csv_path, saida)
+    segundos = time.perf_counter() - inicio
+    bytes_saida = os.path.getsize(saida_path)
+    return {
+        "segundos": segundos,
+        "tempo_primeiro_byte": saida.primeiro_byte,
+        "pico_rss_bytes": _pico_rss(),
+        "bytes_saida": bytes_saida,
+        "etiquetas": saida.etiquetas,
+        "bytes_por_etiqueta": bytes_saida / saida.etiquetas if saida.etiquetas else None,
+    }
+
+
+def medir_em_processo(motor, csv_path, linhas, diretorio, tempo_limite=TEMPO_LIMITE):
+    """Mede um motor num processo novo, para que o pico de RSS seja só dele"""
+    saida_path = os.path.join(diretorio, f"{motor}_{linhas}.zpl")
+    resultado = {"motor": motor, "linhas": linhas, "bytes_entrada": os.path.getsize(csv_path)}
+    comando = [sys.executable, os.path.abspath(__file__), "_medir", motor, csv_path, saida_path]
+    try:
+        processo = subprocess.run(comando, cwd=DIRETORIO, capture_output=True, text=True,
+                                  timeout=tempo_limite)
+    except subprocess.TimeoutExpired:
+        resultado["erro"] = f"passou de {tempo_limite}s"
+        return resultado
+    finally:
+        if os.path.exists(saida_path):
+            os.remove(saida_path)
+
+    if processo.returncode != 0:
+        linhas_erro = processo.stderr.strip().splitlines()
+        resultado["erro"] = linhas_erro[-1] if linhas_erro else f"código {processo.returncode}"
+        return resultado
+    resultado.update(json.loads(processo.stdout.strip().splitlines()[-1]))
+    resultado["linhas_por_segundo"] = linhas / resultado["segundos"] if resultado["segundos"] > 0 else 0.0
+    return resultado
+
+
+def executar_motores(tamanhos, motores, diretorio_dados=None, semente=0, tempo_limite=TEMPO_LIMITE,
+                     progresso=None):
+    """Gera (ou reaproveita) os catálogos e mede cada motor em cada tamanho"""
+    temporario = None
+    if diretorio_dados is None:
+        temporario = tempfile.TemporaryDirectory()
+        diretorio_dados = temporario.name
+    os.makedirs(diretorio_dados, exist_ok=True)
+
+    resultados = []
+    try:
+        for linhas in tamanhos:
+            csv_path = os.path.join(diretorio_dados, f"catalogo_{linhas}_{semente}.csv")
+            if not os.path.exists(csv_path):
+                gerar_catalogo(csv_path, linhas, semente)
+            for motor in motores:
+                resultado = medir_em_processo(motor, csv_path, linhas, diretorio_dados, tempo_limite)
+                resultados.append(resultado)
+                if progresso is not None:
+                    progresso(resultado)
+    finally:
+        if temporario is not None:
+            temporario.cleanup()
+    return resultados
+
+
+def imprimir_resultado(resultado, saida=sys.stdout):
+    if "erro" in resultado:
+        print(f"{resultado['motor']:>7} {resultado['linhas']:>10}: ERRO {resultado['erro']}", file=saida)
+        return
+    rss = resultado["pico_rss_bytes"]
+    print(
+        f"{resultado['motor']:>7} {resultado['linhas']:>10}: "
+        f"{resultado['linhas_por_segundo']:>10.0f} linhas/s, "
+        f"pico {rss / 2**20 if rss else float('nan'):>8.1f} MiB, "
+        f"{resultado['bytes_por_etiqueta'] or 0:>6.1f} B/etiqueta, "
+        f"primeiro byte em {(resultado['tempo_primeiro_byte'] or 0) * 1000:.1f} ms",
+        file=saida
+    )
+
+
+def gerar_exportacao(caminho, linhas, colunas_extras=40, fracao_aspas=0.05, semente=0):
+    """Grava um CSV largo com as colunas do conversor espalhadas entre colunas extras"""
+    aleatorio = random.Random(semente)
+    extras = [f"extra_{i}" for i in range(colunas_extras)]
+    header = extras[:]
+    # As colunas úteis ficam no meio, como nas exportações do ERP
+    for posicao, nome in zip((3, 7, 12, 18), ("sku", "local", "gtin", "nome")):
+        header.insert(min(posicao, len(header)), nome)
+
+    with open(caminho, 'w', encoding='utf-8', newline='') as arquivo:
+        arquivo.write(",".join(header) + "\n")
+        for i in range(linhas):
+            valores = {
+                "sku": str(10000 + i),
+                "local": f"B{i % 9}C{i % 7}",
+                "gtin": str(7890000000000 + i),
+                "nome": f"Produto {i} descricao longa",
+            }
+            if aleatorio.random() < fracao_aspas:
+                valores["nome"] = f'"Produto {i}, 1/2"" x 10M"'
+            linha = [valores.get(coluna, str(aleatorio.randint(0, 99999))) for coluna in header]
+            arquivo.write(",".join(linha) + "\n")
+    return caminho
+
+
+def ler_por_split(linhas):
+    """Leitor antigo: divide a linha inteira por vírgula, sem tratar aspas"""
+    header = next(linhas).strip().split(',')
+    indices = [header.index(nome) for nome in CABECALHOS]
+    for line in linhas:
+        fields = line.strip().split(',')
+        if len(fields) < len(header):
+            continue
+        yield {nome: fields[i].strip() for nome, i in zip(CABECALHOS, indices)}
+
+
+def medir_leitor(leitor, caminho, repeticoes=3):
+    """Melhor tempo de leitura completa do arquivo; devolve (segundos, registros)"""
+    melhor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        with open(caminho, 'r', encoding='utf-8') as arquivo:
+            registros = sum(1 for _ in leitor(arquivo))
+        segundos = time.perf_counter() - inicio
+        melhor = segundos if melhor is None else min(melhor, segundos)
+    return melhor, registros
+
+
+def comparar_leitores(linhas, colunas, repeticoes):
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = gerar_exportacao(os.path.join(diretorio, "exportacao.csv"), linhas, colunas)
+        tamanho = os.path.getsize(caminho)
+        for nome, leitor in (("split", ler_por_split), ("ler_registros", ler_registros)):
+            segundos, registros = medir_leitor(leitor, caminho, repeticoes)
+            print(
+                f"{nome:>14}: {registros} registros em {segundos:.3f}s "
+                f"({linhas / segundos:.0f} linhas/s, {tamanho / segundos / 1e6:.1f} MB/s)"
+            )
+
+
+def _guardar_dicts(registros):
+    # Representação antiga: um dict por linha
+    return [dict(zip(CABECALHOS, registro)) for registro in registros]
+
+
+# Formas de guardar o arquivo inteiro em memória, comparadas por
+# comparar_registros
+ARMAZENAMENTOS = (
+    ("dict", _guardar_dicts),
+    ("Registro", list),
+    ("colunas", ColunasRegistros),
+)
+
+
+def medir_armazenamento(guardar, caminho):
+    """Carrega o CSV com guardar(registros); devolve (bytes retidos, segundos)
+
+    O tempo é medido numa carga sem o tracemalloc, que deixa a alocação
+    várias vezes mais lenta.
+    """
+    with open(caminho, 'r', encoding='utf-8') as arquivo:
+        linhas = arquivo.readlines()
+
+    inicio = time.perf_counter()
+    guardados = guardar(ler_registros(linhas))
+    segundos = time.perf_counter() - inicio
+    del guardados
+
+    tracemalloc.start()
+    try:
+        guardados = guardar(ler_registros(linhas))
+        retidos = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return retidos, segundos
+
+
+def comparar_registros(linhas, semente=0):
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = gerar_catalogo(os.path.join(diretorio, "catalogo.csv"), linhas, semente)
+        for nome, guardar in ARMAZENAMENTOS:
+            retidos, segundos = medir_armazenamento(guardar, caminho)
+            print(
+                f"{nome:>9}: {retidos / 1e6:8.1f} MB ({retidos / linhas:4.0f} bytes/linha), "
+                f"carga em {segundos:.3f}s ({linhas / segundos:.0f} linhas/s)"
+            )
+
+
+def medir_partida(repeticoes=11):
+    """Mediana do tempo de parede de cada caminho sem interface, num processo novo a cada vez"""
+    cli = os.path.join(DIRETORIO, "cli.py")
+    with tempfile.TemporaryDirectory() as diretorio:
+        csv_path = gerar_catalogo(os.path.join(diretorio, "partida.csv"), 101)
+        comandos = {
+            "python": [sys.executable, "-c", "pass"],
+            "cli.py --help": [sys.executable, cli, "--help"],
+            "cli.py (conversão)": [sys.executable, cli, csv_path, "-o", diretorio],
+        }
+        tempos = {}
+        for nome, comando in comandos.items():
+            medidas = []
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                subprocess.run(comando, stdout=subprocess.DEVNULL, check=True, cwd=DIRETORIO)
+                medidas.append(time.perf_counter() - inicio)
+            tempos[nome] = sorted(medidas)[len(medidas) // 2]
+
+    verificacao = ("import sys, cli, conversor; "
+                   f"print(','.join(m for m in {MODULOS_PESADOS!r} if m in sys.modules))")
+    carregados = subprocess.run([sys.executable, "-c", verificacao], capture_output=True, text=True,
+                                check=True, cwd=DIRETORIO).stdout.strip()
+    return tempos, [m for m in carregados.split(",") if m]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Medições de desempenho dos conversores CSV -> ZPL")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    motores = comandos.add_parser("motores", help="mede main.py, teste2.py e etiquetas_ean13.py em catálogos sintéticos")
+    motores.add_argument("--tamanhos", type=int, nargs="+", default=list(TAMANHOS_PADRAO),
+                         help="quantidade de linhas de cada catálogo")
+    motores.add_argument("--motores", nargs="+", choices=MOTORES, default=list(MOTORES))
+    motores.add_argument("--dados", help="diretório onde os catálogos são gerados e reaproveitados")
+    motores.add_argument("--semente", type=int, default=0)
+    motores.add_argument("--tempo-limite", type=int, default=TEMPO_LIMITE,
+                         help="segundos máximos de cada medição")
+    motores.add_argument("-o", "--saida", default="benchmark.json", help="arquivo JSON com os resultados")
+
+    leitor = comandos.add_parser("leitor", help="compara ler_registros com a divisão por vírgula")
+    leitor.add_argument("--linhas", type=int, default=200000)
+    leitor.add_argument("--colunas", type=int, default=40, help="colunas extras na exportação")
+    leitor.add_argument("--repeticoes", type=int, default=3)
+
+    registros = comandos.add_parser("registros",
+                                    help="compara a memória de dicts, Registro e ColunasRegistros")
+    registros.add_argument("--linhas", type=int, default=1000001)
+    registros.add_argument("--semente", type=int, default=0)
+
+    partida = comandos.add_parser("partida", help="mede o tempo de partida do caminho sem interface")
+    partida.add_argument("--repeticoes", type=int, default=11)
+
+    # Uso interno: uma medição isolada, executada num processo filho
+    medir = comandos.add_parser("_medir")
+    medir.add_argument("motor", choices=MOTORES)
+    medir.add_argument("csv_path")
+    medir.add_argument("saida_path")
+
+    args = parser.parse_args(argv)
+
+    if args.comando == "_medir":
+        print(json.dumps(medir_motor(args.motor, args.csv_path, args.saida_path)))
+    elif args.comando == "leitor":
+        comparar_leitores(args.linhas, args.colunas, args.repeticoes)
+    elif args.comando == "registros":
+        comparar_registros(args.linhas, args.semente)
+    elif args.comando == "partida":
+        tempos, carregados = medir_partida(args.repeticoes)
+        for nome, segundos in tempos.items():
+            acima = nome != "python" and segundos > LIMITE_PARTIDA
+            print(f"{nome:>20}: {segundos * 1000:6.1f} ms" + ("  ACIMA DO LIMITE" if acima else ""))
+        print(f"limite: {LIMITE_PARTIDA * 1000:.0f} ms; módulos pesados carregados por cli.py: "
+              + (", ".join(carregados) if carregados else "nenhum"))
+    else:
+        resultados = executar_motores(args.tamanhos, args.motores, args.dados, args.semente,
+                                      args.tempo_limite, progresso=imprimir_resultado)
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump({
+                "data": datetime.datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "plataforma": platform.platform(),
+                "resultados": resultados,
+            }, arquivo, ensure_ascii=False, indent=2)
+        print(f"resultados gravados em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Cache em disco das imagens de código de barras, endereçado pelo conteúdo
+
+A chave é o hash de simbologia + dados + opções do writer, então o mesmo
+GTIN com as mesmas opções é desenhado uma vez só, em qualquer execução.
+O tamanho total é limitado com remoção LRU (o acesso atualiza o mtime do
+arquivo) e os códigos que faltam num lote são desenhados num pool de
+processos.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+DIRETORIO_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache_codigos")
+
+# Limite de espaço em disco do cache
+LIMITE_PADRAO = 200 * 1024 * 1024
+
+# Opções efetivas usadas historicamente em csv.gerar_codigo_barras
+OPCOES_PADRAO = {"text": False, "text_distance": 0, "font_size": 0}
+
+# Faixa inferior da imagem apagada depois do render (onde o texto aparecia)
+MARGEM_TEXTO = 40
+
+
+def chave_codigo(simbologia, dados, opcoes):
+    conteudo = json.dumps([simbologia, str(dados), opcoes], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+def renderizar_codigo(simbologia, dados, opcoes, destino):
+    """Desenha o código de barras e grava o PNG em destino de forma atômica"""
+    import barcode
+    from barcode.writer import ImageWriter
+    from PIL import ImageDraw
+
+    classe = barcode.get_barcode_class(simbologia)
+    imagem = classe(str(dados), writer=ImageWriter()).render(writer_options=dict(opcoes))
+
+    # Apaga a área onde o texto ainda aparece em algumas versões do writer
+    largura, altura = imagem.size
+    ImageDraw.Draw(imagem).rectangle([0, altura - MARGEM_TEXTO, largura, altura], fill=(255, 255, 255))
+
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    descritor, temporario = tempfile.mkstemp(suffix=".png", dir=os.path.dirname(destino))
+    try:
+        with os.fdopen(descritor, 'wb') as arquivo:
+            imagem.save(arquivo, format="PNG")
+        os.replace(temporario, destino)
+    except BaseException:
+        os.unlink(temporario)
+        raise
+    return destino
+
+
+def _renderizar_tarefa(tarefa):
+    return renderizar_codigo(*tarefa)
+
+
+class CacheCodigos:
+    """Cache LRU de PNGs de código de barras em um diretório"""
+
+    def __init__(self, diretorio=DIRETORIO_PADRAO, limite_bytes=LIMITE_PADRAO):
+        self.diretorio = diretorio
+        self.limite_bytes = limite_bytes
+        self.acertos = 0
+        self.faltas = 0
+        self._tamanho = None
+
+    def caminho(self, simbologia, dados, opcoes=None):
+        chave = chave_codigo(simbologia, dados, OPCOES_PADRAO if opcoes is None else opcoes)
+        return os.path.join(self.diretorio, chave[:2], chave + ".png")
+
+    def obter(self, simbologia, dados, opcoes=None):
+        """Devolve o caminho do PNG, desenhando só se ainda não estiver no cache"""
+        return self.obter_lote(simbologia, [dados], opcoes, processos=1)[str(dados)]
+
+    def obter_lote(self, simbologia, lista_dados, opcoes=None, processos=None):
+        """Devolve {dados: caminho} para todos os dados; as faltas são desenhadas em paralelo"""
+        opcoes = OPCOES_PADRAO if opcoes is None else opcoes
+        resultado = {}
+        faltando = []
+        for dados in dict.fromkeys(str(d) for d in lista_dados):
+            caminho = self.caminho(simbologia, dados, opcoes)
+            resultado[dados] = caminho
+            try:
+                # Marca como usado recentemente para o LRU
+                os.utime(caminho)
+                self.acertos += 1
+            except FileNotFoundError:
+                faltando.append((simbologia, dados, opcoes, caminho))
+
+        self.faltas += len(faltando)
+        if len(faltando) == 1 or processos == 1:
+            criados = [_renderizar_tarefa(tarefa) for tarefa in faltando]
+        elif faltando:
+            with ProcessPoolExecutor(max_workers=processos) as pool:
+                criados = list(pool.map(_renderizar_tarefa, faltando, chunksize=16))
+        else:
+            criados = []
+
+        if criados:
+            self._somar(sum(os.path.getsize(caminho) for caminho in criados))
+            self.remover_excesso(manter=set(resultado.values()))
+        return resultado
+
+    def tamanho(self):
+        if self._tamanho is None:
+            self._tamanho = sum(tamanho for _, _, tamanho in self._arquivos())
+        return self._tamanho
+
+    def remover_excesso(self, manter=()):
+        """Apaga os arquivos usados há mais tempo até o cache caber no limite"""
+        if self.tamanho() <= self.limite_bytes:
+            return 0
+        removidos = 0
+        for _, caminho, tamanho in sorted(self._arquivos()):
+            if self._tamanho <= self.limite_bytes:
+                break
+            if caminho in manter:
+                continue
+            try:
+                os.unlink(caminho)
+            except FileNotFoundError:
+                continue
+            self._tamanho -= tamanho
+            removidos += 1
+        return removidos
+
+    def _somar(self, tamanho):
+        if self._tamanho is not None:
+            self._tamanho += tamanho
+
+    def _arquivos(self):
+        """(mtime, caminho, tamanho) de cada PNG do cache"""
+        if not os.path.isdir(self.diretorio):
+            return
+        for subdiretorio in os.scandir(self.diretorio):
+            if not subdiretorio.is_dir():
+                continue
+            for entrada in os.scandir(subdiretorio.path):
+                if entrada.name.endswith(".png"):
+                    info = entrada.stat()
+                    yield info.st_mtime, entrada.path, info.st_size
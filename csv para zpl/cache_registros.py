@@ -0,0 +1,260 @@
+"""Cache em disco dos registros já lidos de um CSV
+
+Quem reconverte o mesmo entrada.csv várias vezes (ajustando o layout, por
+exemplo) não precisa ler e dividir o texto de novo: os registros lidos
+ficam num instantâneo binário (blocos de colunas em marshal) e as
+execuções seguintes carregam o instantâneo direto.
+
+O instantâneo é endereçado pelo hash do conteúdo do CSV. Para não ler o
+arquivo inteiro a cada consulta, um ponteiro por caminho guarda tamanho,
+mtime e hash da última vez: se tamanho e mtime não mudaram, o hash é
+reaproveitado; se mudaram, o conteúdo é lido de novo e um arquivo só
+tocado (ou copiado) continua achando o mesmo instantâneo. O tamanho total
+é limitado com remoção LRU, como em cache_codigos.py; os ponteiros para
+instantâneos que saíram do cache são apagados junto, senão uma pasta que
+recebe um CSV novo por dia acumularia um ponteiro por arquivo para sempre.
+"""
+import hashlib
+import json
+import marshal
+import os
+import sys
+import tempfile
+from contextlib import closing
+from functools import partial
+
+from conversor import Registro, ler_arquivo
+
+DIRETORIO_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache_registros")
+
+# Limite de espaço em disco dos instantâneos
+LIMITE_PADRAO = 100 * 1024 * 1024
+
+# Registros por bloco do instantâneo; é o que fica na memória ao gravar e ao ler
+REGISTROS_POR_BLOCO = 4096
+
+# Muda sempre que a leitura do CSV (ler_registros) passar a gerar registros
+# diferentes, para que os instantâneos antigos deixem de valer. O formato do
+# marshal depende da versão do Python, que também entra no cabeçalho.
+VERSAO = 1
+_CABECALHO = f"ZPLREG{VERSAO}:{sys.implementation.cache_tag}\n".encode('ascii')
+
+_TAMANHO_LEITURA = 1024 * 1024
+
+SEPARADOR = "\0"
+
+
+def hash_arquivo(caminho):
+    resumo = hashlib.blake2b(digest_size=16)
+    with open(caminho, 'rb') as arquivo:
+        while bloco := arquivo.read(_TAMANHO_LEITURA):
+            resumo.update(bloco)
+    return resumo.hexdigest()
+
+
+def _abrir_instantaneo(caminho):
+    """Arquivo do instantâneo posicionado depois do cabeçalho, ou None se não servir"""
+    try:
+        arquivo = open(caminho, 'rb')
+    except FileNotFoundError:
+        return None
+    if arquivo.read(len(_CABECALHO)) != _CABECALHO:
+        arquivo.close()
+        return None
+    return arquivo
+
+
+class CacheRegistros:
+    """Cache LRU de instantâneos de registros em um diretório"""
+
+    def __init__(self, diretorio=DIRETORIO_PADRAO, limite_bytes=LIMITE_PADRAO):
+        self.diretorio = diretorio
+        self.limite_bytes = limite_bytes
+        self.acertos = 0
+        self.faltas = 0
+
+    def caminho(self, hash_conteudo):
+        return os.path.join(self.diretorio, hash_conteudo + ".reg")
+
+    def _caminho_ponteiro(self, csv_path):
+        chave = hashlib.sha256(os.path.realpath(csv_path).encode('utf-8')).hexdigest()
+        return os.path.join(self.diretorio, "ponteiros", chave + ".json")
+
+    def hash_conteudo(self, csv_path):
+        """Hash do conteúdo do CSV, lido de novo só se tamanho ou mtime mudaram"""
+        info = os.stat(csv_path)
+        assinatura = [info.st_size, info.st_mtime_ns]
+        ponteiro = self._caminho_ponteiro(csv_path)
+        try:
+            with open(ponteiro, 'r', encoding='utf-8') as arquivo:
+                salvo = json.load(arquivo)
+            if salvo[:2] == assinatura:
+                return salvo[2]
+        except (FileNotFoundError, ValueError, IndexError):
+            pass
+
+        hash_conteudo = hash_arquivo(csv_path)
+        os.makedirs(os.path.dirname(ponteiro), exist_ok=True)
+        _gravar_atomico(ponteiro, json.dumps(assinatura + [hash_conteudo]).encode('utf-8'))
+        return hash_conteudo
+
+    def registros(self, csv_path, estatisticas=None):
+        """Gera os registros do CSV como ler_registros, usando o instantâneo quando existir
+
+        As estatísticas da leitura (linhas, ignoradas, motivos) são as da
+        leitura original e ficam completas quando o gerador termina. Numa
+        falta o CSV é lido normalmente e o instantâneo é gravado ao longo
+        da leitura; ele só passa a valer se a leitura for até o fim.
+        """
+        if estatisticas is None:
+            estatisticas = {}
+        hash_conteudo = self.hash_conteudo(csv_path)
+        caminho = self.caminho(hash_conteudo)
+        arquivo = _abrir_instantaneo(caminho)
+        if arquivo is None:
+            self.faltas += 1
+            estatisticas["cache_registros"] = "falta"
+            yield from self._ler_e_gravar(csv_path, caminho, estatisticas)
+            self.remover_excesso(manter={caminho})
+            return
+
+        self.acertos += 1
+        estatisticas["cache_registros"] = "acerto"
+        with arquivo:
+            # Marca como usado recentemente para o LRU
+            os.utime(caminho)
+            montar = partial(tuple.__new__, Registro)
+            while True:
+                objeto = _ler_objeto(arquivo)
+                if isinstance(objeto, dict):
+                    break
+                yield from map(montar, zip(*_colunas_do_bloco(objeto)))
+        _somar_leitura(estatisticas, objeto)
+
+    def _ler_e_gravar(self, csv_path, caminho, estatisticas):
+        os.makedirs(self.diretorio, exist_ok=True)
+        leitura = {}
+        descritor, temporario = tempfile.mkstemp(suffix=".tmp", dir=self.diretorio)
+        try:
+            with os.fdopen(descritor, 'wb') as saida, \
+                    closing(ler_arquivo(csv_path, leitura)) as registros:
+                saida.write(_CABECALHO)
+                colunas = ([], [], [], [])
+                for registro in registros:
+                    for coluna, valor in zip(colunas, registro):
+                        coluna.append(valor)
+                    if len(colunas[0]) == REGISTROS_POR_BLOCO:
+                        _gravar_bloco(saida, colunas)
+                    yield registro
+                if colunas[0]:
+                    _gravar_bloco(saida, colunas)
+                _gravar_objeto(saida, leitura)
+            os.replace(temporario, caminho)
+        except BaseException:
+            os.unlink(temporario)
+            raise
+        finally:
+            _somar_leitura(estatisticas, leitura)
+
+    def tamanho(self):
+        return sum(tamanho for _, _, tamanho in self._arquivos())
+
+    def remover_excesso(self, manter=()):
+        """Apaga os instantâneos usados há mais tempo até o cache caber no limite
+
+        Depois apaga os ponteiros cujo instantâneo não existe mais.
+        """
+        arquivos = sorted(self._arquivos())
+        total = sum(tamanho for _, _, tamanho in arquivos)
+        removidos = 0
+        for _, caminho, tamanho in arquivos:
+            if total <= self.limite_bytes:
+                break
+            if caminho in manter:
+                continue
+            try:
+                os.unlink(caminho)
+            except FileNotFoundError:
+                continue
+            total -= tamanho
+            removidos += 1
+        self._remover_ponteiros_orfaos()
+        return removidos
+
+    def _remover_ponteiros_orfaos(self):
+        diretorio = os.path.join(self.diretorio, "ponteiros")
+        if not os.path.isdir(diretorio):
+            return
+        for entrada in os.scandir(diretorio):
+            if not entrada.name.endswith(".json"):
+                continue
+            try:
+                with open(entrada.path, 'r', encoding='utf-8') as arquivo:
+                    hash_conteudo = json.load(arquivo)[2]
+                if os.path.exists(self.caminho(hash_conteudo)):
+                    continue
+            except FileNotFoundError:
+                continue
+            except (ValueError, IndexError, TypeError):
+                pass
+            try:
+                os.unlink(entrada.path)
+            except FileNotFoundError:
+                pass
+
+    def _arquivos(self):
+        """(mtime, caminho, tamanho) de cada instantâneo do cache"""
+        if not os.path.isdir(self.diretorio):
+            return
+        for entrada in os.scandir(self.diretorio):
+            if entrada.name.endswith(".reg"):
+                info = entrada.stat()
+                yield info.st_mtime, entrada.path, info.st_size
+
+
+def _somar_leitura(estatisticas, leitura):
+    for nome in ("linhas", "ignoradas"):
+        estatisticas[nome] = estatisticas.get(nome, 0) + leitura.get(nome, 0)
+    motivos = estatisticas.setdefault("motivos", {})
+    for motivo, quantidade in leitura.get("motivos", {}).items():
+        motivos[motivo] = motivos.get(motivo, 0) + quantidade
+
+
+def _gravar_objeto(saida, objeto):
+    dados = marshal.dumps(objeto)
+    saida.write(len(dados).to_bytes(4, 'little'))
+    saida.write(dados)
+
+
+def _ler_objeto(arquivo):
+    # Um read por objeto: marshal.load direto no arquivo faz leituras
+    # pequenas demais e fica mais lento que ler o CSV de novo
+    tamanho = int.from_bytes(arquivo.read(4), 'little')
+    return marshal.loads(arquivo.read(tamanho))
+
+
+def _gravar_bloco(saida, colunas):
+    bloco = []
+    for coluna in colunas:
+        # Cada coluna vira uma string só, separada por \0: o split na volta
+        # é bem mais rápido que o marshal montar uma string por valor. Uma
+        # coluna com \0 dentro de algum valor vai como lista mesmo.
+        texto = SEPARADOR.join(coluna)
+        bloco.append(texto if texto.count(SEPARADOR) == len(coluna) - 1 else list(coluna))
+        coluna.clear()
+    _gravar_objeto(saida, tuple(bloco))
+
+
+def _colunas_do_bloco(bloco):
+    return [coluna.split(SEPARADOR) if isinstance(coluna, str) else coluna for coluna in bloco]
+
+
+def _gravar_atomico(caminho, dados):
+    descritor, temporario = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(caminho))
+    try:
+        with os.fdopen(descritor, 'wb') as arquivo:
+            arquivo.write(dados)
+        os.replace(temporario, caminho)
+    except BaseException:
+        os.unlink(temporario)
+        raise
@@ -0,0 +1,187 @@
+"""Catálogo de produtos em SQLite para imprimir a partir só do SKU ou da localização
+
+Uma exportação completa do catálogo (no formato do entrada.csv) é
+importada uma vez para um banco SQLite local com índices em sku e local.
+Depois basta uma lista de SKUs (ou de localizações), um por linha: nome,
+local e gtin vêm do banco, buscados em lotes com IN (...) pelo índice, e
+as etiquetas saem pelo mesmo caminho do conversor.
+
+Uso:
+    python catalogo.py importar entrada.csv --banco catalogo.db
+    python catalogo.py gerar skus.txt -o reimpressao.zpl --banco catalogo.db
+    python catalogo.py gerar locais.txt -o corredor_b2.zpl --por local
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from contextlib import closing
+from itertools import chain
+
+from conversor import (TAMANHO_BUFFER, Registro, escrever_em_blocos, formato_armazenado,
+                       gerar_etiquetas, ler_arquivo)
+
+BANCO_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalogo.db")
+
+# Códigos por consulta; abaixo do limite de parâmetros do SQLite (999 nas
+# versões antigas)
+CODIGOS_POR_CONSULTA = 500
+
+CAMPOS_BUSCA = ("sku", "local")
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS produtos (
+    ordem INTEGER PRIMARY KEY,
+    nome TEXT NOT NULL,
+    local TEXT NOT NULL,
+    sku TEXT NOT NULL,
+    gtin TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS produtos_sku ON produtos (sku);
+CREATE INDEX IF NOT EXISTS produtos_local ON produtos (local);
+"""
+
+
+def abrir_catalogo(banco_path=BANCO_PADRAO):
+    conexao = sqlite3.connect(banco_path)
+    conexao.executescript(_ESQUEMA)
+    return conexao
+
+
+def importar_catalogo(csv_path, banco_path=BANCO_PADRAO):
+    """Substitui o catálogo do banco pelo conteúdo do CSV e retorna as estatísticas"""
+    estatisticas = {"arquivo": csv_path, "saida": banco_path}
+    inicio = time.perf_counter()
+    with closing(ler_arquivo(csv_path, estatisticas)) as registros:
+        # Lê o cabeçalho antes de apagar o catálogo atual
+        primeiro = next(registros, None)
+        conexao = abrir_catalogo(banco_path)
+        try:
+            with conexao:
+                conexao.execute("DELETE FROM produtos")
+                if primeiro is not None:
+                    conexao.execute("INSERT INTO produtos (nome, local, sku, gtin) VALUES (?, ?, ?, ?)",
+                                    primeiro)
+                conexao.executemany("INSERT INTO produtos (nome, local, sku, gtin) VALUES (?, ?, ?, ?)",
+                                    registros)
+            conexao.execute("ANALYZE")
+        finally:
+            conexao.close()
+    estatisticas["segundos"] = time.perf_counter() - inicio
+    return estatisticas
+
+
+def ler_codigos(linhas):
+    """Códigos de uma lista com um por linha; linhas vazias e # comentários são ignorados"""
+    for linha in linhas:
+        codigo = linha.split("#", 1)[0].strip()
+        if codigo:
+            yield codigo
+
+
+def buscar_registros(conexao, codigos, campo="sku", estatisticas=None):
+    """Gera os registros do catálogo para cada código, na ordem pedida
+
+    Um SKU em várias localizações gera um registro por localização; uma
+    localização gera todos os produtos dela, na ordem do catálogo. Códigos
+    repetidos saem repetidos. Os não encontrados são contados em
+    estatisticas["motivos"]["nao_encontrado"].
+    """
+    if campo not in CAMPOS_BUSCA:
+        raise ValueError(f"busca por {campo!r}: use um de {', '.join(CAMPOS_BUSCA)}")
+    if estatisticas is None:
+        estatisticas = {}
+    estatisticas.setdefault("linhas", 0)
+    estatisticas.setdefault("ignoradas", 0)
+    motivos = estatisticas.setdefault("motivos", {})
+
+    codigos = iter(codigos)
+    while True:
+        lote = [codigo for _, codigo in zip(range(CODIGOS_POR_CONSULTA), codigos)]
+        if not lote:
+            return
+        unicos = list(dict.fromkeys(lote))
+        marcadores = ",".join("?" * len(unicos))
+        encontrados = {}
+        consulta = (f"SELECT nome, local, sku, gtin FROM produtos "
+                    f"WHERE {campo} IN ({marcadores}) ORDER BY ordem")
+        for linha in conexao.execute(consulta, unicos):
+            registro = Registro._make(linha)
+            encontrados.setdefault(getattr(registro, campo), []).append(registro)
+
+        for codigo in lote:
+            registros = encontrados.get(codigo)
+            if registros is None:
+                estatisticas["ignoradas"] += 1
+                motivos["nao_encontrado"] = motivos.get("nao_encontrado", 0) + 1
+                continue
+            estatisticas["linhas"] += len(registros)
+            yield from registros
+
+
+def converter_lista(lista_path, output_path, banco_path=BANCO_PADRAO, campo="sku",
+                    tamanho_buffer=TAMANHO_BUFFER, armazenado=False, agrupar=False):
+    """Gera o ZPL de uma lista de SKUs (ou localizações) usando o catálogo"""
+    if not os.path.exists(banco_path):
+        raise ValueError(f"catálogo não encontrado: {banco_path} (use 'importar' antes)")
+    estatisticas = {"arquivo": lista_path, "saida": output_path, "etiquetas": 0}
+    inicio = time.perf_counter()
+
+    conexao = sqlite3.connect(banco_path)
+    try:
+        with open(lista_path, 'r', encoding='utf-8-sig') as file:
+            registros = buscar_registros(conexao, ler_codigos(file), campo, estatisticas)
+            primeiro = next(registros, None)
+            with open(output_path, 'w', encoding='utf-8') as out_file:
+                if primeiro is not None:
+                    out_file.write(formato_armazenado() if armazenado else "")
+                    etiquetas = gerar_etiquetas(chain([primeiro], registros), armazenado, agrupar)
+                    escrever_em_blocos(etiquetas, out_file, tamanho_buffer, estatisticas)
+    finally:
+        conexao.close()
+
+    estatisticas["bytes"] = os.path.getsize(output_path)
+    estatisticas["segundos"] = time.perf_counter() - inicio
+    return estatisticas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Catálogo de produtos para imprimir a partir do SKU")
+    parser.add_argument("--banco", default=BANCO_PADRAO, help="arquivo SQLite do catálogo")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    importar = comandos.add_parser("importar", help="carrega uma exportação completa do catálogo")
+    importar.add_argument("csv_path")
+
+    gerar = comandos.add_parser("gerar", help="gera as etiquetas de uma lista de SKUs ou localizações")
+    gerar.add_argument("lista", help="arquivo com um código por linha")
+    gerar.add_argument("-o", "--saida", required=True, help="arquivo .zpl de saída")
+    gerar.add_argument("--por", choices=CAMPOS_BUSCA, default="sku",
+                       help="o que a lista contém (padrão: sku)")
+    gerar.add_argument("--formato-armazenado", action="store_true",
+                       help="grava o layout na impressora (^DF) e envia só os campos (^XF/^FN)")
+    gerar.add_argument("--agrupar-repetidas", action="store_true",
+                       help="etiquetas idênticas em sequência saem num único bloco com ^PQ")
+
+    args = parser.parse_args(argv)
+    try:
+        if args.comando == "importar":
+            estatisticas = importar_catalogo(args.csv_path, args.banco)
+            print(f"{estatisticas['linhas']} produtos importados em {estatisticas['segundos']:.2f}s "
+                  f"({estatisticas['ignoradas']} linhas ignoradas)")
+        else:
+            estatisticas = converter_lista(args.lista, args.saida, args.banco, args.por,
+                                           armazenado=args.formato_armazenado,
+                                           agrupar=args.agrupar_repetidas)
+            print(f"{estatisticas['etiquetas']} etiquetas geradas em {estatisticas['segundos']:.3f}s"
+                  + (f" ({estatisticas['ignoradas']} códigos não encontrados)"
+                     if estatisticas["ignoradas"] else ""))
+    except (OSError, ValueError, sqlite3.Error) as erro:
+        print(f"Erro: {erro}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
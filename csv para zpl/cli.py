@@ -0,0 +1,290 @@
+"""Conversão CSV -> ZPL sem interface gráfica, em lote
+
+Exemplos:
+    python cli.py entrada.csv -o dist
+    python cli.py "exportacoes/*.csv" pasta_csv -o dist -j 8 --resumo dist/resumo.json
+    python cli.py entrada.csv --impressora 192.168.0.50 --impressora 192.168.0.51:9100
+    python cli.py entrada.csv --impressora 192.168.0.50 --impressora 192.168.0.51 --dividir
+    python cli.py exportacao_gigante.csv -o dist --paralelo -j 16
+    python cli.py catalogo.parquet planilha.xlsx -o dist
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from functools import partial
+
+from conversor import converter_arquivo
+
+# Mesmo valor de cache_registros.DIRETORIO_PADRAO; o módulo só é importado
+# quando o cache é usado, para a partida continuar leve
+DIRETORIO_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache_registros")
+
+
+def expandir_entradas(entradas):
+    """Expande arquivos, globs e diretórios numa lista ordenada de entradas, sem repetições
+
+    De um diretório entram os CSVs e os arquivos Parquet, Arrow e XLSX
+    (ver colunar.py).
+    """
+    from colunar import EXTENSOES
+    arquivos = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            candidatos = glob.glob(os.path.join(glob.escape(entrada), "*"))
+            encontrados = sorted(caminho for caminho in candidatos
+                                 if caminho.lower().endswith((".csv",) + EXTENSOES))
+        elif glob.has_magic(entrada):
+            encontrados = sorted(glob.glob(entrada))
+        else:
+            encontrados = [entrada]
+        for caminho in encontrados:
+            if caminho not in arquivos:
+                arquivos.append(caminho)
+    return arquivos
+
+
+def caminho_saida(csv_path, output_dir):
+    nome = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(output_dir, nome + ".zpl")
+
+
+def converter_um(tarefa, **opcoes):
+    """Converte um arquivo; erros viram uma entrada no resumo em vez de derrubar o lote"""
+    csv_path, output_path = tarefa
+    inicio = time.perf_counter()
+    diretorio_indice = opcoes.pop("diretorio_indice", None)
+    incluir_removidos = opcoes.pop("incluir_removidos", False)
+    validar_gtin = opcoes.pop("validar_gtin", False)
+    paralelo = opcoes.pop("paralelo", None)
+    diretorio_cache = opcoes.pop("diretorio_cache", None)
+    if diretorio_cache:
+        from cache_registros import CacheRegistros
+        opcoes["cache"] = CacheRegistros(diretorio_cache)
+    if opcoes.pop("instrumentar", False):
+        from instrumentacao import Instrumentacao
+        opcoes["instrumentacao"] = Instrumentacao()
+    try:
+        converter = converter_arquivo
+        if paralelo:
+            from paralelo import converter_paralelo
+            converter = partial(converter_paralelo, processos=paralelo)
+        if diretorio_indice:
+            from incremental import converter_incremental
+            converter = partial(converter_incremental, diretorio_indice=diretorio_indice,
+                                incluir_removidos=incluir_removidos)
+        if validar_gtin:
+            from validacao import converter_validado
+            return converter_validado(csv_path, output_path, converter=converter, **opcoes)
+        return converter(csv_path, output_path, **opcoes)
+    except (OSError, ValueError) as erro:
+        return {
+            "arquivo": csv_path,
+            "saida": output_path,
+            "erro": str(erro),
+            "segundos": time.perf_counter() - inicio,
+        }
+
+
+def converter_lote(arquivos, output_dir, processos=None, **opcoes):
+    """Converte vários CSVs em paralelo e retorna o resumo de cada arquivo, na ordem de entrada
+
+    As opções extras são repassadas para converter_arquivo.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    tarefas = [(csv_path, caminho_saida(csv_path, output_dir)) for csv_path in arquivos]
+    converter = partial(converter_um, **opcoes)
+
+    if processos == 1 or len(tarefas) <= 1:
+        return [converter(tarefa) for tarefa in tarefas]
+
+    # Importado só aqui: concurrent.futures.process (multiprocessing) é a
+    # maior parte do tempo de partida quando há um arquivo só
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=processos) as pool:
+        return list(pool.map(converter, tarefas))
+
+
+def imprimir_dividido(arquivos, enderecos, caminho_taxas=None, **opcoes):
+    """Imprime os arquivos um após o outro, cada um dividido entre todas as impressoras"""
+    from escalonador import EscalonadorImpressoras
+    from impressora import ErroImpressora
+
+    resumo = []
+    with EscalonadorImpressoras(enderecos) as escalonador:
+        if caminho_taxas and os.path.exists(caminho_taxas):
+            escalonador.carregar_taxas(caminho_taxas)
+        for csv_path in arquivos:
+            try:
+                resumo.append(escalonador.imprimir_arquivo(csv_path, **opcoes))
+            except (OSError, ValueError, ErroImpressora) as erro:
+                resumo.append({"arquivo": csv_path, "saida": ", ".join(enderecos), "erro": str(erro)})
+        if caminho_taxas:
+            escalonador.salvar_taxas(caminho_taxas)
+    return resumo
+
+
+def imprimir_resumo(resumo, saida=sys.stdout):
+    for item in resumo:
+        if "erro" in item:
+            print(f"ERRO  {item['arquivo']}: {item['erro']}", file=saida)
+        elif "impressoras" in item:
+            divisao = ", ".join(f"{endereco}: {n}" for endereco, n in item["impressoras"].items())
+            print(
+                f"OK    {item['arquivo']}: {item['etiquetas']} etiquetas em "
+                f"{item['segundos']:.3f}s ({divisao})",
+                file=saida
+            )
+        else:
+            print(
+                f"OK    {item['arquivo']} -> {item['saida']}: "
+                f"{item['linhas']} linhas, {item['etiquetas']} etiquetas, "
+                f"{item['bytes']} bytes, {item['segundos']:.3f}s "
+                f"({item['linhas_por_segundo']:.0f} linhas/s)"
+                + (f" [novas: {item['novas']}, alteradas: {item['alteradas']}, "
+                   f"removidas: {item['removidas']}]" if "novas" in item else "")
+                + (" [ignoradas: " + ", ".join(f"{motivo}: {n}" for motivo, n in item["motivos"].items())
+                   + "]" if item.get("motivos") else "")
+                + (f" [GTIN rejeitados: {item['rejeitados']} -> {item['relatorio_rejeitados']}]"
+                   if item.get("rejeitados") else ""),
+                file=saida
+            )
+            if "instrumentacao" in item:
+                from instrumentacao import imprimir_etapas
+                imprimir_etapas(item["instrumentacao"], saida)
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(description="Converte arquivos CSV em etiquetas ZPL")
+    parser.add_argument("entradas", nargs="+", help="arquivos CSV, Parquet, Arrow ou XLSX, globs ou diretórios")
+    parser.add_argument("-o", "--saida", help="diretório de saída dos .zpl")
+    parser.add_argument("--impressora", action="append", default=[], metavar="HOST[:PORTA]",
+                        help="envia direto para a impressora por TCP (pode repetir)")
+    parser.add_argument("--dividir", action="store_true",
+                        help="divide cada arquivo entre todas as impressoras, pela velocidade de cada uma")
+    parser.add_argument("--taxas", metavar="ARQUIVO",
+                        help="JSON com a velocidade medida das impressoras; é lido e atualizado")
+    parser.add_argument("-j", "--processos", type=int, default=None,
+                        help="quantidade de processos (padrão: número de CPUs)")
+    parser.add_argument("--paralelo", action="store_true",
+                        help="divide cada arquivo em pedaços convertidos em -j processos (para CSVs "
+                             "muito grandes); os arquivos são convertidos um de cada vez")
+    parser.add_argument("--resumo", help="grava o resumo da execução neste arquivo JSON")
+    parser.add_argument("--instrumentar", action="store_true",
+                        help="mede o tempo de leitura, pareamento, formatação e escrita de cada arquivo "
+                             "(vai também para o --resumo)")
+    parser.add_argument("--profile", metavar="ARQUIVO",
+                        help="executa sob o cProfile e grava as estatísticas neste arquivo "
+                             "(a conversão roda num processo só)")
+    parser.add_argument("--formato-armazenado", action="store_true",
+                        help="grava o layout na impressora (^DF) e envia só os campos (^XF/^FN)")
+    parser.add_argument("--agrupar-repetidas", action="store_true",
+                        help="etiquetas idênticas em sequência saem num único bloco com ^PQ")
+    parser.add_argument("--serializar", action="store_true",
+                        help="sequências em que os números crescem sempre do mesmo passo (SKUs "
+                             "consecutivos, por exemplo) saem num único bloco com ^SF e ^PQ; a "
+                             "impressora faz a contagem (inclui --agrupar-repetidas)")
+    parser.add_argument("--ordenar-local", action="store_true",
+                        help="gera as etiquetas na ordem do percurso: por localização e depois SKU "
+                             "(arquivos maiores que a memória são ordenados em disco)")
+    parser.add_argument("--incremental", metavar="DIRETORIO",
+                        help="só gera etiquetas de linhas novas ou alteradas desde a última execução; "
+                             "os índices ficam neste diretório")
+    parser.add_argument("--incluir-removidos", action="store_true",
+                        help="no modo incremental, gera também as linhas que saíram do CSV")
+    parser.add_argument("--cache-registros", nargs="?", const=DIRETORIO_CACHE, metavar="DIRETORIO",
+                        help="guarda os registros lidos de cada CSV num instantâneo binário e reaproveita "
+                             "nas próximas execuções enquanto o arquivo não mudar "
+                             f"(padrão: {DIRETORIO_CACHE})")
+    parser.add_argument("--validar-gtin", action="store_true",
+                        help="confere tamanho e dígito verificador dos GTINs antes de gerar; as linhas "
+                             "rejeitadas vão para <arquivo>.rejeitados.csv no diretório de saída")
+    return parser
+
+
+def main(argv=None):
+    parser = criar_parser()
+    args = parser.parse_args(argv)
+    if args.profile:
+        from instrumentacao import executar_com_profile
+        # Os processos filhos não aparecem no profile: converte tudo aqui mesmo
+        args.processos = 1
+        return executar_com_profile(executar, args.profile, parser, args)
+    return executar(parser, args)
+
+
+def executar(parser, args):
+    arquivos = expandir_entradas(args.entradas)
+    if not arquivos:
+        parser.error("nenhum arquivo CSV encontrado")
+
+    if not args.saida and not args.impressora:
+        parser.error("informe --saida ou --impressora")
+
+    if args.impressora:
+        # O envio para as impressoras (imprimir_lote e imprimir_dividido) só
+        # lê, pareia e formata; estas opções seriam ignoradas em silêncio
+        combinadas = [opcao for opcao, ativa in (
+            ("--validar-gtin", args.validar_gtin), ("--incremental", args.incremental),
+            ("--cache-registros", args.cache_registros), ("--instrumentar", args.instrumentar),
+            ("--paralelo", args.paralelo)) if ativa]
+        if combinadas:
+            parser.error("--impressora não pode ser usado com " + ", ".join(combinadas)
+                         + "; gere os .zpl com --saida")
+
+    inicio = time.perf_counter()
+    if args.impressora and args.dividir:
+        resumo = imprimir_dividido(arquivos, args.impressora, args.taxas,
+                                   armazenado=args.formato_armazenado,
+                                   agrupar=args.agrupar_repetidas,
+                                   ordenar=args.ordenar_local,
+                                   serializar=args.serializar)
+    elif args.impressora:
+        from impressora import imprimir_lote
+        resumo = imprimir_lote(arquivos, args.impressora, armazenado=args.formato_armazenado,
+                               agrupar=args.agrupar_repetidas, ordenar=args.ordenar_local,
+                               serializar=args.serializar)
+    else:
+        saidas = [caminho_saida(csv_path, args.saida) for csv_path in arquivos]
+        repetidas = sorted({s for s in saidas if saidas.count(s) > 1})
+        if repetidas:
+            parser.error("arquivos de entrada com o mesmo nome: " + ", ".join(repetidas))
+
+        if args.paralelo:
+            combinadas = [opcao for opcao, ativa in (
+                ("--agrupar-repetidas", args.agrupar_repetidas), ("--incremental", args.incremental),
+                ("--validar-gtin", args.validar_gtin), ("--instrumentar", args.instrumentar),
+                ("--ordenar-local", args.ordenar_local), ("--serializar", args.serializar),
+                ("--cache-registros", args.cache_registros)) if ativa]
+            if combinadas:
+                parser.error("--paralelo não pode ser usado com " + ", ".join(combinadas))
+
+        # No modo paralelo os processos vão para os pedaços de cada arquivo
+        resumo = converter_lote(arquivos, args.saida, 1 if args.paralelo else args.processos,
+                                armazenado=args.formato_armazenado,
+                                agrupar=args.agrupar_repetidas,
+                                ordenar=args.ordenar_local,
+                                serializar=args.serializar,
+                                diretorio_indice=args.incremental,
+                                incluir_removidos=args.incluir_removidos,
+                                validar_gtin=args.validar_gtin,
+                                diretorio_cache=args.cache_registros,
+                                instrumentar=args.instrumentar,
+                                paralelo=(args.processos or os.cpu_count()) if args.paralelo else None)
+    total = time.perf_counter() - inicio
+
+    imprimir_resumo(resumo)
+    falhas = sum(1 for item in resumo if "erro" in item)
+    print(f"{len(resumo) - falhas} de {len(resumo)} arquivos convertidos em {total:.2f}s")
+
+    if args.resumo:
+        with open(args.resumo, 'w', encoding='utf-8') as arquivo:
+            json.dump({"arquivos": resumo, "segundos": total}, arquivo, ensure_ascii=False, indent=2)
+
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""Leitura de Parquet, Arrow (IPC/Feather) e XLSX sem passar por texto
+
+O ERP exporta direto nesses formatos; converter para CSV só para o
+conversor dividir o texto de volta é trabalho jogado fora. Aqui as
+colunas nome, local, sku e gtin são lidas em lotes de REGISTROS_POR_LOTE
+e viram registros (os mesmos de ler_registros) que seguem direto para o
+pareamento e a formatação.
+
+- Parquet: só as quatro colunas são lidas (columns= do leitor); as
+  demais nem são descomprimidas.
+- Arrow/Feather: o arquivo é mapeado em memória e só as páginas das
+  quatro colunas são tocadas.
+- XLSX: openpyxl em modo read_only, que percorre a planilha em fluxo; o
+  cabeçalho é procurado nas primeiras linhas, como em deteccao.py.
+
+Números viram texto sem o ".0" que a planilha acrescenta (GTIN e SKU
+costumam vir como número); zeros à esquerda perdidos na origem não
+voltam. Linhas com as quatro colunas vazias são puladas, como as linhas
+em branco do CSV.
+
+pyarrow e openpyxl são opcionais e só são importados quando um arquivo
+desses formatos é lido. conversor.ler_arquivo escolhe o leitor pela
+extensão, e o resto do pipeline não muda.
+
+Uso:
+    registros = ler_arquivo("catalogo.parquet", estatisticas)  # de conversor
+"""
+import importlib
+import importlib.util
+import os
+from functools import partial
+from itertools import islice
+
+from conversor import CABECALHOS, Registro
+from deteccao import LINHAS_PROCURADAS
+
+# Registros convertidos de uma vez para objetos Python; limita a memória
+# quando o arquivo tem um único lote enorme
+REGISTROS_POR_LOTE = 64 * 1024
+
+_ERRO_CABECALHOS = "Erro: Certifique-se de que o arquivo contenha as colunas: nome, local, sku, gtin"
+
+
+def _importar(modulo, pacote, caminho):
+    try:
+        return importlib.import_module(modulo)
+    except ImportError:
+        raise ValueError(f"{os.path.basename(caminho)}: ler esse formato requer o pacote {pacote} "
+                         f"(pip install {pacote})") from None
+
+
+def _texto(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, str):
+        return valor
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+def _preparar_estatisticas(estatisticas):
+    if estatisticas is None:
+        estatisticas = {}
+    estatisticas.setdefault("linhas", 0)
+    estatisticas.setdefault("ignoradas", 0)
+    estatisticas.setdefault("motivos", {})
+    return estatisticas
+
+
+def _montar(nomes, locais, skus, gtins, estatisticas):
+    # tuple.__new__ direto, como em ler_registros
+    novo_registro = tuple.__new__
+    for nome, local, sku, gtin in zip(nomes, locais, skus, gtins):
+        if not (nome or local or sku or gtin):
+            continue
+        estatisticas["linhas"] += 1
+        yield novo_registro(Registro, (nome.strip()[:15], local.strip(), sku.strip(), gtin.strip()))
+
+
+def _colunas_esquema(nomes):
+    """Nome de cada coluna de CABECALHOS no esquema (que pode ter espaços em volta)"""
+    por_nome = {}
+    for nome in nomes:
+        por_nome.setdefault(nome.strip(), nome)
+    try:
+        return [por_nome[nome] for nome in CABECALHOS]
+    except KeyError:
+        raise ValueError(_ERRO_CABECALHOS) from None
+
+
+def _coluna_texto(pa, coluna):
+    """A coluna como strings do Arrow, sem nulos e sem espaços em volta"""
+    pc = pa.compute
+    if pa.types.is_dictionary(coluna.type):
+        coluna = coluna.dictionary_decode()
+    if pa.types.is_integer(coluna.type):
+        coluna = pc.cast(coluna, pa.string())
+    if not (pa.types.is_string(coluna.type) or pa.types.is_large_string(coluna.type)):
+        # Números de ponto flutuante, datas...: mesma conversão do XLSX
+        coluna = pa.array(map(_texto, coluna.to_pylist()), pa.string())
+    return pc.utf8_trim_whitespace(coluna.fill_null(""))
+
+
+def _registros_do_lote(pa, colunas, estatisticas):
+    """Registros de colunas Arrow (arrays do mesmo tamanho)
+
+    Limpeza, corte do nome e descarte das linhas vazias são feitos pelo
+    Arrow, na coluna inteira; para o Python só vão as fatias de
+    REGISTROS_POR_LOTE já prontas.
+    """
+    pc = pa.compute
+    nomes, locais, skus, gtins = (_coluna_texto(pa, coluna) for coluna in colunas)
+    nomes = pc.utf8_slice_codeunits(nomes, 0, 15)
+    colunas = [nomes, locais, skus, gtins]
+    preenchidas = pc.or_(pc.or_(pc.not_equal(nomes, ""), pc.not_equal(locais, "")),
+                         pc.or_(pc.not_equal(skus, ""), pc.not_equal(gtins, "")))
+    if pc.sum(preenchidas).as_py() != len(nomes):
+        colunas = [pc.filter(coluna, preenchidas) for coluna in colunas]
+
+    # tuple.__new__ direto, como em ler_registros
+    montar = partial(tuple.__new__, Registro)
+    for inicio in range(0, len(colunas[0]), REGISTROS_POR_LOTE):
+        fatias = [coluna.slice(inicio, REGISTROS_POR_LOTE).to_pylist() for coluna in colunas]
+        estatisticas["linhas"] += len(fatias[0])
+        yield from map(montar, zip(*fatias))
+
+
+def ler_parquet(caminho, estatisticas=None):
+    """Gera os registros de um arquivo Parquet, lendo só as colunas usadas"""
+    estatisticas = _preparar_estatisticas(estatisticas)
+    pa = _importar("pyarrow", "pyarrow", caminho)
+    _importar("pyarrow.compute", "pyarrow", caminho)
+    pq = _importar("pyarrow.parquet", "pyarrow", caminho)
+    with pq.ParquetFile(caminho) as arquivo:
+        colunas = _colunas_esquema(arquivo.schema_arrow.names)
+        for lote in arquivo.iter_batches(batch_size=REGISTROS_POR_LOTE, columns=colunas):
+            yield from _registros_do_lote(pa, lote.columns, estatisticas)
+
+
+def ler_arrow(caminho, estatisticas=None):
+    """Gera os registros de um arquivo Arrow IPC (ou Feather v2), no formato arquivo ou stream"""
+    estatisticas = _preparar_estatisticas(estatisticas)
+    pa = _importar("pyarrow", "pyarrow", caminho)
+    _importar("pyarrow.compute", "pyarrow", caminho)
+    with pa.memory_map(caminho) as fonte:
+        try:
+            leitor = pa.ipc.open_file(fonte)
+            lotes = (leitor.get_batch(i) for i in range(leitor.num_record_batches))
+        except pa.ArrowInvalid:
+            fonte.seek(0)
+            leitor = pa.ipc.open_stream(fonte)
+            lotes = leitor
+        colunas = _colunas_esquema(leitor.schema.names)
+        indices = [leitor.schema.get_field_index(nome) for nome in colunas]
+        for lote in lotes:
+            yield from _registros_do_lote(pa, [lote.column(i) for i in indices], estatisticas)
+
+
+def ler_xlsx(caminho, estatisticas=None, planilha=None):
+    """Gera os registros da planilha ativa (ou da planilha informada) de um XLSX"""
+    estatisticas = _preparar_estatisticas(estatisticas)
+    openpyxl = _importar("openpyxl", "openpyxl", caminho)
+    livro = openpyxl.load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        folha = livro.active if planilha is None else livro[planilha]
+        linhas = folha.iter_rows(values_only=True)
+        indices = None
+        for numero in range(LINHAS_PROCURADAS):
+            linha = next(linhas, None)
+            if linha is None:
+                if numero == 0:
+                    raise ValueError("A planilha está vazia!")
+                break
+            nomes = [_texto(valor).strip() for valor in linha]
+            if set(CABECALHOS).issubset(nomes):
+                indices = [nomes.index(nome) for nome in CABECALHOS]
+                break
+        if indices is None:
+            raise ValueError(_ERRO_CABECALHOS)
+
+        while True:
+            lote = list(islice(linhas, REGISTROS_POR_LOTE))
+            if not lote:
+                return
+            # No modo read_only a linha termina na última célula preenchida
+            colunas = [[_texto(linha[i]) if i < len(linha) else "" for linha in lote]
+                       for i in indices]
+            yield from _montar(*colunas, estatisticas)
+    finally:
+        livro.close()
+
+
+LEITORES = {
+    ".parquet": ler_parquet,
+    ".pq": ler_parquet,
+    ".arrow": ler_arrow,
+    ".feather": ler_arrow,
+    ".ipc": ler_arrow,
+    ".xlsx": ler_xlsx,
+    ".xlsm": ler_xlsx,
+}
+
+EXTENSOES = tuple(LEITORES)
+
+# Pacote de que cada leitor precisa
+PACOTES = {ler_parquet: "pyarrow", ler_arrow: "pyarrow", ler_xlsx: "openpyxl"}
+
+
+def extensoes_disponiveis():
+    """Extensões cujo pacote pode ser importado aqui (sem importá-lo)"""
+    presentes = {pacote for pacote in set(PACOTES.values())
+                 if importlib.util.find_spec(pacote) is not None}
+    return tuple(extensao for extensao, leitor in LEITORES.items() if PACOTES[leitor] in presentes)
@@ -0,0 +1,503 @@
+import os
+import sys
+import time
+from collections import namedtuple
+from contextlib import ExitStack, closing
+from itertools import zip_longest
+
+from deteccao import abrir_csv
+
+# Posição da segunda coluna da etiqueta dupla
+COL2_X = 415
+
+# Quantidade de caracteres acumulados antes de cada escrita em disco
+TAMANHO_BUFFER = 64 * 1024
+
+CABECALHOS = ("nome", "local", "sku", "gtin")
+
+# Nome do formato gravado na memória da impressora no modo ^DF/^XF
+NOME_FORMATO = "R:ETIQUETA.ZPL"
+
+# Registro de uma linha do CSV: uma tupla (72 bytes) em vez de um dict por
+# linha (184 bytes mais a tabela de hash), com acesso por atributo
+Registro = namedtuple("Registro", CABECALHOS)
+
+
+def termina_entre_aspas(texto, separador=',', aberto=False, inicio=0, fim=None):
+    """Se texto[inicio:fim] termina dentro de um campo entre aspas
+
+    Como no módulo csv (RFC 4180), aspas só abrem um campo quando são o
+    primeiro caractere dele; no meio do campo (Cano 3/4" PVC) são um
+    caractere comum. Dentro do campo, aspas duplicadas valem uma só e as
+    demais o fecham. aberto diz se inicio já está dentro de um campo
+    entre aspas. Serve para str e para bytes (ou mmap), com separador do
+    mesmo tipo, para que paralelo.py corte o arquivo nos mesmos registros.
+    """
+    if fim is None:
+        fim = len(texto)
+    if isinstance(separador, str):
+        aspas, inicios = '"', (separador, '\n', '\r')
+    else:
+        aspas, inicios = b'"', (separador, b'\n', b'\r')
+    posicao = inicio
+    while True:
+        if aberto:
+            while True:
+                posicao = texto.find(aspas, posicao, fim)
+                if posicao == -1:
+                    return True
+                if texto[posicao + 1:posicao + 2] != aspas:
+                    break
+                posicao += 2
+            posicao += 1
+            aberto = False
+        posicao = texto.find(aspas, posicao, fim)
+        if posicao == -1:
+            return False
+        aberto = posicao == inicio or texto[posicao - 1:posicao] in inicios
+        posicao += 1
+
+
+def dividir_linha(linha, separador=','):
+    """Divide uma linha CSV respeitando campos entre aspas
+
+    Mesmas regras de termina_entre_aspas e do módulo csv: aspas só abrem
+    um campo no começo dele, e o que vier entre as aspas de fechamento e
+    o separador é juntado ao campo.
+    """
+    if '"' not in linha:
+        return linha.split(separador)
+
+    campos = []
+    posicao = 0
+    while True:
+        if not linha.startswith('"', posicao):
+            proximo = linha.find(separador, posicao)
+            if proximo == -1:
+                campos.append(linha[posicao:])
+                return campos
+            campos.append(linha[posicao:proximo])
+            posicao = proximo + 1
+            continue
+
+        partes = []
+        posicao += 1
+        while True:
+            aspas = linha.find('"', posicao)
+            if aspas == -1:
+                # Sem fechamento: o campo vai até o fim da linha
+                partes.append(linha[posicao:])
+                posicao = len(linha)
+                break
+            partes.append(linha[posicao:aspas])
+            if linha.startswith('"', aspas + 1):
+                partes.append('"')
+                posicao = aspas + 2
+                continue
+            posicao = aspas + 1
+            break
+        proximo = linha.find(separador, posicao)
+        partes.append(linha[posicao:] if proximo == -1 else linha[posicao:proximo])
+        campos.append("".join(partes))
+        if proximo == -1:
+            return campos
+        posicao = proximo + 1
+
+
+def ler_registros(linhas, estatisticas=None, separador=','):
+    """Gera os registros do CSV um a um, sem carregar o arquivo inteiro
+
+    Só as colunas nome, local, sku e gtin são extraídas. Linhas sem aspas
+    (o caso comum) são divididas só até a última coluna necessária; linhas
+    com aspas passam pelo divisor completo, inclusive com quebras de linha
+    dentro do campo. Linhas descartadas são contadas em
+    estatisticas["motivos"]. separador é ',' ou ';' (CSV do Excel em
+    português); ler_csv detecta qual é.
+    """
+    if estatisticas is None:
+        estatisticas = {}
+    estatisticas.setdefault("linhas", 0)
+    estatisticas.setdefault("ignoradas", 0)
+    motivos = estatisticas.setdefault("motivos", {})
+
+    # tuple.__new__ direto evita o __new__ em Python que o namedtuple gera
+    novo_registro = tuple.__new__
+
+    linhas = iter(linhas)
+    cabecalho = next(linhas, None)
+    if cabecalho is None:
+        raise ValueError("O arquivo CSV está vazio!")
+
+    header = [h.strip() for h in dividir_linha(cabecalho.strip(), separador)]
+    try:
+        idx_nome, idx_local, idx_sku, idx_gtin = (header.index(nome) for nome in CABECALHOS)
+    except ValueError:
+        raise ValueError(
+            "Erro: Certifique-se de que o CSV contenha os cabeçalhos: nome, local, sku, gtin"
+        ) from None
+
+    # Com maxsplit, split() para depois da última coluna necessária; colunas
+    # que o conversor não usa podem faltar no fim da linha
+    ultimo = max(idx_nome, idx_local, idx_sku, idx_gtin) + 1
+
+    def ignorar(motivo):
+        estatisticas["ignoradas"] += 1
+        motivos[motivo] = motivos.get(motivo, 0) + 1
+
+    for line in linhas:
+        if '"' in line:
+            # Campo entre aspas aberto no fim da linha: continua na próxima
+            aberto = termina_entre_aspas(line, separador)
+            while aberto:
+                continuacao = next(linhas, None)
+                if continuacao is None:
+                    break
+                line += continuacao
+                aberto = termina_entre_aspas(continuacao, separador, aberto=True)
+            if aberto:
+                ignorar("aspas_sem_fechamento")
+                continue
+            line = line.rstrip("\r\n")
+            fields = dividir_linha(line, separador)
+            if len(fields) < ultimo:
+                ignorar("campos_faltando")
+                continue
+        else:
+            fields = line.strip().split(separador, ultimo)
+            if len(fields) < ultimo:
+                if fields != ['']:
+                    ignorar("campos_faltando")
+                continue
+
+        estatisticas["linhas"] += 1
+        yield novo_registro(Registro, (
+            fields[idx_nome].strip()[:15],
+            fields[idx_local].strip(),
+            fields[idx_sku].strip(),
+            fields[idx_gtin].strip(),
+        ))
+
+
+def ler_csv(csv_path, estatisticas=None):
+    """Como ler_registros, a partir do caminho do CSV
+
+    Codificação (UTF-8, cp1252 ou UTF-16), separador e linha do cabeçalho
+    são detectados no começo do arquivo (ver deteccao.py); o arquivo fica
+    aberto até o gerador terminar ou ser fechado.
+    """
+    arquivo, formato = abrir_csv(csv_path, CABECALHOS)
+    with arquivo:
+        yield from ler_registros(arquivo, estatisticas, formato.separador)
+
+
+def ler_arquivo(caminho, estatisticas=None):
+    """Como ler_csv, mas também lê Parquet, Arrow e XLSX, conforme a extensão (ver colunar.py)"""
+    from colunar import LEITORES
+    leitor = LEITORES.get(os.path.splitext(caminho)[1].lower(), ler_csv)
+    return leitor(caminho, estatisticas)
+
+
+class ColunasRegistros:
+    """Registros guardados por coluna, para quem precisa do arquivo inteiro em memória
+
+    Cada coluna é uma lista de strings; nome e local se repetem muito nos
+    catálogos e são internados, então cada valor distinto fica na memória
+    uma vez só. Além de ocupar menos, listas de strings não são percorridas
+    pelo coletor de lixo, ao contrário de um milhão de Registro guardados;
+    os registros só são montados na hora de usar.
+    """
+
+    def __init__(self, registros=()):
+        self.nome = []
+        self.local = []
+        self.sku = []
+        self.gtin = []
+        self.extend(registros)
+
+    def extend(self, registros):
+        intern = sys.intern
+        nomes, locais, skus, gtins = self.nome, self.local, self.sku, self.gtin
+        for nome, local, sku, gtin in registros:
+            nomes.append(intern(nome))
+            locais.append(intern(local))
+            skus.append(sku)
+            gtins.append(gtin)
+
+    def __len__(self):
+        return len(self.sku)
+
+    def __getitem__(self, indice):
+        return Registro._make((self.nome[indice], self.local[indice], self.sku[indice],
+                               self.gtin[indice]))
+
+    def __iter__(self):
+        return self._registros(0, len(self), 1)
+
+    def _registros(self, inicio, fim, passo):
+        fatia = slice(inicio, fim, passo)
+        return map(Registro._make, zip(self.nome[fatia], self.local[fatia], self.sku[fatia],
+                                       self.gtin[fatia]))
+
+    def pares(self, inicio=0, fim=None):
+        """Pares (esquerda, direita) dos registros [inicio, fim), como parear_registros"""
+        fim = len(self) if fim is None else fim
+        return zip_longest(self._registros(inicio, fim, 2), self._registros(inicio + 1, fim, 2))
+
+
+def parear_registros(registros):
+    """Agrupa os registros em pares (esquerda, direita); a direita é None quando sobra um"""
+    waiting_record = None
+    for record in registros:
+        if waiting_record is None:
+            waiting_record = record
+        else:
+            yield waiting_record, record
+            waiting_record = None
+
+    if waiting_record is not None:
+        yield waiting_record, None
+
+
+def agrupar_repetidas(pares):
+    """Junta pares consecutivos idênticos em (esquerda, direita, quantidade)"""
+    anterior = None
+    quantidade = 0
+    for par in pares:
+        if par == anterior:
+            quantidade += 1
+            continue
+        if anterior is not None:
+            yield anterior[0], anterior[1], quantidade
+        anterior = par
+        quantidade = 1
+
+    if anterior is not None:
+        yield anterior[0], anterior[1], quantidade
+
+
+def _quantidade(quantidade):
+    # ^PQ só quando a mesma etiqueta sai mais de uma vez
+    return f"^PQ{quantidade}\n" if quantidade > 1 else ""
+
+
+def formatar_etiqueta(left, right=None, quantidade=1):
+    """Monta o bloco ZPL de uma etiqueta dupla, impressa quantidade vezes"""
+    # Desempacotar a tupla sai mais barato que ler os atributos um a um
+    nome, local, sku, left_gtin = left
+    left_data = f"{sku} - {local} | {nome}"
+    if right is not None:
+        nome, local, sku, right_gtin = right
+        right_data = f"{sku} - {local} | {nome}"
+    else:
+        # Número ímpar de registros: coluna direita fica vazia
+        right_data = ""
+        right_gtin = ""
+
+    return (
+        "^XA\n"
+        "^PW780\n"
+        "^LL240\n"
+        f"^FO10,10^A0N,25,25^FD{left_data}^FS\n"
+        f"^FO10,40^BY2,2.0,50^BCN,50,Y,N,N^FD{left_gtin}^FS\n"
+        f"^FO{COL2_X},10^A0N,25,25^FD{right_data}^FS\n"
+        f"^FO{COL2_X},40^BY2,2.0,50^BCN,50,Y,N,N^FD{right_gtin}^FS\n"
+        f"{_quantidade(quantidade)}"
+        "^XZ\n"
+    )
+
+
+def formato_armazenado(nome_formato=NOME_FORMATO):
+    """Monta o ^DF que grava o layout da etiqueta dupla na impressora; é enviado uma única vez"""
+    return (
+        "^XA\n"
+        f"^DF{nome_formato}^FS\n"
+        "^PW780\n"
+        "^LL240\n"
+        "^FO10,10^A0N,25,25^FN1^FS\n"
+        "^FO10,40^BY2,2.0,50^BCN,50,Y,N,N^FN2^FS\n"
+        f"^FO{COL2_X},10^A0N,25,25^FN3^FS\n"
+        f"^FO{COL2_X},40^BY2,2.0,50^BCN,50,Y,N,N^FN4^FS\n"
+        "^XZ\n"
+    )
+
+
+def formatar_etiqueta_armazenada(left, right=None, quantidade=1, nome_formato=NOME_FORMATO):
+    """Monta uma etiqueta que só preenche os campos do formato gravado com ^DF"""
+    nome, local, sku, gtin = left
+    label = (
+        f"^XA^XF{nome_formato}^FS"
+        f"^FN1^FD{sku} - {local} | {nome}^FS"
+        f"^FN2^FD{gtin}^FS"
+    )
+    if right is not None:
+        nome, local, sku, gtin = right
+        label += (
+            f"^FN3^FD{sku} - {local} | {nome}^FS"
+            f"^FN4^FD{gtin}^FS"
+        )
+    if quantidade > 1:
+        label += f"^PQ{quantidade}"
+    return label + "^XZ\n"
+
+
+def gerar_etiquetas(registros, armazenado=False, agrupar=False, instrumentacao=None,
+                    serializar=False):
+    """Gera o texto ZPL de cada par de registros
+
+    Com agrupar=True, pares idênticos em sequência viram um único bloco com
+    ^PQ, e cada item gerado pode representar várias etiquetas impressas.
+    Com serializar=True, sequências em que os números crescem sempre do
+    mesmo passo também viram um bloco só, com ^SF (ver serializacao.py);
+    isso já inclui o agrupamento das repetidas.
+    """
+    pares = parear_registros(registros)
+    if serializar:
+        from serializacao import serializar_pares
+        pares = serializar_pares(pares)
+    elif agrupar:
+        pares = agrupar_repetidas(pares)
+    if instrumentacao is None:
+        return _formatar_pares(pares, armazenado, agrupar, serializar)
+    pares = instrumentacao.etapa("pareamento", pares)
+    return instrumentacao.etapa("formatacao", _formatar_pares(pares, armazenado, agrupar, serializar))
+
+
+def _formatar_pares(pares, armazenado, agrupar, serializar=False):
+    formatar = formatar_etiqueta_armazenada if armazenado else formatar_etiqueta
+    if serializar:
+        from serializacao import aplicar_serie, campos_etiqueta
+        for left, right, quantidade, serie in pares:
+            etiqueta = formatar(left, right, quantidade)
+            if serie is not None:
+                etiqueta = aplicar_serie(etiqueta, campos_etiqueta(left, right), serie)
+            yield etiqueta
+        return
+    if not agrupar:
+        for left, right in pares:
+            yield formatar(left, right)
+        return
+    for left, right, quantidade in pares:
+        yield formatar(left, right, quantidade)
+
+
+def escrever_em_blocos(etiquetas, saida, tamanho_buffer=TAMANHO_BUFFER, estatisticas=None,
+                       com_quantidade=False):
+    """Escreve as etiquetas em blocos de ~tamanho_buffer caracteres
+
+    Com com_quantidade=True, saida.write recebe também quantas etiquetas
+    o bloco tem (como Impressora.write, que conta as confirmadas).
+    """
+    if estatisticas is None:
+        estatisticas = {}
+    estatisticas.setdefault("etiquetas", 0)
+
+    bloco = []
+    tamanho = 0
+    for etiqueta in etiquetas:
+        bloco.append(etiqueta)
+        tamanho += len(etiqueta)
+        estatisticas["etiquetas"] += 1
+        if tamanho >= tamanho_buffer:
+            if com_quantidade:
+                saida.write("".join(bloco), len(bloco))
+            else:
+                saida.write("".join(bloco))
+            bloco.clear()
+            tamanho = 0
+
+    if bloco:
+        if com_quantidade:
+            saida.write("".join(bloco), len(bloco))
+        else:
+            saida.write("".join(bloco))
+
+
+def preparar_etiquetas(linhas, estatisticas=None, armazenado=False, filtro=None, agrupar=False,
+                       instrumentacao=None, ordenar=False, serializar=False):
+    """Valida o cabeçalho e devolve (prefixo, etiquetas)
+
+    O prefixo é o ^DF do modo armazenado (ou vazio) e deve ser enviado antes
+    das etiquetas. O cabeçalho é lido já aqui para que um CSV inválido gere
+    ValueError antes de qualquer saída ser criada. filtro, se informado,
+    recebe o iterador de registros e devolve os registros a imprimir.
+    Com ordenar=True os registros (já filtrados) saem por localização e
+    SKU (ver ordenacao.py). Com serializar=True as sequências numéricas
+    saem num bloco só com ^SF e ^PQ (ver gerar_etiquetas).
+    instrumentacao (ver instrumentacao.py), se informada, mede cada etapa.
+    """
+    return preparar_registros(ler_registros(linhas, estatisticas), armazenado, filtro, agrupar,
+                              instrumentacao, ordenar, serializar)
+
+
+def preparar_registros(registros, armazenado=False, filtro=None, agrupar=False,
+                       instrumentacao=None, ordenar=False, serializar=False):
+    """Como preparar_etiquetas, a partir de registros já lidos (de ler_registros ou do cache)"""
+    if instrumentacao is not None:
+        registros = instrumentacao.etapa("leitura", registros)
+    primeiro = next(registros, None)
+    if filtro is not None:
+        registros = filtro(iter(()) if primeiro is None else _encadear(primeiro, registros))
+        if instrumentacao is not None:
+            registros = instrumentacao.etapa("filtro", registros)
+        primeiro = next(registros, None)
+    if ordenar and primeiro is not None:
+        from ordenacao import ordenar_registros
+        registros = ordenar_registros(_encadear(primeiro, registros))
+        if instrumentacao is not None:
+            registros = instrumentacao.etapa("ordenacao", registros)
+        primeiro = next(registros, None)
+    if primeiro is None:
+        return "", iter(())
+
+    prefixo = formato_armazenado() if armazenado else ""
+    return prefixo, gerar_etiquetas(_encadear(primeiro, registros), armazenado, agrupar, instrumentacao,
+                                    serializar)
+
+
+def converter_arquivo(csv_path, output_path, tamanho_buffer=TAMANHO_BUFFER, armazenado=False,
+                      filtro=None, agrupar=False, instrumentacao=None, ordenar=False, cache=None,
+                      serializar=False):
+    """Converte um CSV em ZPL em streaming e retorna as estatísticas da execução
+
+    Com armazenado=True o layout é enviado uma vez com ^DF e cada etiqueta
+    leva apenas ^XF e os campos ^FN, reduzindo o volume enviado à impressora.
+    Com agrupar=True etiquetas repetidas em sequência saem num bloco só com
+    ^PQ; "etiquetas" nas estatísticas passa a contar blocos, assim como
+    com serializar=True, em que sequências numéricas também viram um bloco
+    com ^SF. Com ordenar=True as etiquetas saem por localização e SKU. Com
+    instrumentacao, o resumo por etapa vai em estatisticas["instrumentacao"].
+    Com cache (um CacheRegistros, ver cache_registros.py) os registros vêm
+    do instantâneo binário do CSV quando ele já foi lido antes.
+    """
+    estatisticas = {"arquivo": csv_path, "saida": output_path, "etiquetas": 0}
+    inicio = time.perf_counter()
+
+    with ExitStack() as pilha:
+        if cache is None:
+            registros = pilha.enter_context(closing(ler_arquivo(csv_path, estatisticas)))
+        else:
+            registros = pilha.enter_context(closing(cache.registros(csv_path, estatisticas)))
+        prefixo, etiquetas = preparar_registros(registros, armazenado, filtro, agrupar,
+                                                instrumentacao, ordenar, serializar)
+        with open(output_path, 'w', encoding='utf-8') as out_file:
+            saida = out_file if instrumentacao is None else instrumentacao.saida(out_file)
+            saida.write(prefixo)
+            escrever_em_blocos(etiquetas, saida, tamanho_buffer, estatisticas)
+
+    estatisticas["bytes"] = os.path.getsize(output_path)
+    estatisticas["segundos"] = time.perf_counter() - inicio
+    estatisticas["linhas_por_segundo"] = _taxa(estatisticas["linhas"], estatisticas["segundos"])
+    if instrumentacao is not None:
+        for nome in ("linhas", "ignoradas", "etiquetas"):
+            instrumentacao.contar(nome, estatisticas[nome])
+        estatisticas["instrumentacao"] = instrumentacao.resumo()
+    return estatisticas
+
+
+def _encadear(primeiro, restante):
+    yield primeiro
+    yield from restante
+
+
+def _taxa(quantidade, segundos):
+    return quantidade / segundos if segundos > 0 else 0.0
@@ -0,0 +1,138 @@
+"""Detecção de codificação, separador e linha do cabeçalho de um CSV
+
+Os arquivos chegam de vários lugares: Google Sheets (UTF-8, vírgula),
+Excel em português (cp1252, ponto e vírgula, às vezes com uma linha de
+título antes do cabeçalho) e ferramentas do Windows que salvam em UTF-16.
+Em vez de pedir para salvar o arquivo de novo, ou de tentar decodificar
+duas vezes, só o primeiro bloco (AMOSTRA bytes) é examinado:
+
+- codificação: BOM (UTF-8 ou UTF-16), UTF-16 sem BOM pelos bytes nulos,
+  UTF-8 se a amostra decodifica sem erro e, senão, cp1252;
+- cabeçalho e separador: a primeira das LINHAS_PROCURADAS linhas que,
+  dividida por vírgula ou por ponto e vírgula, tem todas as colunas
+  esperadas.
+
+O resto do arquivo é lido em fluxo, já com esses parâmetros. O bloco da
+amostra fica no buffer do arquivo e não é lido duas vezes do disco.
+
+Se a amostra de um arquivo maior que ela só tem ASCII, ele é lido como
+UTF-8, mas com o tratador de erros ERROS_UTF8: um byte que não forma
+UTF-8 válido (o primeiro acento de um arquivo cp1252 depois da amostra)
+é lido como cp1252 em vez de interromper a leitura no meio. Texto cp1252
+que por acaso também é UTF-8 válido ("Ã©") continua sendo lido como
+UTF-8, o que na prática não acontece em exportações em português.
+
+Uso:
+    arquivo, formato = abrir_csv("exportacao.csv", ("nome", "local", "sku", "gtin"))
+    with arquivo:
+        registros = ler_registros(arquivo, separador=formato.separador)
+"""
+import codecs
+import io
+import os
+from collections import namedtuple
+
+# Tamanho da amostra examinada no começo do arquivo
+AMOSTRA = 64 * 1024
+
+# Linhas da amostra em que o cabeçalho é procurado (títulos, linhas em branco...)
+LINHAS_PROCURADAS = 20
+
+SEPARADORES = (",", ";")
+
+# Codificações em que \n, aspas e separadores são um byte só e não aparecem
+# dentro de outros caracteres (o que a conversão paralela precisa para
+# cortar o arquivo em bytes)
+CODIFICACOES_ASCII = ("utf-8", "utf-8-sig", "cp1252", "latin-1")
+
+# Tratador de erros de decodificação (errors= de open e dos codecs) usado
+# com UTF-8 detectado sem BOM
+ERROS_UTF8 = "utf8-ou-cp1252"
+
+# codificacao: nome para open(); separador: "," ou ";"; linhas_antes:
+# linhas antes do cabeçalho; bom: bytes da marca de ordem no início;
+# erros: errors= para decodificar ("strict" ou ERROS_UTF8)
+FormatoCSV = namedtuple("FormatoCSV", ("codificacao", "separador", "linhas_antes", "bom", "erros"))
+
+
+def _ler_como_cp1252(erro):
+    """Decodifica como cp1252 os bytes que o UTF-8 recusou"""
+    if not isinstance(erro, UnicodeDecodeError):
+        raise erro
+    trecho = erro.object[erro.start:erro.end]
+    return bytes(trecho).decode("cp1252", errors="replace"), erro.end
+
+
+codecs.register_error(ERROS_UTF8, _ler_como_cp1252)
+
+
+def detectar_codificacao(amostra, completa=False):
+    """(codificacao, tamanho do BOM) da amostra; completa indica que é o arquivo inteiro"""
+    if amostra.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig", len(codecs.BOM_UTF8)
+    if amostra.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        # O codec utf-16 lê o BOM e escolhe a ordem dos bytes
+        return "utf-16", len(codecs.BOM_UTF16_LE)
+
+    # Texto latino em UTF-16 sem BOM: metade dos bytes é zero, sempre na
+    # mesma posição (ímpar em little-endian, par em big-endian)
+    pares = amostra[0::2].count(0)
+    impares = amostra[1::2].count(0)
+    metade = len(amostra) // 2
+    if metade and max(pares, impares) > 0.3 * metade and min(pares, impares) < 0.05 * metade:
+        return ("utf-16-le" if impares > pares else "utf-16-be"), 0
+
+    try:
+        # Sem final, um caractere cortado no fim da amostra não conta como erro
+        codecs.getincrementaldecoder("utf-8")().decode(amostra, final=completa)
+        return "utf-8", 0
+    except UnicodeDecodeError:
+        return "cp1252", 0
+
+
+def _campos(linha, separador):
+    return [campo.strip().strip('"').strip() for campo in linha.split(separador)]
+
+
+def detectar_formato(amostra, cabecalhos, completa=False):
+    """FormatoCSV de um arquivo a partir dos primeiros bytes dele
+
+    Se nenhuma linha tem todos os cabecalhos, o cabeçalho é a primeira
+    linha e o separador o mais frequente nela; quem lê o arquivo é que
+    acusa o cabeçalho inválido.
+    """
+    codificacao, bom = detectar_codificacao(amostra, completa)
+    erros = ERROS_UTF8 if codificacao == "utf-8" else "strict"
+    texto = amostra.decode(codificacao, errors="replace")
+    # Mesmas quebras de linha universais da leitura em modo texto
+    linhas = texto.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    if not completa:
+        # A última linha da amostra pode estar cortada
+        linhas.pop()
+
+    esperados = set(cabecalhos)
+    for numero, linha in enumerate(linhas[:LINHAS_PROCURADAS]):
+        for separador in SEPARADORES:
+            if separador in linha and esperados.issubset(_campos(linha, separador)):
+                return FormatoCSV(codificacao, separador, numero, bom, erros)
+
+    primeira = linhas[0] if linhas else ""
+    separador = max(SEPARADORES, key=primeira.count)
+    return FormatoCSV(codificacao, separador, 0, bom, erros)
+
+
+def abrir_csv(csv_path, cabecalhos):
+    """Abre o CSV em modo texto já posicionado no cabeçalho; devolve (arquivo, formato)"""
+    bruto = open(csv_path, 'rb', buffering=AMOSTRA)
+    try:
+        # peek não consome: a amostra continua no buffer para a leitura em texto
+        amostra = bruto.peek(AMOSTRA)[:AMOSTRA]
+        completa = os.fstat(bruto.fileno()).st_size <= len(amostra)
+        formato = detectar_formato(amostra, cabecalhos, completa)
+        arquivo = io.TextIOWrapper(bruto, encoding=formato.codificacao, errors=formato.erros)
+    except BaseException:
+        bruto.close()
+        raise
+    for _ in range(formato.linhas_antes):
+        next(arquivo, None)
+    return arquivo, formato
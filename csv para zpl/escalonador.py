@@ -0,0 +1,250 @@
+"""Divisão de um trabalho de impressão entre várias impressoras
+
+O trabalho é cortado em faixas contíguas de etiquetas, proporcionais à
+velocidade medida de cada impressora (etiquetas/s), para que cada uma receba
+um trecho seguido de localizações e todas terminem mais ou menos juntas.
+Se uma impressora cai, o que faltava da faixa dela é redividido entre as
+que continuam ativas.
+"""
+import json
+import threading
+import time
+from collections import deque
+from contextlib import closing
+from itertools import islice
+
+from conversor import (_formatar_pares, agrupar_repetidas, formato_armazenado, ler_arquivo,
+                       parear_registros)
+from impressora import ErroImpressora, SpoolerImpressoras, interpretar_endereco
+
+# Etiquetas por lote enviado; também é a granularidade com que se sabe o
+# que já foi transmitido quando uma impressora cai
+ETIQUETAS_POR_LOTE = 200
+
+# Peso da medição mais recente na média móvel da velocidade das impressoras
+PESO_MEDICAO = 0.5
+
+# Faixas menores que isso não atualizam a velocidade (medição pouco confiável)
+MINIMO_PARA_MEDIR = 50
+
+
+def _pares(csv_path, agrupar=False, ordenar=False, serializar=False):
+    """Lista dos pares (ou blocos ^PQ, se agrupar ou serializar) do CSV, na ordem de impressão
+
+    O CSV é lido, ordenado e pareado uma vez só; as faixas das impressoras
+    são fatias dessa lista. Nada é formatado.
+    """
+    with closing(ler_arquivo(csv_path)) as registros:
+        if ordenar:
+            from ordenacao import ordenar_registros
+            registros = ordenar_registros(registros)
+        pares = parear_registros(registros)
+        if serializar:
+            from serializacao import serializar_pares
+            pares = serializar_pares(pares)
+        elif agrupar:
+            pares = agrupar_repetidas(pares)
+        return list(pares)
+
+
+def _nao_confirmadas(faixas, confirmadas):
+    """Partes das faixas (na ordem de envio) além das primeiras confirmadas etiquetas"""
+    sobra = []
+    for a, b in faixas:
+        if confirmadas >= b - a:
+            confirmadas -= b - a
+            continue
+        sobra.append((a + max(confirmadas, 0), b))
+        confirmadas = 0
+    return sobra
+
+
+def dividir_faixas(inicio, fim, taxas):
+    """Divide [inicio, fim) em faixas contíguas proporcionais às taxas
+
+    taxas é uma lista de (chave, etiquetas_por_segundo); devolve uma lista de
+    (chave, inicio, fim) na mesma ordem, omitindo faixas vazias.
+    """
+    total = fim - inicio
+    soma = sum(taxa for _, taxa in taxas)
+    if soma <= 0:
+        taxas = [(chave, 1.0) for chave, _ in taxas]
+        soma = len(taxas)
+
+    # Maiores restos: arredonda para baixo e distribui as sobras
+    cotas = [total * taxa / soma for _, taxa in taxas]
+    tamanhos = [int(cota) for cota in cotas]
+    sobras = sorted(range(len(cotas)), key=lambda i: cotas[i] - tamanhos[i], reverse=True)
+    for i in sobras[:total - sum(tamanhos)]:
+        tamanhos[i] += 1
+
+    faixas = []
+    posicao = inicio
+    for (chave, _), tamanho in zip(taxas, tamanhos):
+        if tamanho:
+            faixas.append((chave, posicao, posicao + tamanho))
+            posicao += tamanho
+    return faixas
+
+
+class EscalonadorImpressoras:
+    """Imprime um CSV dividindo as etiquetas entre um pool de impressoras"""
+
+    def __init__(self, enderecos, taxas=None, etiquetas_por_lote=ETIQUETAS_POR_LOTE,
+                 **opcoes_impressora):
+        self.enderecos = [self._normalizar(e) for e in enderecos]
+        # Sem medição ainda, todas começam com o mesmo peso
+        self.taxas = {e: 1.0 for e in self.enderecos}
+        self.taxas.update({self._normalizar(e): t for e, t in (taxas or {}).items()})
+        self.etiquetas_por_lote = etiquetas_por_lote
+        self.spooler = SpoolerImpressoras(**opcoes_impressora)
+
+    @staticmethod
+    def _normalizar(endereco):
+        host, porta = interpretar_endereco(endereco) if isinstance(endereco, str) else endereco
+        return f"{host}:{porta}"
+
+    def carregar_taxas(self, caminho):
+        with open(caminho, 'r', encoding='utf-8') as arquivo:
+            self.taxas.update(json.load(arquivo))
+
+    def salvar_taxas(self, caminho):
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            json.dump(self.taxas, arquivo, indent=2)
+
+    def imprimir_arquivo(self, csv_path, armazenado=False, agrupar=False, ordenar=False,
+                         serializar=False):
+        """Divide o CSV entre as impressoras e espera todas terminarem
+
+        O CSV é lido (e, com ordenar=True, ordenado por localização) uma
+        vez; cada impressora formata só as etiquetas da própria faixa, que
+        é um trecho seguido do percurso.
+        """
+        inicio = time.perf_counter()
+        pares = _pares(csv_path, agrupar, ordenar, serializar)
+        total = len(pares)
+
+        trava = threading.Condition()
+        ativas = list(self.enderecos)
+        # Conexões criadas antes das threads para não disputar o pool
+        impressoras = {e: self.spooler.obter(e) for e in ativas}
+        filas = {e: deque() for e in ativas}
+        for endereco, a, b in dividir_faixas(0, total, [(e, self.taxas[e]) for e in ativas]):
+            filas[endereco].append((a, b))
+        estado = {"pendentes": sum(len(f) for f in filas.values()), "erro": None}
+        por_impressora = {e: 0 for e in ativas}
+
+        def redistribuir(faixas):
+            # Chamada com a trava adquirida; faixas já descontadas de "pendentes"
+            taxas = [(e, self.taxas[e]) for e in ativas]
+            for a, b in faixas:
+                for endereco, x, y in dividir_faixas(a, b, taxas):
+                    filas[endereco].append((x, y))
+                    estado["pendentes"] += 1
+
+        def trabalhador(endereco):
+            impressora = impressoras[endereco]
+            base = impressora.etiquetas_enviadas
+            # Faixas já entregues a esta impressora, na ordem de envio
+            enviadas = []
+            while True:
+                with trava:
+                    while endereco in ativas and not filas[endereco] and estado["pendentes"]:
+                        trava.wait()
+                    if endereco not in ativas or not filas[endereco]:
+                        return
+                    a, b = filas[endereco].popleft()
+
+                enviadas.append((a, b))
+                try:
+                    erro = self._enviar_faixa(impressora, pares, a, b, armazenado, agrupar,
+                                              serializar)
+                except Exception as falha:
+                    # Erro que não é da impressora (arquivo, disco...): aborta o trabalho todo
+                    with trava:
+                        estado["erro"] = falha
+                        estado["pendentes"] = 0
+                        ativas.clear()
+                        trava.notify_all()
+                    return
+
+                with trava:
+                    estado["pendentes"] -= 1
+                    if erro is None:
+                        por_impressora[endereco] += b - a
+                    else:
+                        # Reenvia também o que ainda podia estar nos buffers quando a
+                        # conexão caiu, inclusive o fim das faixas anteriores: melhor
+                        # repetir algumas etiquetas do que perdê-las
+                        sobra = _nao_confirmadas(enviadas, impressora.etiquetas_confirmadas - base)
+                        por_impressora[endereco] = (sum(y - x for x, y in enviadas)
+                                                    - sum(y - x for x, y in sobra))
+                        ativas.remove(endereco)
+                        enfileiradas = filas.pop(endereco)
+                        estado["pendentes"] -= len(enfileiradas)
+                        sobra += enfileiradas
+                        if ativas:
+                            redistribuir(sobra)
+                        elif sobra:
+                            estado["erro"] = erro
+                    trava.notify_all()
+
+        threads = [threading.Thread(target=trabalhador, args=(e,), daemon=True) for e in ativas]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        erro = estado["erro"]
+        if isinstance(erro, ErroImpressora):
+            raise ErroImpressora(f"todas as impressoras falharam: {erro}") from erro
+        if erro is not None:
+            raise erro
+
+        segundos = time.perf_counter() - inicio
+        return {
+            "arquivo": csv_path,
+            "saida": ", ".join(self.enderecos),
+            "etiquetas": total,
+            "impressoras": por_impressora,
+            "segundos": segundos,
+            "etiquetas_por_segundo": total / segundos if segundos > 0 else 0.0,
+        }
+
+    def _enviar_faixa(self, impressora, pares, inicio, fim, armazenado, agrupar, serializar=False):
+        """Formata e envia os pares [inicio, fim); devolve o ErroImpressora ou None"""
+        etiquetas = _formatar_pares(pares[inicio:fim], armazenado, agrupar, serializar)
+        base = impressora.etiquetas_enviadas
+        comeco = None
+        try:
+            if armazenado:
+                # Cada impressora precisa do formato gravado na própria memória
+                comeco = time.perf_counter()
+                impressora.write(formato_armazenado())
+            while True:
+                lote = list(islice(etiquetas, self.etiquetas_por_lote))
+                if not lote:
+                    break
+                if comeco is None:
+                    comeco = time.perf_counter()
+                impressora.write("".join(lote), len(lote))
+            impressora.aguardar()
+        except ErroImpressora as erro:
+            return erro
+
+        enviadas = impressora.etiquetas_enviadas - base
+        segundos = time.perf_counter() - comeco if comeco is not None else 0.0
+        endereco = f"{impressora.host}:{impressora.porta}"
+        if enviadas >= MINIMO_PARA_MEDIR and segundos > 0:
+            medida = enviadas / segundos
+            self.taxas[endereco] = (1 - PESO_MEDICAO) * self.taxas[endereco] + PESO_MEDICAO * medida
+        return None
+
+    def fechar(self):
+        self.spooler.fechar()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
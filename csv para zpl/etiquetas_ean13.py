@@ -0,0 +1,99 @@
+"""Ferramenta antiga: etiquetas com o código de barras EAN-13 do GTIN
+
+Se chamava csv.py, o que escondia o módulo csv da biblioteca padrão de
+tudo que rodasse nesta pasta (e fazia o PyInstaller levar tkinter, PIL e
+python-barcode junto com qualquer coisa que importasse csv). Os diálogos
+só abrem quando o arquivo é executado; importar não tem efeitos.
+
+Uso:
+    python etiquetas_ean13.py
+"""
+import sys
+
+from cache_codigos import CacheCodigos
+
+_cache_codigos = CacheCodigos()
+
+def gerar_codigo_barras(numero):
+    # Gera o código de barras EAN-13 sem texto abaixo. A imagem vem do cache em
+    # disco (cache_codigos.py): um GTIN já desenhado antes não é renderizado de novo.
+    return _cache_codigos.obter('ean13', numero)
+
+def gerar_codigos_barras(numeros, processos=None):
+    # Versão em lote: devolve {numero: caminho} e desenha as faltas em paralelo.
+    return _cache_codigos.obter_lote('ean13', numeros, processos=processos)
+
+def gerar_zpl(sku, localizacao, nome, gtin, x_offset, y_offset):
+    # Formatação ajustada para a ZPL, com GTIN na segunda linha e texto bem organizado.
+    zpl = f"""
+    ^XA
+    ^CF0,20
+    ^FO50,{y_offset}^BY2^BCN,60,Y,N,N^FD{gtin}^FS
+    ^FO50,{y_offset + 70}^BY2^BCN,60,Y,N,N^FD{gtin}^FS
+    ^XZ
+    """
+    return zpl
+
+def selecionar_arquivo_csv():
+    from tkinter import Tk, filedialog
+    root = Tk()
+    root.withdraw()  # Oculta a janela principal
+    caminho_arquivo = filedialog.askopenfilename(
+        title="Selecione o arquivo CSV",
+        filetypes=[("CSV Files", "*.csv")]
+    )
+    return caminho_arquivo
+
+def salvar_arquivo_zpl():
+    from tkinter import Tk, filedialog
+    root = Tk()
+    root.withdraw()  # Oculta a janela principal
+    caminho_arquivo = filedialog.asksaveasfilename(
+        title="Salvar arquivo ZPL",
+        defaultextension=".zpl",
+        filetypes=[("ZPL Files", "*.zpl")]
+    )
+    return caminho_arquivo
+
+def fechar_aplicacao():
+    sys.exit()
+
+def gerar_etiquetas(arquivo_csv, arquivo_zpl):
+    etiquetas = []
+
+    with open(arquivo_csv, 'r', encoding='utf-8') as csvfile:
+        linhas = csvfile.readlines()
+
+        for i, linha in enumerate(linhas[1:]):  # Ignora o cabeçalho
+            campos = linha.strip().split(",")  # Divide a linha com base nas vírgulas
+            if len(campos) >= 4:  # Verifica se há pelo menos 4 campos
+                sku = campos[0]
+                localizacao = campos[1]
+                gtin = campos[2]  # O GTIN
+                nome = campos[3]  # Nome é o quarto campo
+
+                y_offset = 50 + (i * 140)  # Definindo o deslocamento y para cada etiqueta na coluna
+                etiquetas.append(gerar_zpl(sku, localizacao, nome, gtin, 50, y_offset))
+
+    # Agora escreve todas as etiquetas em um único arquivo ZPL
+    with open(arquivo_zpl, 'w', encoding='utf-8') as zplfile:
+        for etiqueta in etiquetas:
+            zplfile.write(etiqueta + "\n")
+
+    print(f"Arquivo ZPL gerado com sucesso: {arquivo_zpl}")
+
+def main():
+    # Seleção de arquivos e execução do processo
+    arquivo_csv = selecionar_arquivo_csv()
+    if not arquivo_csv:
+        print("Nenhum arquivo CSV selecionado.")
+    else:
+        arquivo_zpl = salvar_arquivo_zpl()
+        if not arquivo_zpl:
+            print("Nenhum arquivo ZPL selecionado.")
+        else:
+            gerar_etiquetas(arquivo_csv, arquivo_zpl)
+            fechar_aplicacao()  # Encerra a aplicação após a conversão
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+"""Envio direto de ZPL para impressoras Zebra por TCP cru (porta 9100)
+
+Cada impressora mantém uma conexão aberta e uma thread de escrita alimentada
+por uma fila limitada: o gerador continua produzindo etiquetas enquanto o
+lote anterior ainda está sendo transmitido, e fica bloqueado quando a fila
+enche (a impressora ou a rede não estão dando conta).
+
+Para testar sem hardware:
+    python impressora.py --servidor-falso --porta 9100
+    python cli.py entrada.csv --impressora 127.0.0.1:9100
+"""
+import argparse
+import queue
+import select
+import socket
+import socketserver
+import struct
+import threading
+import time
+from collections import deque
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+
+from conversor import (TAMANHO_BUFFER, _taxa, escrever_em_blocos, ler_arquivo,
+                       preparar_registros)
+
+PORTA_PADRAO = 9100
+
+# Quantidade de lotes aguardando envio antes de o gerador ser bloqueado
+MAX_LOTES_PENDENTES = 8
+
+# Buffer de envio do socket. Mantido pequeno de propósito: o que está no
+# buffer do kernel conta como enviado, e se a impressora cair isso se perde
+BUFFER_SOCKET = 64 * 1024
+
+_FIM = object()
+
+
+class ErroImpressora(Exception):
+    """Falha de comunicação com a impressora depois de esgotar as tentativas"""
+
+
+def interpretar_endereco(texto):
+    """Converte 'host' ou 'host:porta' em (host, porta)"""
+    host, _, porta = texto.rpartition(":")
+    if not host:
+        return texto, PORTA_PADRAO
+    return host, int(porta)
+
+
+class Impressora:
+    """Conexão persistente com uma impressora, com escrita em segundo plano
+
+    Implementa write(), então pode ser usada no lugar de um arquivo em
+    escrever_em_blocos. Cada write() vira um lote enviado com sendall.
+
+    Se a conexão cai, os lotes que ainda podiam estar nos buffers (os
+    mesmos descontados em etiquetas_confirmadas) são reenviados pela nova
+    conexão antes do lote seguinte: no pior caso algumas etiquetas saem
+    duas vezes, mas nenhuma se perde. Isso vale também para uma conexão
+    ociosa que a impressora fechou entre dois trabalhos. Uma queda depois
+    do último lote só é percebida no próximo envio.
+    """
+
+    def __init__(self, host, porta=PORTA_PADRAO, timeout=10.0, tentativas=3,
+                 max_lotes=MAX_LOTES_PENDENTES, buffer_socket=BUFFER_SOCKET):
+        self.host = host
+        self.porta = porta
+        self.timeout = timeout
+        self.tentativas = tentativas
+        self.buffer_socket = buffer_socket
+        self.bytes_enviados = 0
+        self.lotes_enviados = 0
+        self.etiquetas_enviadas = 0
+        self.reconexoes = 0
+
+        # Últimos lotes (bytes, etiquetas) que ainda podem estar em algum buffer;
+        # são reenviados se a conexão cair
+        self._recentes = deque()
+        self._bytes_recentes = 0
+        self._caiu = False
+        self._socket = None
+        self._erro = None
+        self._fila = queue.Queue(maxsize=max_lotes)
+        self._thread = threading.Thread(target=self._escritor, daemon=True,
+                                        name=f"impressora-{host}:{porta}")
+        self._thread.start()
+
+    def __repr__(self):
+        return f"Impressora({self.host!r}, {self.porta})"
+
+    def write(self, texto, etiquetas=0):
+        """Enfileira um lote para envio; bloqueia enquanto a fila estiver cheia
+
+        etiquetas é quantas etiquetas o lote contém; é somado em
+        etiquetas_enviadas quando o lote termina de ser transmitido.
+        """
+        self._verificar_erro()
+        if texto:
+            self._fila.put((texto.encode('utf-8'), etiquetas))
+
+    @property
+    def etiquetas_confirmadas(self):
+        """Etiquetas que com certeza saíram dos buffers e chegaram à impressora
+
+        Desconta dos enviados os lotes mais recentes que cabem nos buffers do
+        socket (envio e recepção, que o kernel pode dobrar): se a conexão cair,
+        é a partir daqui que se deve reenviar para não perder etiquetas.
+        """
+        return self.etiquetas_enviadas - sum(etiquetas for _, etiquetas in self._recentes)
+
+    @property
+    def com_erro(self):
+        return self._erro is not None
+
+    def aguardar(self):
+        """Espera todos os lotes enfileirados serem transmitidos"""
+        self._fila.join()
+        self._verificar_erro()
+
+    def fechar(self):
+        if self._thread.is_alive():
+            self._fila.put(_FIM)
+            self._thread.join()
+        self._desconectar()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def _verificar_erro(self):
+        if self._erro is not None:
+            raise ErroImpressora(f"{self.host}:{self.porta}: {self._erro}") from self._erro
+
+    def _escritor(self):
+        while True:
+            lote = self._fila.get()
+            try:
+                if lote is _FIM:
+                    return
+                # Depois de uma falha os lotes restantes são descartados; o erro
+                # é repassado ao produtor no próximo write() ou aguardar()
+                if self._erro is None:
+                    dados, etiquetas = lote
+                    self._enviar(dados)
+                    self.etiquetas_enviadas += etiquetas
+                    self._registrar_recente(dados, etiquetas)
+            except OSError as erro:
+                self._erro = erro
+            finally:
+                self._fila.task_done()
+
+    def _registrar_recente(self, dados, etiquetas):
+        janela = 4 * (self.buffer_socket or BUFFER_SOCKET)
+        self._recentes.append((dados, etiquetas))
+        self._bytes_recentes += len(dados)
+        while self._recentes and self._bytes_recentes - len(self._recentes[0][0]) >= janela:
+            self._bytes_recentes -= len(self._recentes.popleft()[0])
+
+    def _enviar(self, lote):
+        # Os lotes terminam sempre em ^XZ, então reenviar lotes inteiros após
+        # uma queda não deixa etiqueta cortada (no pior caso repete algumas)
+        for tentativa in range(self.tentativas):
+            try:
+                if self._socket is not None and not self._conexao_viva():
+                    self._desconectar()
+                    self.reconexoes += 1
+                    self._caiu = True
+                if self._socket is None:
+                    self._conectar()
+                    if self._caiu:
+                        # O que estava nos buffers quando a conexão caiu se perdeu
+                        for dados, _ in self._recentes:
+                            self._socket.sendall(dados)
+                        self._caiu = False
+                self._socket.sendall(lote)
+                self.bytes_enviados += len(lote)
+                self.lotes_enviados += 1
+                return
+            except OSError:
+                self._desconectar()
+                self._caiu = True
+                if tentativa == self.tentativas - 1:
+                    raise
+                self.reconexoes += 1
+                time.sleep(min(0.1 * 2 ** tentativa, 2.0))
+
+    def _conectar(self):
+        self._socket = socket.create_connection((self.host, self.porta), timeout=self.timeout)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.buffer_socket:
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.buffer_socket)
+
+    def _conexao_viva(self):
+        # A impressora não manda nada sem ser consultada: se o socket ficou
+        # legível, ou chegou um EOF (conexão fechada do outro lado) ou um erro.
+        # Sem essa verificação o primeiro lote após a queda iria para o buffer
+        # do kernel e se perderia sem erro nenhum.
+        legiveis, _, _ = select.select([self._socket], [], [], 0)
+        if not legiveis:
+            return True
+        try:
+            return self._socket.recv(1, socket.MSG_PEEK) != b""
+        except OSError:
+            return False
+
+    def _desconectar(self):
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            finally:
+                self._socket = None
+
+
+class SpoolerImpressoras:
+    """Pool de conexões abertas, uma por impressora, reaproveitadas entre trabalhos"""
+
+    def __init__(self, **opcoes):
+        self.opcoes = opcoes
+        self._impressoras = {}
+
+    def obter(self, endereco):
+        if isinstance(endereco, str):
+            endereco = interpretar_endereco(endereco)
+        impressora = self._impressoras.get(endereco)
+        if impressora is not None and impressora.com_erro:
+            # Conexão que falhou num trabalho anterior: começa de novo
+            impressora.fechar()
+            impressora = None
+        if impressora is None:
+            self._impressoras[endereco] = Impressora(*endereco, **self.opcoes)
+        return self._impressoras[endereco]
+
+    def imprimir_arquivo(self, csv_path, endereco, tamanho_buffer=TAMANHO_BUFFER, armazenado=False,
+                         agrupar=False, ordenar=False, serializar=False):
+        """Converte um CSV e envia as etiquetas direto para a impressora"""
+        impressora = self.obter(endereco)
+        estatisticas = {"arquivo": csv_path, "saida": f"{impressora.host}:{impressora.porta}",
+                        "etiquetas": 0}
+        bytes_antes = impressora.bytes_enviados
+        inicio = time.perf_counter()
+
+        with closing(ler_arquivo(csv_path, estatisticas)) as registros:
+            prefixo, etiquetas = preparar_registros(registros, armazenado, agrupar=agrupar,
+                                                    ordenar=ordenar, serializar=serializar)
+            impressora.write(prefixo)
+            escrever_em_blocos(etiquetas, impressora, tamanho_buffer, estatisticas,
+                               com_quantidade=True)
+        impressora.aguardar()
+
+        estatisticas["bytes"] = impressora.bytes_enviados - bytes_antes
+        estatisticas["segundos"] = time.perf_counter() - inicio
+        estatisticas["linhas_por_segundo"] = _taxa(estatisticas["linhas"], estatisticas["segundos"])
+        return estatisticas
+
+    def fechar(self):
+        for impressora in self._impressoras.values():
+            impressora.fechar()
+        self._impressoras.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+def imprimir_lote(arquivos, enderecos, **opcoes):
+    """Distribui os arquivos entre as impressoras e imprime em paralelo
+
+    O arquivo i vai para a impressora i % len(enderecos); cada impressora
+    recebe os seus arquivos em sequência, na ordem de entrada.
+    """
+    with SpoolerImpressoras() as spooler:
+        def imprimir_fila(indice):
+            resumo = []
+            for csv_path in arquivos[indice::len(enderecos)]:
+                try:
+                    resumo.append(spooler.imprimir_arquivo(csv_path, enderecos[indice], **opcoes))
+                except (OSError, ValueError, ErroImpressora) as erro:
+                    resumo.append({"arquivo": csv_path, "saida": enderecos[indice], "erro": str(erro)})
+            return resumo
+
+        # Cria as conexões antes das threads para não disputar o dicionário do pool
+        for endereco in enderecos:
+            spooler.obter(endereco)
+        with ThreadPoolExecutor(max_workers=len(enderecos)) as pool:
+            filas = list(pool.map(imprimir_fila, range(len(enderecos))))
+
+    # Devolve o resumo na ordem original dos arquivos
+    resumo = [None] * len(arquivos)
+    for indice, fila in enumerate(filas):
+        resumo[indice::len(enderecos)] = fila
+    return resumo
+
+
+def _derrubar(cliente):
+    try:
+        # Linger zero: o close manda RST, como uma impressora reiniciada, e o
+        # que estava nos buffers se perde
+        cliente.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        cliente.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class ImpressoraFalsa:
+    """Servidor TCP local que se comporta como uma Zebra na porta 9100
+
+    Conta bytes e etiquetas (^XZ) recebidos. atraso_por_bloco simula uma
+    impressora lenta (para exercitar o bloqueio do gerador) e
+    derrubar_conexoes() simula quedas de rede (para exercitar a reconexão).
+    """
+
+    def __init__(self, host="127.0.0.1", porta=0, atraso_por_bloco=0.0, guardar=False,
+                 buffer_socket=BUFFER_SOCKET):
+        self.atraso_por_bloco = atraso_por_bloco
+        self.guardar = guardar
+        self.bytes_recebidos = 0
+        self.etiquetas_recebidas = 0
+        self.conexoes = 0
+        self.recebido = bytearray()
+        self._trava = threading.Lock()
+        self._clientes = set()
+        self._parada = False
+
+        falsa = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                falsa._receber(self.request)
+
+        self._servidor = socketserver.ThreadingTCPServer((host, porta), Handler,
+                                                         bind_and_activate=False)
+        self._servidor.daemon_threads = True
+        self._servidor.allow_reuse_address = True
+        # Buffer de recepção pequeno, como numa impressora de verdade; é
+        # herdado pelas conexões aceitas
+        self._servidor.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, buffer_socket)
+        self._servidor.server_bind()
+        self._servidor.server_activate()
+        self._thread = None
+
+    @property
+    def endereco(self):
+        return self._servidor.server_address[:2]
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        # Uma reconexão aceita enquanto o servidor termina continuaria
+        # recebendo como se a impressora estivesse no ar: _receber derruba as
+        # conexões que chegam depois daqui
+        with self._trava:
+            self._parada = True
+        self.derrubar_conexoes()
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def derrubar_conexoes(self):
+        with self._trava:
+            clientes = list(self._clientes)
+        for cliente in clientes:
+            _derrubar(cliente)
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+
+    def _receber(self, cliente):
+        with self._trava:
+            self._clientes.add(cliente)
+            self.conexoes += 1
+            parada = self._parada
+        if parada:
+            # Aceita antes do parar(), mas a thread só começou depois
+            _derrubar(cliente)
+        cauda = b""
+        # Cada conexão guarda o que recebeu e junta em recebido no fim, como
+        # uma impressora que atende uma conexão por vez (sem intercalar bytes)
+        proprio = bytearray()
+        try:
+            while True:
+                dados = cliente.recv(65536)
+                if not dados:
+                    break
+                janela = cauda + dados
+                with self._trava:
+                    self.bytes_recebidos += len(dados)
+                    self.etiquetas_recebidas += janela.count(b"^XZ")
+                if self.guardar:
+                    proprio += dados
+                # Guarda o final do bloco para não perder um ^XZ dividido entre dois recv
+                cauda = janela[-2:]
+                if self.atraso_por_bloco:
+                    time.sleep(self.atraso_por_bloco)
+        except OSError:
+            pass
+        finally:
+            with self._trava:
+                self._clientes.discard(cliente)
+                self.recebido += proprio
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Impressora Zebra falsa para testes")
+    parser.add_argument("--servidor-falso", action="store_true", required=True)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=PORTA_PADRAO)
+    parser.add_argument("--atraso", type=float, default=0.0,
+                        help="segundos de espera a cada bloco recebido")
+    args = parser.parse_args(argv)
+
+    with ImpressoraFalsa(args.host, args.porta, args.atraso) as falsa:
+        print(f"Impressora falsa ouvindo em {falsa.endereco[0]}:{falsa.endereco[1]}")
+        ultimo = None
+        try:
+            while True:
+                time.sleep(1)
+                atual = (falsa.bytes_recebidos, falsa.etiquetas_recebidas)
+                if atual != ultimo:
+                    print(f"{atual[1]} etiquetas, {atual[0]} bytes, {falsa.conexoes} conexões")
+                    ultimo = atual
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
+
@@ -0,0 +1,95 @@
+"""Reimpressão incremental: só gera etiquetas para linhas novas ou alteradas
+
+Cada registro é identificado por sku + local e guarda no índice o hash de
+sku, local, gtin e nome da última execução. Na execução seguinte só passam
+os registros cuja chave é nova ou cujo hash mudou; opcionalmente também os
+que sumiram do CSV. O índice só é gravado depois que a conversão termina.
+"""
+import hashlib
+import json
+import os
+
+from conversor import Registro, converter_arquivo
+
+
+def chave_registro(registro):
+    return f"{registro.sku}\t{registro.local}"
+
+
+def hash_registro(registro):
+    conteudo = "\t".join((registro.sku, registro.local, registro.gtin, registro.nome))
+    return hashlib.blake2b(conteudo.encode('utf-8'), digest_size=8).hexdigest()
+
+
+class IndiceConteudo:
+    """Índice persistente chave -> [hash, nome, gtin] da última execução
+
+    nome e gtin ficam guardados para que as linhas removidas ainda possam
+    ser impressas depois que saíram do CSV.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.anterior = {}
+        self.atual = {}
+        self.contagem = {"novas": 0, "alteradas": 0, "inalteradas": 0, "removidas": 0}
+        if os.path.exists(caminho):
+            with open(caminho, 'r', encoding='utf-8') as arquivo:
+                self.anterior = json.load(arquivo)
+
+    def filtrar(self, registros, incluir_removidos=False):
+        """Gera só os registros novos ou alterados, registrando todos no índice atual"""
+        for registro in registros:
+            chave = chave_registro(registro)
+            assinatura = hash_registro(registro)
+            self.atual[chave] = [assinatura, registro.nome, registro.gtin]
+
+            antigo = self.anterior.get(chave)
+            if antigo is None:
+                self.contagem["novas"] += 1
+            elif antigo[0] != assinatura:
+                self.contagem["alteradas"] += 1
+            else:
+                self.contagem["inalteradas"] += 1
+                continue
+            yield registro
+
+        for chave, (_, nome, gtin) in self.anterior.items():
+            if chave in self.atual:
+                continue
+            self.contagem["removidas"] += 1
+            if incluir_removidos:
+                sku, local = chave.split("\t")
+                yield Registro(nome, local, sku, gtin)
+
+    def salvar(self):
+        """Grava o índice atual de forma atômica (arquivo temporário + replace)"""
+        temporario = self.caminho + ".tmp"
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump(self.atual, arquivo, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temporario, self.caminho)
+
+
+def caminho_indice(csv_path, diretorio):
+    nome = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(diretorio, nome + ".indice.json")
+
+
+def converter_incremental(csv_path, output_path, diretorio_indice, incluir_removidos=False,
+                          filtro=None, **opcoes):
+    """Converte só o que mudou desde a última execução e atualiza o índice do arquivo
+
+    filtro, se informado, é aplicado antes da comparação com o índice.
+    """
+    os.makedirs(diretorio_indice, exist_ok=True)
+    indice = IndiceConteudo(caminho_indice(csv_path, diretorio_indice))
+
+    def filtrar(registros):
+        if filtro is not None:
+            registros = filtro(registros)
+        return indice.filtrar(registros, incluir_removidos)
+
+    estatisticas = converter_arquivo(csv_path, output_path, filtro=filtrar, **opcoes)
+    indice.salvar()
+    estatisticas.update(indice.contagem)
+    return estatisticas
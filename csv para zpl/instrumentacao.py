@@ -0,0 +1,134 @@
+"""Medição opcional do tempo de cada etapa da geração de etiquetas
+
+As etapas do conversor são geradores encadeados (leitura -> pareamento ->
+formatação), então o tempo de um next() numa etapa inclui o das etapas
+anteriores. Instrumentacao.etapa guarda esse tempo inclusivo e o resumo
+desconta a etapa anterior da cadeia para chegar ao tempo de cada uma.
+A escrita é medida à parte, envolvendo o arquivo de saída.
+
+Uso:
+    instrumentacao = Instrumentacao()
+    estatisticas = converter_arquivo(csv_path, output_path, instrumentacao=instrumentacao)
+    instrumentacao.salvar("etapas.json")
+"""
+import cProfile
+import io
+import json
+import pstats
+import sys
+import time
+from contextlib import contextmanager
+
+
+class Instrumentacao:
+    """Tempo acumulado e número de chamadas por etapa, mais contadores livres"""
+
+    def __init__(self):
+        self.etapas = {}
+        self.contadores = {}
+        self._cadeia = []
+        self._inicio = time.perf_counter()
+
+    def _etapa(self, nome):
+        etapa = self.etapas.get(nome)
+        if etapa is None:
+            etapa = self.etapas[nome] = {"segundos": 0.0, "chamadas": 0}
+        return etapa
+
+    def etapa(self, nome, iteravel):
+        """Envolve um gerador da cadeia e mede cada next() (tempo inclusivo)
+
+        As etapas devem ser envolvidas na ordem da cadeia, da fonte para o fim.
+        """
+        if nome not in self._cadeia:
+            self._cadeia.append(nome)
+        return self._medir_iterador(self._etapa(nome), iter(iteravel))
+
+    @staticmethod
+    def _medir_iterador(etapa, iterador):
+        relogio = time.perf_counter
+        while True:
+            inicio = relogio()
+            try:
+                item = next(iterador)
+            except StopIteration:
+                etapa["segundos"] += relogio() - inicio
+                return
+            etapa["segundos"] += relogio() - inicio
+            etapa["chamadas"] += 1
+            yield item
+
+    @contextmanager
+    def medir(self, nome):
+        """Mede um trecho de código fora da cadeia de geradores"""
+        etapa = self._etapa(nome)
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            etapa["segundos"] += time.perf_counter() - inicio
+            etapa["chamadas"] += 1
+
+    def contar(self, nome, quantidade=1):
+        self.contadores[nome] = self.contadores.get(nome, 0) + quantidade
+
+    def saida(self, arquivo, nome="escrita"):
+        """Devolve um objeto com write() que mede o tempo e conta os bytes escritos"""
+        return _SaidaMedida(self, arquivo, nome)
+
+    def resumo(self):
+        """Tempos por etapa (com o tempo próprio das etapas da cadeia) e contadores"""
+        # Etapas da cadeia primeiro, na ordem do fluxo
+        nomes = self._cadeia + [nome for nome in self.etapas if nome not in self._cadeia]
+        etapas = {nome: dict(self.etapas[nome]) for nome in nomes}
+        anterior = 0.0
+        for nome in self._cadeia:
+            inclusivo = self.etapas[nome]["segundos"]
+            etapas[nome]["segundos"] = max(inclusivo - anterior, 0.0)
+            etapas[nome]["segundos_inclusivo"] = inclusivo
+            anterior = inclusivo
+        return {
+            "etapas": etapas,
+            "contadores": dict(self.contadores),
+            "segundos_total": time.perf_counter() - self._inicio,
+        }
+
+    def salvar(self, caminho, **extras):
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            json.dump({**extras, **self.resumo()}, arquivo, ensure_ascii=False, indent=2)
+
+
+class _SaidaMedida:
+    def __init__(self, instrumentacao, arquivo, nome):
+        self._instrumentacao = instrumentacao
+        self._arquivo = arquivo
+        self._nome = nome
+
+    def write(self, texto):
+        with self._instrumentacao.medir(self._nome):
+            resultado = self._arquivo.write(texto)
+        self._instrumentacao.contar("bytes_escritos", len(texto.encode('utf-8')))
+        return resultado
+
+
+def imprimir_etapas(resumo, saida=sys.stdout):
+    """Tabela legível do resumo de uma Instrumentacao"""
+    total = resumo["segundos_total"]
+    for nome, etapa in resumo["etapas"].items():
+        fracao = etapa["segundos"] / total * 100 if total > 0 else 0.0
+        print(f"  {nome:<12} {etapa['segundos']:9.3f}s {fracao:5.1f}%  {etapa['chamadas']:>10} chamadas",
+              file=saida)
+    for nome, valor in resumo["contadores"].items():
+        print(f"  {nome:<12} {valor:>10}", file=saida)
+
+
+def executar_com_profile(funcao, caminho, *args, linhas=20, **kwargs):
+    """Executa funcao sob o cProfile, grava as estatísticas em caminho e mostra as mais caras"""
+    profile = cProfile.Profile()
+    try:
+        return profile.runcall(funcao, *args, **kwargs)
+    finally:
+        profile.dump_stats(caminho)
+        texto = io.StringIO()
+        pstats.Stats(profile, stream=texto).sort_stats("cumulative").print_stats(linhas)
+        print(texto.getvalue(), file=sys.stderr)
@@ -0,0 +1,375 @@
+"""Trabalhos de impressão em lotes numerados, com manifesto e checkpoint
+
+Se a impressora engasga na etiqueta 8.000 de 20.000, hoje é preciso
+reimprimir tudo ou cortar o .zpl à mão. Aqui o trabalho é gerado uma vez
+num diretório, em lotes de ETIQUETAS_POR_LOTE etiquetas
+(lote_00001.zpl, lote_00002.zpl...), mais:
+
+    manifesto.json   de onde veio (CSV, tamanho, mtime, opções) e, para cada
+                     lote, o arquivo, a primeira etiqueta e quantas tem, e
+                     o primeiro bloco ZPL e quantos tem
+    checkpoint.json  o primeiro lote que ainda não foi confirmado
+
+A impressão manda os lotes a partir do checkpoint e avança o checkpoint
+conforme a impressora confirma o recebimento (ver
+Impressora.etiquetas_confirmadas). Retomar é rodar de novo: os lotes já
+estão no disco e o CSV não é lido outra vez. Quando o problema é no papel
+e não na rede, --desde-etiqueta recomeça do lote que contém a etiqueta
+informada.
+
+Etiquetas são as que saem da impressora: com --agrupar-repetidas ou
+--serializar um bloco ZPL imprime várias (^PQ), e a numeração de
+--desde-etiqueta segue a contagem física, a mesma do contador da
+impressora. Os blocos só são usados para casar com as confirmações da
+Impressora, que conta blocos enviados.
+
+O CSV é lido e pareado num processo só (o pareamento e o agrupamento
+dependem da ordem); a formatação e a gravação dos lotes rodam em paralelo
+num pool de processos. No formato armazenado cada lote começa com o ^DF,
+para funcionar mesmo se a impressora foi reiniciada (R: é memória volátil).
+
+Uso:
+    python lotes.py gerar entrada.csv -d trabalho -j 4 --por-lote 500
+    python lotes.py imprimir trabalho --impressora 192.168.0.50
+    python lotes.py imprimir trabalho --impressora 192.168.0.50 --desde-etiqueta 8000
+    python lotes.py estado trabalho
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import closing
+from itertools import islice
+
+from conversor import (_formatar_pares, agrupar_repetidas, formato_armazenado, ler_arquivo,
+                       parear_registros)
+
+ETIQUETAS_POR_LOTE = 500
+
+NOME_MANIFESTO = "manifesto.json"
+NOME_CHECKPOINT = "checkpoint.json"
+
+
+def nome_lote(numero):
+    return f"lote_{numero:05d}.zpl"
+
+
+def _gravar_json(caminho, dados):
+    """Grava de forma atômica: um checkpoint pela metade seria pior que nenhum"""
+    descritor, temporario = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(caminho))
+    try:
+        with os.fdopen(descritor, 'w', encoding='utf-8') as arquivo:
+            json.dump(dados, arquivo, ensure_ascii=False, indent=2)
+        os.replace(temporario, caminho)
+    except BaseException:
+        os.unlink(temporario)
+        raise
+
+
+def _ler_json(caminho):
+    with open(caminho, 'r', encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+
+def _gravar_lote(tarefa):
+    """Formata e grava um lote; roda nos processos do pool"""
+    caminho, pares, armazenado, agrupar, serializar = tarefa
+    etiquetas = "".join(_formatar_pares(pares, armazenado, agrupar, serializar))
+    temporario = caminho + ".parcial"
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        if armazenado:
+            arquivo.write(formato_armazenado())
+        arquivo.write(etiquetas)
+    os.replace(temporario, caminho)
+    return os.path.getsize(caminho)
+
+
+def _impressas(pares, agrupar, serializar):
+    """Etiquetas físicas dos pares: agrupados e séries levam a quantidade do ^PQ no índice 2"""
+    if agrupar or serializar:
+        return sum(par[2] for par in pares)
+    return len(pares)
+
+
+def _pares(registros, agrupar, serializar):
+    pares = parear_registros(registros)
+    if serializar:
+        from serializacao import serializar_pares
+        return serializar_pares(pares)
+    if agrupar:
+        return agrupar_repetidas(pares)
+    return pares
+
+
+def _fonte(csv_path, opcoes):
+    info = os.stat(csv_path)
+    return {"csv": os.path.abspath(csv_path), "tamanho": info.st_size,
+            "mtime_ns": info.st_mtime_ns, "opcoes": opcoes}
+
+
+def gerar_trabalho(csv_path, diretorio, etiquetas_por_lote=ETIQUETAS_POR_LOTE, processos=None,
+                   armazenado=False, agrupar=False, serializar=False, ordenar=False):
+    """Gera os lotes e o manifesto de um CSV em diretorio e devolve o manifesto
+
+    Se o diretório já tem um manifesto do mesmo CSV (tamanho e mtime) com
+    as mesmas opções, nada é refeito. "etiquetas" conta as etiquetas
+    impressas e "blocos" os blocos ZPL, como em converter_arquivo (com
+    agrupar ou serializar, um bloco pode imprimir várias etiquetas).
+    """
+    opcoes = {"etiquetas_por_lote": etiquetas_por_lote, "armazenado": armazenado,
+              "agrupar": agrupar, "serializar": serializar, "ordenar": ordenar}
+    fonte = _fonte(csv_path, opcoes)
+    caminho_manifesto = os.path.join(diretorio, NOME_MANIFESTO)
+    if os.path.exists(caminho_manifesto):
+        manifesto = _ler_json(caminho_manifesto)
+        if manifesto["fonte"] == fonte and all(
+                os.path.exists(os.path.join(diretorio, lote["arquivo"]))
+                for lote in manifesto["lotes"]):
+            return manifesto
+
+    os.makedirs(diretorio, exist_ok=True)
+    # Um trabalho novo começa do primeiro lote
+    for nome in (NOME_MANIFESTO, NOME_CHECKPOINT):
+        if os.path.exists(os.path.join(diretorio, nome)):
+            os.remove(os.path.join(diretorio, nome))
+
+    inicio = time.perf_counter()
+    estatisticas = {}
+    lotes = []
+    with closing(ler_arquivo(csv_path, estatisticas)) as registros:
+        if ordenar:
+            from ordenacao import ordenar_registros
+            registros = ordenar_registros(registros)
+        pares = _pares(registros, agrupar, serializar)
+
+        def tarefas():
+            primeira = primeiro_bloco = 1
+            while True:
+                bloco = list(islice(pares, etiquetas_por_lote))
+                if not bloco:
+                    return
+                numero = len(lotes) + 1
+                impressas = _impressas(bloco, agrupar, serializar)
+                lotes.append({"arquivo": nome_lote(numero), "primeira": primeira,
+                              "etiquetas": impressas, "primeiro_bloco": primeiro_bloco,
+                              "blocos": len(bloco)})
+                primeira += impressas
+                primeiro_bloco += len(bloco)
+                yield os.path.join(diretorio, lotes[-1]["arquivo"]), bloco, armazenado, agrupar, serializar
+
+        processos = processos or os.cpu_count() or 1
+        if processos == 1:
+            tamanhos = list(map(_gravar_lote, tarefas()))
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=processos) as pool:
+                tamanhos = _mapear_limitado(pool, _gravar_lote, tarefas(), 2 * processos)
+
+    for lote, tamanho in zip(lotes, tamanhos):
+        lote["bytes"] = tamanho
+    # Lotes de um trabalho anterior maior que este
+    numero = len(lotes) + 1
+    while os.path.exists(os.path.join(diretorio, nome_lote(numero))):
+        os.remove(os.path.join(diretorio, nome_lote(numero)))
+        numero += 1
+
+    manifesto = {
+        "fonte": fonte,
+        "linhas": estatisticas["linhas"],
+        "ignoradas": estatisticas["ignoradas"],
+        "etiquetas": sum(lote["etiquetas"] for lote in lotes),
+        "blocos": sum(lote["blocos"] for lote in lotes),
+        "segundos": time.perf_counter() - inicio,
+        "lotes": lotes,
+    }
+    # O manifesto por último: sem ele o diretório não vale como trabalho pronto
+    _gravar_json(caminho_manifesto, manifesto)
+    return manifesto
+
+
+def _mapear_limitado(pool, funcao, tarefas, pendentes):
+    """Como pool.map, mas com no máximo pendentes tarefas em voo (pool.map consome tudo antes)"""
+    resultados = []
+    futuros = []
+    for tarefa in tarefas:
+        futuros.append(pool.submit(funcao, tarefa))
+        if len(futuros) - len(resultados) >= pendentes:
+            resultados.append(futuros[len(resultados)].result())
+    resultados.extend(futuro.result() for futuro in futuros[len(resultados):])
+    return resultados
+
+
+def ler_checkpoint(diretorio):
+    """Índice (a partir de 0) do primeiro lote ainda não confirmado"""
+    caminho = os.path.join(diretorio, NOME_CHECKPOINT)
+    if not os.path.exists(caminho):
+        return 0
+    return _ler_json(caminho)["proximo_lote"]
+
+
+def gravar_checkpoint(diretorio, proximo_lote, manifesto):
+    lotes = manifesto["lotes"]
+    _gravar_json(os.path.join(diretorio, NOME_CHECKPOINT), {
+        "proximo_lote": proximo_lote,
+        "proxima_etiqueta": lotes[proximo_lote]["primeira"] if proximo_lote < len(lotes) else None,
+        "concluido": proximo_lote >= len(lotes),
+        "atualizado": time.strftime("%Y-%m-%d %H:%M:%S"),
+    })
+
+
+def lote_da_etiqueta(manifesto, etiqueta):
+    """Índice do lote que contém a etiqueta impressa (numerada a partir de 1)"""
+    for indice, lote in enumerate(manifesto["lotes"]):
+        if lote["primeira"] <= etiqueta < lote["primeira"] + lote["etiquetas"]:
+            return indice
+    raise ValueError(f"o trabalho tem {manifesto['etiquetas']} etiquetas; {etiqueta} não existe")
+
+
+def _fim_lote(lotes, origem, indice):
+    """Blocos enviados desde o começo do lote origem até o fim do lote indice"""
+    return lotes[indice]["primeiro_bloco"] + lotes[indice]["blocos"] - lotes[origem]["primeiro_bloco"]
+
+
+def imprimir_trabalho(diretorio, endereco, desde_etiqueta=None, impressora=None):
+    """Envia os lotes a partir do checkpoint e devolve as estatísticas do envio
+
+    O checkpoint avança a cada lote confirmado (ver
+    Impressora.etiquetas_confirmadas). Se a conexão cai, a própria
+    Impressora reconecta e reenvia o que estava nos buffers; se a
+    impressora não volta, o checkpoint fica no primeiro lote que pode não
+    ter chegado e ErroImpressora é levantado. impressora, se informada, é
+    uma Impressora já aberta.
+    """
+    from impressora import ErroImpressora, Impressora, interpretar_endereco
+
+    manifesto = _ler_json(os.path.join(diretorio, NOME_MANIFESTO))
+    lotes = manifesto["lotes"]
+    inicial = ler_checkpoint(diretorio) if desde_etiqueta is None else \
+        lote_da_etiqueta(manifesto, desde_etiqueta)
+    gravar_checkpoint(diretorio, inicial, manifesto)
+
+    propria = impressora is None
+    if propria:
+        impressora = Impressora(*interpretar_endereco(endereco))
+    # etiquetas_enviadas (blocos) da impressora no começo do lote inicial
+    base = impressora.etiquetas_enviadas
+    confirmado = proximo = inicial
+    reconexoes = impressora.reconexoes
+    inicio = time.perf_counter()
+
+    def avancar():
+        # Lotes inteiros cujas etiquetas já passaram dos buffers
+        nonlocal confirmado
+        recebidas = impressora.etiquetas_confirmadas - base
+        anterior = confirmado
+        while confirmado < proximo and _fim_lote(lotes, inicial, confirmado) <= recebidas:
+            confirmado += 1
+        if confirmado != anterior:
+            gravar_checkpoint(diretorio, confirmado, manifesto)
+
+    try:
+        while proximo < len(lotes):
+            lote = lotes[proximo]
+            with open(os.path.join(diretorio, lote["arquivo"]), 'r', encoding='utf-8') as arquivo:
+                impressora.write(arquivo.read(), lote["blocos"])
+            proximo += 1
+            avancar()
+        impressora.aguardar()
+    except ErroImpressora:
+        avancar()
+        raise
+    finally:
+        if propria:
+            impressora.fechar()
+    # Tudo transmitido sem erro
+    gravar_checkpoint(diretorio, len(lotes), manifesto)
+
+    enviadas = sum(lote["etiquetas"] for lote in lotes[inicial:])
+    segundos = time.perf_counter() - inicio
+    return {"arquivo": manifesto["fonte"]["csv"], "saida": endereco, "lotes": len(lotes) - inicial,
+            "etiquetas": enviadas, "primeiro_lote": inicial + 1,
+            "reconexoes": impressora.reconexoes - reconexoes,
+            "segundos": segundos}
+
+
+def estado_trabalho(diretorio):
+    manifesto = _ler_json(os.path.join(diretorio, NOME_MANIFESTO))
+    proximo = ler_checkpoint(diretorio)
+    lotes = manifesto["lotes"]
+    return {
+        "arquivo": manifesto["fonte"]["csv"],
+        "lotes": len(lotes),
+        "etiquetas": manifesto["etiquetas"],
+        "lotes_confirmados": proximo,
+        "etiquetas_confirmadas": sum(lote["etiquetas"] for lote in lotes[:proximo]),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Trabalhos de impressão em lotes retomáveis")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    gerar = comandos.add_parser("gerar", help="gera os lotes e o manifesto de um CSV")
+    gerar.add_argument("csv_path")
+    gerar.add_argument("-d", "--diretorio", required=True, help="diretório do trabalho")
+    gerar.add_argument("--por-lote", type=int, default=ETIQUETAS_POR_LOTE,
+                       help=f"blocos ZPL por lote (padrão: {ETIQUETAS_POR_LOTE}); sem agrupar "
+                            "nem serializar, cada bloco é uma etiqueta")
+    gerar.add_argument("-j", "--processos", type=int, default=None,
+                       help="processos que formatam e gravam os lotes (padrão: número de CPUs)")
+    gerar.add_argument("--formato-armazenado", action="store_true",
+                       help="grava o layout na impressora (^DF) e envia só os campos (^XF/^FN)")
+    gerar.add_argument("--agrupar-repetidas", action="store_true",
+                       help="etiquetas idênticas em sequência saem num único bloco com ^PQ")
+    gerar.add_argument("--serializar", action="store_true",
+                       help="sequências numéricas saem num único bloco com ^SF e ^PQ")
+    gerar.add_argument("--ordenar-local", action="store_true",
+                       help="gera as etiquetas na ordem do percurso: por localização e depois SKU")
+
+    imprimir = comandos.add_parser("imprimir", help="envia os lotes a partir do checkpoint")
+    imprimir.add_argument("diretorio")
+    imprimir.add_argument("--impressora", required=True, metavar="HOST[:PORTA]")
+    imprimir.add_argument("--desde-etiqueta", type=int, metavar="N",
+                          help="recomeça do lote que contém a etiqueta impressa N (a primeira é 1; "
+                               "com ^PQ conta cada cópia)")
+
+    estado = comandos.add_parser("estado", help="mostra quantos lotes já foram confirmados")
+    estado.add_argument("diretorio")
+
+    args = parser.parse_args(argv)
+    from impressora import ErroImpressora
+    try:
+        if args.comando == "gerar":
+            if args.por_lote < 1:
+                parser.error("--por-lote precisa ser pelo menos 1")
+            manifesto = gerar_trabalho(args.csv_path, args.diretorio, args.por_lote, args.processos,
+                                       args.formato_armazenado, args.agrupar_repetidas,
+                                       args.serializar, args.ordenar_local)
+            print(f"{len(manifesto['lotes'])} lotes, {manifesto['etiquetas']} etiquetas em "
+                  f"{args.diretorio} ({manifesto['segundos']:.2f}s)")
+        elif args.comando == "imprimir":
+            resultado = imprimir_trabalho(args.diretorio, args.impressora, args.desde_etiqueta)
+            print(f"{resultado['etiquetas']} etiquetas em {resultado['lotes']} lotes enviadas para "
+                  f"{resultado['saida']} a partir do lote {resultado['primeiro_lote']} "
+                  f"({resultado['segundos']:.2f}s)"
+                  + (f", {resultado['reconexoes']} reconexões" if resultado["reconexoes"] else ""))
+        else:
+            resultado = estado_trabalho(args.diretorio)
+            print(f"{resultado['arquivo']}: {resultado['lotes_confirmados']} de {resultado['lotes']} "
+                  f"lotes confirmados ({resultado['etiquetas_confirmadas']} de "
+                  f"{resultado['etiquetas']} etiquetas)")
+    except ErroImpressora as erro:
+        estado = estado_trabalho(args.diretorio)
+        print(f"Erro: {erro}\nCheckpoint no lote {estado['lotes_confirmados'] + 1}; rode o mesmo "
+              "comando de novo para retomar", file=sys.stderr)
+        return 1
+    except (OSError, ValueError) as erro:
+        print(f"Erro: {erro}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,26 @@
-import tkinter as tk
-from tkinter import filedialog
+import argparse
+
+from conversor import converter_arquivo
+
+def gerar_zpl_personalizado(instrumentar=None):
+    """Pede o CSV e o destino e converte; com instrumentar, grava os tempos por etapa nesse JSON"""
+    # tkinter só quando a janela é usada: --help e o import ficam leves
+    import tkinter as tk
+    from tkinter import filedialog
+
+    from colunar import extensoes_disponiveis
 
-def gerar_zpl_personalizado():
     root = tk.Tk()
     root.withdraw()
 
+    # Só os formatos que este ambiente (ou o executável) consegue ler
+    tipos = [("Arquivos CSV", "*.csv")]
+    extensoes = extensoes_disponiveis()
+    if extensoes:
+        tipos.append(("Planilhas e exportações do ERP", " ".join("*" + e for e in extensoes)))
     csv_path = filedialog.askopenfilename(
         title="Selecione o arquivo CSV",
-        filetypes=[("Arquivos CSV", "*.csv")]
+        filetypes=tipos + [("Todos os arquivos", "*.*")]
     )
     if not csv_path:
         print("Arquivo CSV não selecionado!")
@@ -22,91 +35,33 @@ def gerar_zpl_personalizado():
         print("Arquivo de saída não selecionado!")
         return
 
-    with open(csv_path, 'r', encoding='utf-8') as file:
-        lines = file.readlines()
-
-    if not lines:
-        print("O arquivo CSV está vazio!")
-        return
-
-    header = lines[0].strip().split(',')
-    header = [h.strip() for h in header]
+    instrumentacao = None
+    if instrumentar:
+        from instrumentacao import Instrumentacao
+        instrumentacao = Instrumentacao()
 
     try:
-        idx_nome = header.index("nome")
-        idx_local = header.index("local")
-        idx_sku = header.index("sku")
-        idx_gtin = header.index("gtin")
-    except ValueError:
-        print("Erro: Certifique-se de que o CSV contenha os cabeçalhos: nome, local, sku, gtin")
+        estatisticas = converter_arquivo(csv_path, output_path, instrumentacao=instrumentacao)
+    except ValueError as erro:
+        print(erro)
         return
 
-    zpl_output = ""
-    waiting_record = None 
-
-    col2_x = 415
-
-    for i, line in enumerate(lines[1:]):
-        line = line.strip()
-        if not line:
-            continue
-
-        fields = line.split(',')
-        if len(fields) < len(header):
-            continue
-        fields = [f.strip() for f in fields]
-
-        record = {
-            "nome": fields[idx_nome][:15],
-            "local": fields[idx_local],
-            "sku": fields[idx_sku],
-            "gtin": fields[idx_gtin]
-        }
-
-        if waiting_record is None:
-            waiting_record = record
-        else:
-            left = waiting_record
-            right = record
-            waiting_record = None
-
-            left_data = f"{left['sku']} - {left['local']} | {left['nome']}"
-            left_gtin = left['gtin']
-            right_data = f"{right['sku']} - {right['local']} | {right['nome']}"
-            right_gtin = right['gtin']
-
-            label = "^XA\n"
-            label += "^PW780\n" 
-            label += "^LL240\n"
-
-            label += "^FO10,10^A0N,25,25^FD" + left_data + "^FS\n" 
-            label += "^FO10,40^BY2,2.0,50^BCN,50,Y,N,N^FD" + left_gtin + "^FS\n"
-
-            label += f"^FO{col2_x},10^A0N,25,25^FD" + right_data + "^FS\n"
-            label += f"^FO{col2_x},40^BY2,2.0,50^BCN,50,Y,N,N^FD" + right_gtin + "^FS\n"
-
-            label += "^XZ\n" 
-            zpl_output += label
-
-    if waiting_record is not None:
-        left = waiting_record
-        left_data = f"{left['sku']} - {left['local']} | {left['nome']}"
-        left_gtin = left['gtin']
-        label = "^XA\n"
-        label += "^PW780\n"
-        label += "^LL240\n"
-        label += "^FO10,10^A0N,25,25^FD" + left_data + "^FS\n"
-        label += "^FO10,40^BY2,2.0,50^BCN,50,Y,N,N^FD" + left_gtin + "^FS\n"
-        label += f"^FO{col2_x},10^A0N,25,25^FD^FS\n"
-        label += f"^FO{col2_x},40^BY2,2.0,50^BCN,50,Y,N,N^FD^FS\n"
-        label += "^XZ\n"
-
-        zpl_output += label
-
-    with open(output_path, 'w', encoding='utf-8') as out_file:
-        out_file.write(zpl_output)
+    if instrumentacao is not None:
+        instrumentacao.salvar(instrumentar, arquivo=csv_path, saida=output_path)
 
     print(f"Arquivo ZPL gerado com sucesso: {output_path}")
+    print(f"{estatisticas['linhas']} linhas, {estatisticas['etiquetas']} etiquetas "
+          f"em {estatisticas['segundos']:.2f}s ({estatisticas['linhas_por_segundo']:.0f} linhas/s)")
 
 if __name__ == "__main__":
-    gerar_zpl_personalizado()
+    parser = argparse.ArgumentParser(description="Gera etiquetas ZPL a partir de um CSV")
+    parser.add_argument("--instrumentar", metavar="ARQUIVO",
+                        help="grava o tempo de leitura, pareamento, formatação e escrita neste JSON")
+    parser.add_argument("--profile", metavar="ARQUIVO",
+                        help="executa sob o cProfile e grava as estatísticas neste arquivo")
+    args = parser.parse_args()
+    if args.profile:
+        from instrumentacao import executar_com_profile
+        executar_com_profile(gerar_zpl_personalizado, args.profile, args.instrumentar)
+    else:
+        gerar_zpl_personalizado(args.instrumentar)
@@ -9,11 +9,16 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    # Importado por nome em colunar.py, o PyInstaller não enxerga sozinho. O
+    # pyarrow (Parquet/Arrow) fica de fora: depende do numpy, excluído abaixo, e
+    # a janela só oferece os formatos cujo pacote está disponível
+    hiddenimports=['openpyxl'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # main.py e o conversor usam só a biblioteca padrão (e tkinter); estes
+    # pacotes ficam de fora mesmo que estejam instalados no ambiente do build
+    excludes=['numpy', 'PIL', 'barcode', 'matplotlib', 'pandas', 'cv2', 'IPython'],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
@@ -0,0 +1,317 @@
+"""Serviço que vigia uma pasta e converte os CSVs assim que terminam de chegar
+
+Os operadores salvam as exportações do Google Sheets ("Planilha sem título
+- Página1 (NN).csv") numa pasta compartilhada; este serviço percebe o
+arquivo novo, espera ele acabar de ser gravado, converte num pool de
+processos e coloca o .zpl na pasta de saída.
+
+Um arquivo é considerado completo quando tamanho e mtime ficam
+TEMPO_ESTAVEL segundos sem mudar. A varredura é por polling (só
+biblioteca padrão, funciona em compartilhamentos de rede, onde inotify e
+afins não avisam), a cada INTERVALO_VARREDURA; com os valores padrão o
+ZPL sai em menos de um segundo depois que a gravação termina.
+
+O .zpl é gravado com outro nome e renomeado no fim, então quem lê a
+pasta de saída nunca vê um arquivo pela metade. Cada conversão é
+registrada num diário (JSON Lines, com fsync) com nome, tamanho, mtime e
+hash do conteúdo: depois de reiniciar, o que já foi convertido não é
+convertido de novo. Um arquivo regravado com o mesmo conteúdo só é
+pulado se o .zpl dele ainda está na pasta de saída; se o .zpl já foi
+consumido, soltar o CSV de novo é o jeito de reimprimir.
+
+Uso:
+    python monitor_pasta.py entrada_csv -o saida_zpl -j 4 --formato-armazenado
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from cache_registros import hash_arquivo
+from cli import caminho_saida, converter_um, imprimir_resumo
+from colunar import EXTENSOES
+
+# Intervalo entre as varreduras da pasta
+INTERVALO_VARREDURA = 0.1
+
+# Tempo que tamanho e mtime precisam ficar parados para o arquivo ser
+# considerado completo
+TEMPO_ESTAVEL = 0.2
+
+# Entradas mantidas no diário quando ele é compactado na inicialização
+LIMITE_DIARIO = 10_000
+
+NOME_DIARIO = ".diario_conversoes.jsonl"
+
+# Arquivos temporários de navegadores e editores enquanto a cópia não termina
+_PREFIXOS_TEMPORARIOS = (".", "~$")
+
+# CSV e as exportações do ERP em Parquet, Arrow e XLSX
+_EXTENSOES = (".csv",) + EXTENSOES
+
+
+class Diario:
+    """Registro persistente (JSON Lines) das conversões já feitas"""
+
+    def __init__(self, caminho, limite=LIMITE_DIARIO):
+        self.caminho = caminho
+        # (hash, saida) -> entrada mais recente
+        self.por_conteudo = {}
+        self.assinaturas = set()
+        entradas = []
+        if os.path.exists(caminho):
+            with open(caminho, 'r', encoding='utf-8') as arquivo:
+                for linha in arquivo:
+                    try:
+                        entradas.append(json.loads(linha))
+                    except ValueError:
+                        # Última linha cortada por uma queda no meio da gravação
+                        continue
+        for entrada in entradas:
+            self._lembrar(entrada)
+        if len(entradas) > limite:
+            self._compactar(limite)
+
+    def _lembrar(self, entrada):
+        self.por_conteudo[(entrada["hash"], entrada["saida"])] = entrada
+        self.assinaturas.add((entrada["arquivo"], entrada["tamanho"], entrada["mtime_ns"]))
+
+    def conhece(self, nome, tamanho, mtime_ns):
+        return (nome, tamanho, mtime_ns) in self.assinaturas
+
+    def convertido(self, hash_conteudo, saida):
+        """Entrada de uma conversão sem erro do mesmo conteúdo para saida, se o .zpl ainda existe"""
+        entrada = self.por_conteudo.get((hash_conteudo, saida))
+        if entrada is None or "erro" in entrada or not os.path.exists(saida):
+            return None
+        return entrada
+
+    def registrar(self, entrada):
+        linha = json.dumps(entrada, ensure_ascii=False) + "\n"
+        with open(self.caminho, 'a', encoding='utf-8') as arquivo:
+            arquivo.write(linha)
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+        self._lembrar(entrada)
+
+    def _compactar(self, limite):
+        # Uma entrada por conteúdo e saída, as mais recentes
+        entradas = list(self.por_conteudo.values())[-limite:]
+        temporario = self.caminho + ".tmp"
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            for entrada in entradas:
+                arquivo.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+        os.replace(temporario, self.caminho)
+        self.por_conteudo = {}
+        self.assinaturas = set()
+        for entrada in entradas:
+            self._lembrar(entrada)
+
+
+class MonitorPasta:
+    """Vigia entrada e converte cada CSV completo para saida, uma vez só"""
+
+    def __init__(self, entrada, saida, processos=None, caminho_diario=None,
+                 intervalo=INTERVALO_VARREDURA, tempo_estavel=TEMPO_ESTAVEL, **opcoes):
+        self.entrada = entrada
+        self.saida = saida
+        self.processos = processos or os.cpu_count() or 1
+        self.intervalo = intervalo
+        self.tempo_estavel = tempo_estavel
+        self.opcoes = opcoes
+        os.makedirs(saida, exist_ok=True)
+        self.diario = Diario(caminho_diario or os.path.join(saida, NOME_DIARIO))
+        # nome -> ((tamanho, mtime_ns), parado desde, detectado em) da varredura anterior
+        self._vistos = {}
+        # nome -> (tamanho, mtime_ns) do que já foi tratado nesta execução
+        self._tratados = {}
+        self._pendentes = {}
+        self._pool = None
+        self._parar = False
+
+    def varrer(self):
+        """Devolve as entradas completas e não convertidas: [(nome, tamanho, mtime_ns, detectado)]"""
+        agora = time.perf_counter()
+        prontos = []
+        vistos = {}
+        try:
+            entradas = list(os.scandir(self.entrada))
+        except FileNotFoundError:
+            return prontos
+        for entrada in entradas:
+            nome = entrada.name
+            if not nome.lower().endswith(_EXTENSOES) or nome.startswith(_PREFIXOS_TEMPORARIOS):
+                continue
+            try:
+                info = entrada.stat()
+            except FileNotFoundError:
+                continue
+            atual = (info.st_size, info.st_mtime_ns)
+            anterior = self._vistos.get(nome)
+            if anterior is None:
+                vistos[nome] = (atual, agora, agora)
+                continue
+            assinatura, desde, detectado = anterior
+            if assinatura != atual:
+                # Ainda sendo gravado
+                vistos[nome] = (atual, agora, detectado)
+                continue
+            vistos[nome] = anterior
+            if self._tratados.get(nome) == atual or nome in self._pendentes:
+                continue
+            # Tempo medido pelo relógio local desde que tamanho e mtime
+            # pararam de mudar: o relógio do servidor do compartilhamento
+            # pode estar adiantado ou atrasado
+            if agora - desde >= self.tempo_estavel:
+                prontos.append((nome, *atual, detectado))
+        self._vistos = vistos
+        # Arquivos apagados da entrada podem voltar com o mesmo nome
+        for nome in list(self._tratados):
+            if nome not in vistos:
+                del self._tratados[nome]
+        return prontos
+
+    def _registrar(self, nome, tamanho, mtime_ns, hash_conteudo, resultado):
+        entrada = {"arquivo": nome, "tamanho": tamanho, "mtime_ns": mtime_ns,
+                   "hash": hash_conteudo, "saida": resultado.get("saida"),
+                   "quando": time.strftime("%Y-%m-%d %H:%M:%S")}
+        if "erro" in resultado:
+            entrada["erro"] = resultado["erro"]
+        else:
+            entrada["etiquetas"] = resultado["etiquetas"]
+        self.diario.registrar(entrada)
+        self._tratados[nome] = (tamanho, mtime_ns)
+
+    def _criar_pool(self):
+        pool = ProcessPoolExecutor(max_workers=self.processos)
+        # Sobe os processos agora para a primeira conversão não pagar por isso
+        for aquecimento in [pool.submit(int) for _ in range(self.processos)]:
+            aquecimento.result()
+        return pool
+
+    def _enviar(self, *argumentos):
+        try:
+            return self._pool.submit(converter_um, *argumentos, **self.opcoes)
+        except BrokenProcessPool:
+            # Um processo do pool morreu (falta de memória, por exemplo) e o
+            # pool não aceita mais tarefas; as pendentes terminam com erro
+            print("Pool de conversão quebrado; criando outro", file=sys.stderr, flush=True)
+            self._pool.shutdown(wait=False)
+            self._pool = self._criar_pool()
+            return self._pool.submit(converter_um, *argumentos, **self.opcoes)
+
+    def _despachar(self, nome, tamanho, mtime_ns, detectado):
+        csv_path = os.path.join(self.entrada, nome)
+        if self.diario.conhece(nome, tamanho, mtime_ns):
+            self._tratados[nome] = (tamanho, mtime_ns)
+            return
+        try:
+            hash_conteudo = hash_arquivo(csv_path)
+        except OSError:
+            # Ainda bloqueado por quem está gravando (Windows) ou já apagado
+            return
+        destino = caminho_saida(csv_path, self.saida)
+        anterior = self.diario.convertido(hash_conteudo, destino)
+        if anterior is not None:
+            print(f"IGUAL {csv_path}: mesmo conteúdo, {destino} já existe", flush=True)
+            self._registrar(nome, tamanho, mtime_ns, hash_conteudo, anterior)
+            return
+
+        # O nome definitivo só aparece com o arquivo completo
+        temporario = destino + ".parcial"
+        futuro = self._enviar((csv_path, temporario))
+        self._pendentes[nome] = (futuro, tamanho, mtime_ns, hash_conteudo, destino, detectado)
+
+    def _concluir(self, nome):
+        futuro, tamanho, mtime_ns, hash_conteudo, destino, detectado = self._pendentes.pop(nome)
+        temporario = destino + ".parcial"
+        try:
+            resultado = futuro.result()
+        except Exception as erro:
+            # Processo do pool que morreu, por exemplo; o serviço continua
+            resultado = {"arquivo": os.path.join(self.entrada, nome), "saida": temporario,
+                         "erro": f"{type(erro).__name__}: {erro}"}
+        if "erro" not in resultado:
+            os.replace(temporario, destino)
+        elif os.path.exists(temporario):
+            os.remove(temporario)
+        resultado["saida"] = destino
+        resultado["latencia"] = time.perf_counter() - detectado
+        imprimir_resumo([resultado])
+        if "erro" not in resultado:
+            print(f"      {resultado['latencia']:.3f}s desde que o arquivo foi detectado", flush=True)
+        self._registrar(nome, tamanho, mtime_ns, hash_conteudo, resultado)
+        return resultado
+
+    def executar(self, duracao=None):
+        """Vigia a pasta até parar() (ou por duracao segundos); devolve os resultados"""
+        resultados = []
+        fim = None if duracao is None else time.perf_counter() + duracao
+        self._pool = self._criar_pool()
+        try:
+            while not self._parar and (fim is None or time.perf_counter() < fim):
+                for nome, tamanho, mtime_ns, detectado in self.varrer():
+                    self._despachar(nome, tamanho, mtime_ns, detectado)
+                futuros = {item[0]: nome for nome, item in self._pendentes.items()}
+                if futuros:
+                    prontos, _ = wait(futuros, timeout=self.intervalo, return_when=FIRST_COMPLETED)
+                    for futuro in prontos:
+                        resultados.append(self._concluir(futuros[futuro]))
+                else:
+                    time.sleep(self.intervalo)
+            for nome in list(self._pendentes):
+                resultados.append(self._concluir(nome))
+        finally:
+            self._pool.shutdown()
+            self._pool = None
+        return resultados
+
+    def parar(self):
+        self._parar = True
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(description="Vigia uma pasta e converte os CSVs que chegam")
+    parser.add_argument("entrada", help="pasta onde os CSVs são salvos")
+    parser.add_argument("-o", "--saida", required=True, help="pasta onde os .zpl são colocados")
+    parser.add_argument("-j", "--processos", type=int, default=None,
+                        help="conversões simultâneas (padrão: número de CPUs)")
+    parser.add_argument("--diario", help=f"arquivo do diário (padrão: <saida>/{NOME_DIARIO})")
+    parser.add_argument("--intervalo", type=float, default=INTERVALO_VARREDURA,
+                        help=f"segundos entre as varreduras (padrão: {INTERVALO_VARREDURA})")
+    parser.add_argument("--tempo-estavel", type=float, default=TEMPO_ESTAVEL,
+                        help="segundos sem mudar para o arquivo ser considerado completo "
+                             f"(padrão: {TEMPO_ESTAVEL})")
+    parser.add_argument("--formato-armazenado", action="store_true",
+                        help="grava o layout na impressora (^DF) e envia só os campos (^XF/^FN)")
+    parser.add_argument("--agrupar-repetidas", action="store_true",
+                        help="etiquetas idênticas em sequência saem num único bloco com ^PQ")
+    parser.add_argument("--serializar", action="store_true",
+                        help="sequências numéricas saem num único bloco com ^SF e ^PQ")
+    parser.add_argument("--ordenar-local", action="store_true",
+                        help="gera as etiquetas na ordem do percurso: por localização e depois SKU")
+    return parser
+
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    monitor = MonitorPasta(args.entrada, args.saida, args.processos, args.diario,
+                           args.intervalo, args.tempo_estavel,
+                           armazenado=args.formato_armazenado, agrupar=args.agrupar_repetidas,
+                           serializar=args.serializar, ordenar=args.ordenar_local)
+    print(f"Vigiando {os.path.abspath(args.entrada)} -> {os.path.abspath(args.saida)} "
+          "(Ctrl+C para sair)", flush=True)
+    try:
+        monitor.executar()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Ordenação dos registros por localização e SKU, para imprimir na ordem do percurso
+
+Os estoquistas colam as etiquetas andando pelos endereços (A1A, B2J,
+B1PLC...), então a ordem do CSV não serve. As localizações são comparadas
+em ordem natural (B2 antes de B10) e, dentro da mesma localização, os
+SKUs também; empates mantêm a ordem do CSV.
+
+Arquivos de qualquer tamanho são ordenados com memória limitada: os
+registros são lidos em lotes de até limite_registros, cada lote é ordenado
+e gravado num arquivo temporário (um "run") e no fim os runs são
+intercalados com heapq.merge, que mantém só um bloco de cada run na
+memória. Se tudo couber num lote, nada vai para o disco.
+"""
+import heapq
+import os
+import pickle
+import re
+import tempfile
+from itertools import islice
+
+from conversor import Registro
+
+# Registros ordenados em memória antes de gravar um run no disco
+LIMITE_REGISTROS = 200_000
+
+# Registros por pickle dentro de um run; é o que cada run ocupa na memória
+# durante a intercalação
+REGISTROS_POR_BLOCO = 4096
+
+_NUMEROS = re.compile(r"(\d+)")
+
+
+def chave_natural(texto):
+    """Chave que compara os trechos numéricos pelo valor: B2 < B10"""
+    partes = _NUMEROS.split(texto)
+    # split com grupo deixa texto nas posições pares e números nas ímpares
+    partes[1::2] = map(int, partes[1::2])
+    return partes
+
+
+def chave_percurso(registro):
+    return chave_natural(registro.local), chave_natural(registro.sku)
+
+
+def _gravar_run(registros, diretorio):
+    descritor, caminho = tempfile.mkstemp(suffix=".run", dir=diretorio)
+    with os.fdopen(descritor, 'wb') as arquivo:
+        for inicio in range(0, len(registros), REGISTROS_POR_BLOCO):
+            # Tuplas simples: o pickle de um namedtuple guarda também a classe
+            bloco = [tuple(r) for r in registros[inicio:inicio + REGISTROS_POR_BLOCO]]
+            pickle.dump(bloco, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+    return caminho
+
+
+def _ler_run(caminho):
+    with open(caminho, 'rb') as arquivo:
+        while True:
+            try:
+                bloco = pickle.load(arquivo)
+            except EOFError:
+                return
+            yield from map(Registro._make, bloco)
+
+
+def ordenar_registros(registros, limite_registros=LIMITE_REGISTROS, diretorio=None):
+    """Gera os registros ordenados por localização e SKU, com no máximo limite_registros em memória
+
+    diretorio é onde os runs temporários são criados (padrão: o temporário
+    do sistema); eles são apagados ao terminar, mesmo se a leitura parar
+    no meio.
+    """
+    registros = iter(registros)
+    lote = list(islice(registros, limite_registros))
+    lote.sort(key=chave_percurso)
+    if len(lote) < limite_registros:
+        yield from lote
+        return
+
+    with tempfile.TemporaryDirectory(prefix="ordenacao_", dir=diretorio) as temporario:
+        runs = []
+        while lote:
+            runs.append(_gravar_run(lote, temporario))
+            lote.clear()
+            lote.extend(islice(registros, limite_registros))
+            lote.sort(key=chave_percurso)
+        # merge é estável entre os runs, que estão na ordem do CSV
+        yield from heapq.merge(*(_ler_run(caminho) for caminho in runs), key=chave_percurso)
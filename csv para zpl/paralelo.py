@@ -0,0 +1,303 @@
+"""Conversão de um único CSV muito grande usando vários processos
+
+O arquivo é mapeado em memória (mmap) e cortado em pedaços que terminam
+em quebra de linha; cada pedaço é lido e formatado num processo e os
+resultados são escritos na ordem original.
+
+O pareamento esquerda/direita depende de quantos registros válidos vieram
+antes, o que um pedaço só descobre depois que os anteriores foram lidos.
+Cada processo lê o seu pedaço, publica quantos registros encontrou e
+espera só a contagem dos pedaços anteriores (que já estão rodando, porque
+as tarefas saem da fila em ordem) para saber se começa pela esquerda ou
+pela direita. O registro que sobra no fim de um pedaço e o que sobra no
+começo do seguinte são juntados na escrita, então a saída é idêntica à
+de converter_arquivo, byte a byte.
+
+Campos entre aspas podem conter quebras de linha: uma quebra só separa
+registros fora de um campo entre aspas (mesmas regras de ler_registros,
+ver conversor.termina_entre_aspas). Se um pedaço começa ou não dentro de
+um campo só se sabe depois de percorrer os anteriores; por isso cada
+pedaço é percorrido nos dois casos, em paralelo, os resultados são
+encadeados na ordem e os cortes que caem dentro de um campo são
+empurrados para a próxima quebra que fecha o campo.
+
+Codificação, separador e linha do cabeçalho são detectados como em
+ler_csv (ver deteccao.py); como os cortes são feitos em bytes, só
+codificações em que a quebra de linha é um byte só (UTF-8, cp1252) são
+aceitas.
+
+Uso:
+    estatisticas = converter_paralelo("exportacao.csv", "exportacao.zpl", processos=16)
+"""
+import io
+import mmap
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+from conversor import (CABECALHOS, ColunasRegistros, formatar_etiqueta,
+                       formatar_etiqueta_armazenada, formato_armazenado, ler_registros,
+                       termina_entre_aspas)
+from deteccao import AMOSTRA, CODIFICACOES_ASCII, detectar_formato
+
+# Tamanho máximo de cada pedaço; limita a memória de cada processo, que
+# guarda os registros do pedaço até saber como parear
+TAMANHO_PEDACO = 8 * 1024 * 1024
+
+# Pedaços menores que isso não compensam o custo de despachar a tarefa
+TAMANHO_MINIMO_PEDACO = 256 * 1024
+
+# Contagem de registros por pedaço (-1 enquanto o pedaço não foi lido) e a
+# condição usada para esperar os pedaços anteriores; definidas em cada
+# processo por _iniciar_processo
+_contagens = None
+_condicao = None
+
+
+def _iniciar_processo(contagens, condicao):
+    global _contagens, _condicao
+    _contagens = contagens
+    _condicao = condicao
+
+
+def dividir_pedacos(dados, inicio, quantidade):
+    """Posições de corte de dados[inicio:] em até quantidade pedaços, sempre depois de um \\n
+
+    Devolve a lista de posições, começando em inicio e terminando em len(dados).
+    """
+    fim = len(dados)
+    tamanho = max((fim - inicio) // max(quantidade, 1), 1)
+    cortes = [inicio]
+    for i in range(1, quantidade):
+        alvo = max(inicio + i * tamanho, cortes[-1])
+        quebra = dados.find(b"\n", alvo)
+        if quebra == -1:
+            break
+        if quebra + 1 < fim and quebra + 1 > cortes[-1]:
+            cortes.append(quebra + 1)
+    cortes.append(fim)
+    return cortes
+
+
+def _publicar_contagem(indice, quantidade):
+    with _condicao:
+        _contagens[indice] = quantidade
+        _condicao.notify_all()
+
+
+def _paridade_anterior(indice, quantidade):
+    """Publica a contagem do pedaço e devolve a paridade dos registros anteriores a ele"""
+    _publicar_contagem(indice, quantidade)
+    with _condicao:
+        _condicao.wait_for(lambda: all(_contagens[i] >= 0 for i in range(indice)))
+        return sum(_contagens[i] for i in range(indice)) % 2
+
+
+def _estados_do_pedaco(tarefa):
+    """Se o pedaço termina dentro de um campo entre aspas, começando fora e começando dentro"""
+    csv_path, inicio, fim, separador = tarefa
+    with open(csv_path, 'rb') as arquivo, \
+            mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ) as dados:
+        return tuple(termina_entre_aspas(dados, separador, aberto, inicio, fim)
+                     for aberto in (False, True))
+
+
+def _fim_do_campo(dados, posicao, separador):
+    """Posição depois da primeira quebra fora de aspas, partindo de dentro de um campo"""
+    aberto = True
+    while aberto:
+        quebra = dados.find(b"\n", posicao)
+        if quebra == -1:
+            return len(dados)
+        aberto = termina_entre_aspas(dados, separador, aberto, posicao, quebra + 1)
+        posicao = quebra + 1
+    return posicao
+
+
+def _ajustar_aspas(dados, cortes, estados, separador):
+    """Move para a frente os cortes que caíram dentro de um campo entre aspas
+
+    estados[i] é o resultado de _estados_do_pedaco para cortes[i]:cortes[i + 1].
+    """
+    ajustados = [cortes[0]]
+    aberto = False
+    for corte, (depois_de_fora, depois_de_dentro) in zip(cortes[1:-1], estados):
+        aberto = depois_de_dentro if aberto else depois_de_fora
+        if corte <= ajustados[-1]:
+            # Já engolido por um corte anterior que andou para a frente
+            continue
+        posicao = _fim_do_campo(dados, corte, separador) if aberto else corte
+        if posicao < len(dados):
+            ajustados.append(posicao)
+    ajustados.append(cortes[-1])
+    return ajustados
+
+
+def _converter_pedaco(tarefa):
+    """Lê e formata um pedaço; devolve o registro solto do começo, o ZPL e o solto do fim"""
+    csv_path, indice, inicio, fim, cabecalho, armazenado, codificacao, erros, separador = tarefa
+    estatisticas = {}
+    try:
+        with open(csv_path, 'rb') as arquivo, \
+                mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ) as dados:
+            # Mesma leitura em modo texto de converter_arquivo (inclusive as
+            # quebras de linha universais)
+            texto = io.TextIOWrapper(io.BytesIO(dados[inicio:fim]), encoding=codificacao,
+                                     errors=erros)
+            registros = ColunasRegistros(ler_registros(chain([cabecalho], texto), estatisticas,
+                                                       separador))
+    except BaseException:
+        # Os pedaços seguintes esperam por esta contagem; o erro chega ao
+        # processo principal pelo resultado da tarefa
+        _publicar_contagem(indice, 0)
+        raise
+
+    # Com paridade ímpar o primeiro registro é a direita da última etiqueta
+    # do pedaço anterior
+    paridade = _paridade_anterior(indice, len(registros))
+    primeiro = registros[0] if paridade and registros else None
+    fim = len(registros)
+    ultimo = None
+    if (fim - paridade) % 2:
+        fim -= 1
+        ultimo = registros[fim]
+
+    formatar = formatar_etiqueta_armazenada if armazenado else formatar_etiqueta
+    corpo = "".join(formatar(left, right) for left, right in registros.pares(paridade, fim))
+    estatisticas["etiquetas"] = (fim - paridade) // 2
+    return primeiro, corpo, ultimo, estatisticas
+
+
+def converter_paralelo(csv_path, output_path, processos=None, armazenado=False, agrupar=False,
+                       ordenar=False, serializar=False, tamanho_pedaco=TAMANHO_PEDACO):
+    """Converte um CSV em ZPL dividindo o trabalho entre processos
+
+    Produz o mesmo arquivo que converter_arquivo (sem filtro) e devolve as
+    mesmas estatísticas, mais "pedacos" e "processos". O agrupamento com
+    ^PQ, a serialização e a ordenação atravessariam os pedaços e não são
+    suportados.
+    """
+    if agrupar or ordenar or serializar:
+        raise ValueError("o modo paralelo não agrupa, serializa nem ordena as etiquetas")
+    if not csv_path.lower().endswith(".csv"):
+        # Parquet, Arrow e XLSX já são lidos sem dividir texto (ver colunar.py)
+        raise ValueError("o modo paralelo só lê CSV; converta sem --paralelo")
+    processos = processos or os.cpu_count() or 1
+    estatisticas = {"arquivo": csv_path, "saida": output_path, "linhas": 0, "ignoradas": 0,
+                    "motivos": {}, "etiquetas": 0}
+    inicio = time.perf_counter()
+
+    with open(csv_path, 'rb') as arquivo:
+        tamanho = os.fstat(arquivo.fileno()).st_size
+        amostra = arquivo.read(AMOSTRA)
+        formato = detectar_formato(amostra, CABECALHOS, completa=tamanho <= len(amostra))
+        if formato.codificacao not in CODIFICACOES_ASCII:
+            raise ValueError(f"o modo paralelo não lê CSV em {formato.codificacao}; "
+                             "converta sem --paralelo")
+        arquivo.seek(formato.bom)
+        for _ in range(formato.linhas_antes):
+            arquivo.readline()
+        cabecalho = arquivo.readline()
+        inicio_dados = arquivo.tell()
+    # O BOM já foi pulado
+    codificacao = "utf-8" if formato.codificacao == "utf-8-sig" else formato.codificacao
+    cabecalho = cabecalho.decode(codificacao, formato.erros)
+    # Cabeçalho inválido ou arquivo vazio: mesmo ValueError do conversor,
+    # antes de criar a saída
+    next(ler_registros([cabecalho] if cabecalho else [], separador=formato.separador), None)
+    # Os cortes são procurados nos bytes
+    separador = formato.separador.encode(codificacao)
+
+    # Pedaços de no máximo tamanho_pedaco, e pelo menos um por processo
+    # quando o arquivo é grande o bastante
+    restante = tamanho - inicio_dados
+    quantidade = max(-(-restante // tamanho_pedaco),
+                     min(processos, restante // TAMANHO_MINIMO_PEDACO), 1)
+
+    with open(output_path, 'w', encoding='utf-8') as saida:
+        if quantidade == 1 or processos == 1:
+            cortes = _cortes_do_arquivo(csv_path, inicio_dados, quantidade, separador, map)
+            _iniciar_processo([-1] * (len(cortes) - 1), threading.Condition())
+            tarefas = _tarefas(csv_path, cortes, cabecalho, armazenado, codificacao,
+                               formato.erros, formato.separador)
+            _escrever_resultados(map(_converter_pedaco, tarefas), saida, armazenado, estatisticas)
+        else:
+            # Os cortes só diminuem a quantidade de pedaços, então as
+            # contagens compartilhadas podem ser criadas junto com o pool
+            contexto = multiprocessing.get_context()
+            contagens = contexto.Array('q', [-1] * quantidade, lock=False)
+            with ProcessPoolExecutor(max_workers=min(processos, quantidade), mp_context=contexto,
+                                     initializer=_iniciar_processo,
+                                     initargs=(contagens, contexto.Condition())) as pool:
+                cortes = _cortes_do_arquivo(csv_path, inicio_dados, quantidade, separador,
+                                            pool.map)
+                tarefas = _tarefas(csv_path, cortes, cabecalho, armazenado, codificacao,
+                                   formato.erros, formato.separador)
+                _escrever_resultados(pool.map(_converter_pedaco, tarefas), saida, armazenado,
+                                     estatisticas)
+
+    estatisticas["pedacos"] = len(cortes) - 1
+    estatisticas["processos"] = processos
+    estatisticas["bytes"] = os.path.getsize(output_path)
+    estatisticas["segundos"] = time.perf_counter() - inicio
+    segundos = estatisticas["segundos"]
+    estatisticas["linhas_por_segundo"] = estatisticas["linhas"] / segundos if segundos > 0 else 0.0
+    return estatisticas
+
+
+def _cortes_do_arquivo(csv_path, inicio, quantidade, separador, mapear):
+    """Cortes dos pedaços; mapear é map ou o map de um pool (para percorrer as aspas)
+
+    separador vem em bytes.
+    """
+    with open(csv_path, 'rb') as arquivo:
+        if os.fstat(arquivo.fileno()).st_size <= inicio:
+            return [inicio, inicio]
+        with mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ) as dados:
+            cortes = dividir_pedacos(dados, inicio, quantidade)
+            if len(cortes) <= 2 or dados.find(b'"', inicio) == -1:
+                return cortes
+            estados = list(mapear(_estados_do_pedaco, [(csv_path, a, b, separador)
+                                                       for a, b in zip(cortes, cortes[1:])]))
+            return _ajustar_aspas(dados, cortes, estados, separador)
+
+
+def _tarefas(csv_path, cortes, cabecalho, armazenado, codificacao, erros, separador):
+    return [(csv_path, i, a, b, cabecalho, armazenado, codificacao, erros, separador)
+            for i, (a, b) in enumerate(zip(cortes, cortes[1:]))]
+
+
+def _escrever_resultados(resultados, saida, armazenado, estatisticas):
+    """Junta os pedaços na ordem, formando as etiquetas que atravessam dois pedaços"""
+    formatar = formatar_etiqueta_armazenada if armazenado else formatar_etiqueta
+    pendente = None
+    prefixo = formato_armazenado() if armazenado else ""
+
+    def escrever(dados):
+        nonlocal prefixo
+        if prefixo:
+            # Como no conversor, o ^DF só sai se houver alguma etiqueta
+            saida.write(prefixo)
+            prefixo = ""
+        saida.write(dados)
+
+    for primeiro, corpo, ultimo, parcial in resultados:
+        if primeiro is not None:
+            escrever(formatar(pendente, primeiro))
+            estatisticas["etiquetas"] += 1
+            pendente = None
+        if corpo:
+            escrever(corpo)
+        if ultimo is not None:
+            pendente = ultimo
+        for nome in ("linhas", "ignoradas", "etiquetas"):
+            estatisticas[nome] += parcial.get(nome, 0)
+        for motivo, quantidade in parcial.get("motivos", {}).items():
+            estatisticas["motivos"][motivo] = estatisticas["motivos"].get(motivo, 0) + quantidade
+
+    if pendente is not None:
+        escrever(formatar(pendente))
+        estatisticas["etiquetas"] += 1
@@ -0,0 +1,117 @@
+"""Serialização na impressora (^SF + ^PQ) para sequências de etiquetas
+
+Etiquetas de endereço ou palete costumam vir com números em sequência
+(SKU 1001, 1002, 1003...). Em vez de gerar e enviar cada uma, uma série
+de etiquetas consecutivas em que cada campo é constante ou cresce sempre
+do mesmo passo vira um bloco só: a primeira etiqueta com ^SF nos campos
+que variam e ^PQ com o tamanho da série. A impressora faz a contagem.
+
+Os campos misturam texto e número ("1001 - B2K | Cabo"), então é usado
+^SF (máscara por caractere) e não ^SN, que serializa o campo inteiro.
+Numa série, só um trecho de dígitos de cada campo pode variar, e sem
+mudar de largura (999 -> 1000 encerra a série), porque a impressora
+incrementa só as posições marcadas na máscara. Etiquetas idênticas em
+sequência são uma série de passo zero e saem com ^PQ como em
+agrupar_repetidas.
+"""
+
+_DIGITOS = frozenset("0123456789")
+
+
+def campos_etiqueta(left, right=None):
+    """Os quatro campos impressos: texto e GTIN da esquerda e da direita"""
+    nome, local, sku, gtin = left
+    campos = [f"{sku} - {local} | {nome}", gtin]
+    if right is None:
+        return (*campos, "", "")
+    nome, local, sku, gtin = right
+    return (*campos, f"{sku} - {local} | {nome}", gtin)
+
+
+def diferenca_campo(anterior, atual):
+    """(inicio, fim, passo) do trecho de dígitos que cresceu de anterior para atual
+
+    Devolve (0, 0, 0) se os valores são iguais e None se a diferença não é
+    um único número que cresceu mantendo a largura.
+    """
+    if anterior == atual:
+        return 0, 0, 0
+    if len(anterior) != len(atual):
+        return None
+    inicio = next(i for i, (a, b) in enumerate(zip(anterior, atual)) if a != b)
+    fim = len(anterior) - next(i for i, (a, b) in enumerate(zip(reversed(anterior), reversed(atual)))
+                               if a != b)
+    while inicio > 0 and anterior[inicio - 1] in _DIGITOS:
+        inicio -= 1
+    while fim < len(anterior) and anterior[fim] in _DIGITOS:
+        fim += 1
+    trecho_anterior = anterior[inicio:fim]
+    trecho_atual = atual[inicio:fim]
+    if not (_DIGITOS.issuperset(trecho_anterior) and _DIGITOS.issuperset(trecho_atual)):
+        return None
+    passo = int(trecho_atual) - int(trecho_anterior)
+    if passo <= 0:
+        return None
+    return inicio, fim, passo
+
+
+def _diferencas(anterior, atual):
+    diferencas = tuple(map(diferenca_campo, anterior, atual))
+    return None if None in diferencas else diferencas
+
+
+def serializar_pares(pares):
+    """Junta pares consecutivos em séries: gera (esquerda, direita, quantidade, serie)
+
+    serie tem um (inicio, fim, passo) por campo de campos_etiqueta, com
+    passo zero nos campos constantes; é None quando a série tem uma
+    etiqueta só.
+    """
+    primeiro = None
+    for left, right in pares:
+        campos = campos_etiqueta(left, right)
+        if primeiro is not None:
+            diferencas = _diferencas(ultimos, campos)
+            if diferencas is not None and serie in (None, diferencas):
+                serie = diferencas
+                quantidade += 1
+                ultimos = campos
+                continue
+            yield primeiro[0], primeiro[1], quantidade, serie
+        primeiro = (left, right)
+        ultimos = campos
+        quantidade = 1
+        serie = None
+
+    if primeiro is not None:
+        yield primeiro[0], primeiro[1], quantidade, serie
+
+
+def mascara_incremento(valor, inicio, fim, passo):
+    """Parâmetros do ^SF que somam passo ao trecho valor[inicio:fim] a cada etiqueta"""
+    mascara = "%" * inicio + "D" * (fim - inicio) + "%" * (len(valor) - fim)
+    # O incremento é alinhado pela direita com a máscara
+    incremento = str(passo).zfill(fim - inicio) + "0" * (len(valor) - fim)
+    return mascara, incremento
+
+
+def aplicar_serie(etiqueta, campos, serie):
+    """Acrescenta ^SF aos campos que variam na etiqueta já formatada
+
+    Os campos aparecem em etiqueta na ordem de campos_etiqueta, cada um
+    num ^FD...^FS (nos dois formatos do conversor).
+    """
+    partes = []
+    posicao = 0
+    for valor, (inicio, fim, passo) in zip(campos, serie):
+        dados = etiqueta.find("^FD", posicao)
+        if dados == -1:
+            # Etiqueta sem coluna direita no formato armazenado
+            break
+        fecha = etiqueta.find("^FS", dados)
+        partes.append(etiqueta[posicao:fecha])
+        if passo:
+            partes.append("^SF{},{}".format(*mascara_incremento(valor, inicio, fim, passo)))
+        posicao = fecha
+    partes.append(etiqueta[posicao:])
+    return "".join(partes)
@@ -0,0 +1,579 @@
+"""Servidor HTTP local da interface web/ (asyncio, só biblioteca padrão)
+
+Rotas:
+    GET  /                     index.html, script.js e style.css de web/
+    GET  /config               impressoras configuradas
+    POST /converter?id=...     corpo = CSV; resposta = ZPL com chunked encoding
+    GET  /progresso?id=...     bytes recebidos, linhas lidas, etiquetas geradas
+    POST /imprimir?impressora= corpo = ZPL; repassado à impressora por TCP
+
+A conversão começa enquanto o upload ainda está chegando: o corpo é lido
+em blocos pelo loop de eventos e entregue por uma fila limitada a uma
+thread que roda o pipeline do conversor; as etiquetas voltam por outra
+fila e saem como chunks HTTP. Se a conversão não acompanha, o upload
+espera; se o cliente não lê a resposta, a conversão espera (drain a cada
+chunk). A exceção é enquanto o upload não terminou: navegadores e a
+maioria dos clientes só leem a resposta depois de mandar o corpo
+inteiro, e esperar por eles antes disso travaria os dois lados. Nesse
+intervalo até LIMITE_RESPOSTA_DURANTE_UPLOAD bytes ficam no buffer do
+transporte e o resto vai para um arquivo temporário, enviado assim que
+o upload termina. Cada requisição tem sua própria thread, então vários
+operadores convertem ao mesmo tempo sem um esperar o outro.
+
+Uso:
+    python servidor.py --porta 8080 --impressora 192.168.0.50
+"""
+import argparse
+import asyncio
+import codecs
+import json
+import mimetypes
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+from urllib.parse import parse_qs, quote, urlsplit
+
+from conversor import CABECALHOS, escrever_em_blocos, ler_registros, preparar_registros
+from deteccao import AMOSTRA, detectar_formato
+
+DIRETORIO_WEB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "web")
+
+PORTA_PADRAO = 8080
+
+# Tamanho dos blocos lidos do upload e dos chunks da resposta; menor que o
+# buffer de arquivo do conversor para o primeiro byte sair antes
+TAMANHO_BLOCO = 16 * 1024
+
+# Blocos aguardando em cada fila antes de o lado produtor esperar
+MAX_BLOCOS_PENDENTES = 8
+
+# Resposta mantida em memória, sem o cliente ler, enquanto o upload ainda
+# está chegando (ver acima); o que passa disso vai para o disco
+LIMITE_RESPOSTA_DURANTE_UPLOAD = 8 * 1024 * 1024
+
+# Conversões rodando ao mesmo tempo (as demais esperam uma thread livre)
+CONVERSOES_SIMULTANEAS = 8
+
+# Tempo que o progresso de uma conversão terminada continua consultável
+RETENCAO_PROGRESSO = 600
+
+_MOTIVOS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+            405: "Method Not Allowed", 411: "Length Required", 502: "Bad Gateway"}
+
+
+class ErroHttp(Exception):
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+
+class _Cancelado(Exception):
+    """O cliente desistiu (conexão fechada); a thread de trabalho para"""
+
+
+class Progresso:
+    """Estado de uma conversão, consultado por GET /progresso"""
+
+    def __init__(self, identificador, bytes_total=None):
+        self.id = identificador
+        self.bytes_total = bytes_total
+        self.bytes_recebidos = 0
+        self.bytes_enviados = 0
+        self.estatisticas = {}
+        # FormatoCSV detectado no começo do upload (ver deteccao.py)
+        self.formato = None
+        self.erro = None
+        self.concluida = False
+        self.inicio = time.time()
+        self.fim = None
+
+    def como_dict(self):
+        return {
+            "id": self.id,
+            "bytes_total": self.bytes_total,
+            "bytes_recebidos": self.bytes_recebidos,
+            "bytes_enviados": self.bytes_enviados,
+            "linhas": self.estatisticas.get("linhas", 0),
+            "ignoradas": self.estatisticas.get("ignoradas", 0),
+            "etiquetas": self.estatisticas.get("etiquetas", 0),
+            "concluida": self.concluida,
+            "erro": self.erro,
+            "segundos": (self.fim or time.time()) - self.inicio,
+        }
+
+
+async def ler_requisicao(reader):
+    """Lê a linha de requisição e os cabeçalhos; devolve (metodo, url, cabecalhos)"""
+    linha = await reader.readline()
+    if not linha:
+        raise ConnectionError("conexão fechada antes da requisição")
+    try:
+        metodo, url, _ = linha.decode('latin-1').split(" ", 2)
+    except ValueError:
+        raise ErroHttp(400, "linha de requisição inválida") from None
+
+    cabecalhos = {}
+    while True:
+        linha = await reader.readline()
+        if linha in (b"\r\n", b"\n", b""):
+            break
+        nome, _, valor = linha.decode('latin-1').partition(":")
+        cabecalhos[nome.strip().lower()] = valor.strip()
+    return metodo.upper(), url, cabecalhos
+
+
+def tamanho_corpo(cabecalhos):
+    """Content-Length da requisição, ou None se não veio"""
+    valor = cabecalhos.get("content-length")
+    if valor is None:
+        return None
+    # int() aceitaria sinal, espaços e sublinhados
+    if not (valor.isascii() and valor.isdigit()):
+        raise ErroHttp(400, f"Content-Length inválido: {valor!r}")
+    return int(valor)
+
+
+async def ler_corpo(reader, writer, cabecalhos):
+    """Gera o corpo da requisição em blocos, com Content-Length ou chunked"""
+    if cabecalhos.get("expect", "").lower() == "100-continue":
+        writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        await writer.drain()
+
+    if "chunked" in cabecalhos.get("transfer-encoding", "").lower():
+        while True:
+            linha = (await reader.readline()).split(b";")[0].strip()
+            try:
+                tamanho = int(linha or b"0", 16)
+            except ValueError:
+                raise ErroHttp(400, "corpo chunked inválido") from None
+            if tamanho == 0:
+                # Trailers opcionais até a linha em branco
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return
+            while tamanho:
+                dados = await reader.read(min(tamanho, TAMANHO_BLOCO))
+                if not dados:
+                    raise ConnectionError("upload interrompido")
+                tamanho -= len(dados)
+                yield dados
+            await reader.readexactly(2)
+    elif "content-length" in cabecalhos:
+        restante = tamanho_corpo(cabecalhos)
+        while restante > 0:
+            dados = await reader.read(min(restante, TAMANHO_BLOCO))
+            if not dados:
+                raise ConnectionError("upload interrompido")
+            restante -= len(dados)
+            yield dados
+    else:
+        raise ErroHttp(411, "informe Content-Length ou envie com Transfer-Encoding: chunked")
+
+
+def _iterar_fila(fila, loop):
+    """Lado da thread de trabalho: consome os blocos que o loop coloca na fila"""
+    while True:
+        bloco = asyncio.run_coroutine_threadsafe(fila.get(), loop).result()
+        if bloco is None:
+            return
+        if isinstance(bloco, BaseException):
+            raise bloco
+        yield bloco
+
+
+def _linhas(blocos):
+    """Reparte blocos de texto em linhas, como a iteração de um arquivo"""
+    resto = ""
+    for bloco in blocos:
+        partes = (resto + bloco).split("\n")
+        resto = partes.pop()
+        for parte in partes:
+            yield parte + "\n"
+    if resto:
+        yield resto
+
+
+def _detectar_formato(progresso, amostra, completa):
+    """Guarda o formato da amostra em progresso e devolve o decodificador incremental dele"""
+    progresso.formato = detectar_formato(amostra, CABECALHOS, completa)
+    return codecs.getincrementaldecoder(progresso.formato.codificacao)(progresso.formato.erros)
+
+
+async def _esvaziar(arquivo, writer):
+    """Manda para o cliente (com drain) os chunks guardados em arquivo e o fecha"""
+    try:
+        arquivo.seek(0)
+        while True:
+            bloco = arquivo.read(4 * TAMANHO_BLOCO)
+            if not bloco:
+                return
+            writer.write(bloco)
+            await writer.drain()
+    finally:
+        arquivo.close()
+
+
+class _SaidaFila:
+    """Objeto com write() que manda o texto para o loop de eventos"""
+
+    def __init__(self, enviar):
+        self._enviar = enviar
+
+    def write(self, texto):
+        if texto:
+            self._enviar(("dados", texto.encode('utf-8')))
+
+
+class ServidorEtiquetas:
+    def __init__(self, impressoras=(), diretorio_web=DIRETORIO_WEB,
+                 conversoes_simultaneas=CONVERSOES_SIMULTANEAS):
+        self.impressoras = list(impressoras)
+        self.diretorio_web = diretorio_web
+        self.progresso = {}
+        self._executor = ThreadPoolExecutor(max_workers=conversoes_simultaneas,
+                                            thread_name_prefix="conversao")
+        self._spooler = None
+        self._trava_spooler = threading.Lock()
+        self._travas_impressora = {}
+
+    async def atender(self, reader, writer):
+        """Trata uma conexão (uma requisição por conexão)"""
+        try:
+            metodo, url, cabecalhos = await ler_requisicao(reader)
+            partes = urlsplit(url)
+            parametros = {nome: valores[-1] for nome, valores in parse_qs(partes.query).items()}
+
+            if partes.path == "/converter":
+                self._exigir(metodo, "POST")
+                await self._converter(reader, writer, cabecalhos, parametros)
+            elif partes.path == "/imprimir":
+                self._exigir(metodo, "POST")
+                await self._imprimir(reader, writer, cabecalhos, parametros)
+            elif partes.path == "/progresso":
+                self._exigir(metodo, "GET")
+                progresso = self.progresso.get(parametros.get("id", ""))
+                if progresso is None:
+                    raise ErroHttp(404, "conversão não encontrada")
+                await self._responder_json(writer, 200, progresso.como_dict())
+            elif partes.path == "/config":
+                self._exigir(metodo, "GET")
+                await self._responder_json(writer, 200, {"impressoras": self.impressoras})
+            else:
+                self._exigir(metodo, "GET")
+                await self._estatico(writer, partes.path)
+        except ErroHttp as erro:
+            await self._responder_json(writer, erro.status, {"erro": str(erro)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    @staticmethod
+    def _exigir(metodo, esperado):
+        if metodo != esperado:
+            raise ErroHttp(405, f"use {esperado}")
+
+    async def _responder(self, writer, status, corpo, tipo, extras=()):
+        cabecalhos = [
+            f"HTTP/1.1 {status} {_MOTIVOS.get(status, '')}",
+            f"Content-Type: {tipo}",
+            f"Content-Length: {len(corpo)}",
+            "Connection: close",
+            *extras,
+        ]
+        writer.write(("\r\n".join(cabecalhos) + "\r\n\r\n").encode('latin-1') + corpo)
+        await writer.drain()
+
+    async def _responder_json(self, writer, status, dados):
+        corpo = json.dumps(dados, ensure_ascii=False).encode('utf-8')
+        await self._responder(writer, status, corpo, "application/json; charset=utf-8")
+
+    async def _estatico(self, writer, caminho):
+        nome = os.path.basename(caminho) or "index.html"
+        arquivo = os.path.join(self.diretorio_web, nome)
+        if not os.path.isfile(arquivo):
+            raise ErroHttp(404, "arquivo não encontrado")
+        with open(arquivo, 'rb') as entrada:
+            corpo = entrada.read()
+        tipo = mimetypes.guess_type(nome)[0] or "application/octet-stream"
+        if tipo.startswith("text/") or tipo.endswith("javascript"):
+            tipo += "; charset=utf-8"
+        await self._responder(writer, 200, corpo, tipo)
+
+    def _novo_progresso(self, identificador, cabecalhos):
+        agora = time.time()
+        for chave, progresso in list(self.progresso.items()):
+            if progresso.fim is not None and agora - progresso.fim > RETENCAO_PROGRESSO:
+                del self.progresso[chave]
+        identificador = identificador or uuid.uuid4().hex
+        if identificador in self.progresso and not self.progresso[identificador].concluida:
+            raise ErroHttp(400, "já existe uma conversão em andamento com esse id")
+        progresso = Progresso(identificador, tamanho_corpo(cabecalhos))
+        self.progresso[identificador] = progresso
+        return progresso
+
+    async def _receber(self, reader, writer, cabecalhos, entrada, progresso, concluido):
+        """Lê o upload e coloca o texto decodificado na fila da thread de trabalho
+
+        Os primeiros AMOSTRA bytes definem a codificação, o separador e a
+        linha do cabeçalho (em progresso.formato), como em ler_csv; nada
+        vai para a fila antes disso.
+        """
+        decodificador = None
+        amostra = b""
+        try:
+            async for dados in ler_corpo(reader, writer, cabecalhos):
+                progresso.bytes_recebidos += len(dados)
+                if decodificador is None:
+                    amostra += dados
+                    if len(amostra) < AMOSTRA:
+                        continue
+                    decodificador = _detectar_formato(progresso, amostra, completa=False)
+                    dados, amostra = amostra, b""
+                texto = decodificador.decode(dados)
+                if texto:
+                    await entrada.put(texto)
+            if decodificador is None:
+                decodificador = _detectar_formato(progresso, amostra, completa=True)
+            texto = decodificador.decode(amostra, final=True)
+            if texto:
+                await entrada.put(texto)
+            await entrada.put(None)
+        except UnicodeDecodeError as erro:
+            await entrada.put(ValueError(
+                f"o arquivo não pôde ser lido como {progresso.formato.codificacao}: {erro}"))
+        except ErroHttp as erro:
+            await entrada.put(ValueError(str(erro)))
+        except ValueError as erro:
+            # Com a mensagem original: a thread de trabalho não pode ficar
+            # esperando um fim de fila que não vem
+            await entrada.put(erro)
+        except (ConnectionError, asyncio.IncompleteReadError) as erro:
+            await entrada.put(_Cancelado(f"upload interrompido: {erro}"))
+        finally:
+            concluido.set()
+
+    async def _executar(self, trabalho, reader, writer, cabecalhos, progresso, tratar_saida):
+        """Roda trabalho(blocos, enviar) numa thread, ligado ao upload e à resposta
+
+        tratar_saida(saida, upload_concluido) é a corrotina que consome o que
+        a thread envia.
+        """
+        loop = asyncio.get_running_loop()
+        entrada = asyncio.Queue(maxsize=MAX_BLOCOS_PENDENTES)
+        saida = asyncio.Queue(maxsize=MAX_BLOCOS_PENDENTES)
+        cancelado = threading.Event()
+        upload_concluido = asyncio.Event()
+
+        def enviar(item):
+            if cancelado.is_set():
+                raise _Cancelado()
+            asyncio.run_coroutine_threadsafe(saida.put(item), loop).result()
+
+        def executar():
+            try:
+                trabalho(_iterar_fila(entrada, loop), enviar)
+                return
+            except _Cancelado:
+                final = ("cancelado", None)
+            except Exception as erro:
+                progresso.erro = str(erro)
+                final = ("erro", str(erro))
+            # O fim precisa chegar ao loop, senão ele espera para sempre
+            try:
+                enviar(final)
+            except _Cancelado:
+                pass
+
+        tarefa = loop.run_in_executor(self._executor, executar)
+        recebimento = asyncio.ensure_future(
+            self._receber(reader, writer, cabecalhos, entrada, progresso, upload_concluido))
+        try:
+            await tratar_saida(saida, upload_concluido)
+        finally:
+            # Destrava a thread se ela ainda espera upload ou espaço na fila de saída
+            cancelado.set()
+            recebimento.cancel()
+            while not tarefa.done():
+                for fila in (saida, entrada):
+                    while not fila.empty():
+                        fila.get_nowait()
+                entrada.put_nowait(_Cancelado())
+                await asyncio.wait([tarefa], timeout=0.05)
+            progresso.concluida = True
+            progresso.fim = time.time()
+
+    async def _converter(self, reader, writer, cabecalhos, parametros):
+        progresso = self._novo_progresso(parametros.get("id"), cabecalhos)
+        armazenado = parametros.get("armazenado") == "1"
+        agrupar = parametros.get("agrupar") == "1"
+        nome = os.path.splitext(os.path.basename(parametros.get("nome", "etiquetas")))[0] + ".zpl"
+
+        def trabalho(blocos, enviar):
+            blocos = iter(blocos)
+            # O primeiro bloco só chega depois que o formato foi detectado
+            primeiro = next(blocos, "")
+            formato = progresso.formato
+            linhas = islice(_linhas(chain([primeiro], blocos)), formato.linhas_antes, None)
+            registros = ler_registros(linhas, progresso.estatisticas, formato.separador)
+            prefixo, etiquetas = preparar_registros(registros, armazenado, agrupar=agrupar)
+            enviar(("inicio", None))
+            saida = _SaidaFila(enviar)
+            saida.write(prefixo)
+            escrever_em_blocos(etiquetas, saida, TAMANHO_BLOCO, progresso.estatisticas)
+            enviar(("fim", None))
+
+        async def responder(saida, upload_concluido):
+            tipo, valor = await saida.get()
+            if tipo == "erro":
+                raise ErroHttp(400, valor)
+            if tipo == "cancelado":
+                return
+            writer.write((
+                "HTTP/1.1 200 OK\r\n"
+                "Content-Type: text/plain; charset=utf-8\r\n"
+                f"Content-Disposition: attachment; filename*=UTF-8''{quote(nome)}\r\n"
+                f"X-Conversao: {progresso.id}\r\n"
+                "Transfer-Encoding: chunked\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode('latin-1'))
+            # Chunks que passaram do limite enquanto o upload não terminou
+            excedente = None
+            try:
+                while True:
+                    tipo, valor = await saida.get()
+                    if tipo == "dados":
+                        chunk = b"%x\r\n%s\r\n" % (len(valor), valor)
+                        if upload_concluido.is_set():
+                            if excedente is not None:
+                                await _esvaziar(excedente, writer)
+                                excedente = None
+                            writer.write(chunk)
+                            await writer.drain()
+                        elif (excedente is None and writer.transport.get_write_buffer_size()
+                              < LIMITE_RESPOSTA_DURANTE_UPLOAD):
+                            writer.write(chunk)
+                        else:
+                            if excedente is None:
+                                excedente = tempfile.TemporaryFile()
+                            excedente.write(chunk)
+                        progresso.bytes_enviados += len(valor)
+                    elif tipo == "fim":
+                        if excedente is not None:
+                            await _esvaziar(excedente, writer)
+                            excedente = None
+                        writer.write(b"0\r\n\r\n")
+                        await writer.drain()
+                        return
+                    else:
+                        # Erro depois de começar a resposta: sem o chunk final o
+                        # cliente percebe que o ZPL veio incompleto
+                        return
+            finally:
+                if excedente is not None:
+                    excedente.close()
+
+        await self._executar(trabalho, reader, writer, cabecalhos, progresso, responder)
+
+    def _impressora(self, endereco):
+        from impressora import SpoolerImpressoras
+
+        with self._trava_spooler:
+            if self._spooler is None:
+                self._spooler = SpoolerImpressoras()
+            trava = self._travas_impressora.setdefault(endereco, threading.Lock())
+            return self._spooler.obter(endereco), trava
+
+    async def _imprimir(self, reader, writer, cabecalhos, parametros):
+        if not self.impressoras:
+            raise ErroHttp(403, "nenhuma impressora configurada no servidor (--impressora)")
+        endereco = parametros.get("impressora") or self.impressoras[0]
+        # Só impressoras configuradas: o servidor não é um repetidor TCP genérico
+        if endereco not in self.impressoras:
+            raise ErroHttp(403, f"impressora não configurada: {endereco}")
+        progresso = self._novo_progresso(parametros.get("id"), cabecalhos)
+
+        def trabalho(blocos, enviar):
+            from impressora import ErroImpressora
+
+            impressora, trava = self._impressora(endereco)
+            etiquetas = 0
+            # Um trabalho por vez em cada impressora, para não intercalar etiquetas
+            with trava:
+                try:
+                    resto = ""
+                    for bloco in blocos:
+                        texto = resto + bloco
+                        corte = texto.rfind("^XZ") + 3
+                        # Cada lote termina num ^XZ (ver Impressora._enviar)
+                        lote, resto = (texto[:corte], texto[corte:]) if corte > 2 else ("", texto)
+                        if lote:
+                            quantidade = lote.count("^XZ")
+                            impressora.write(lote, quantidade)
+                            etiquetas += quantidade
+                            progresso.estatisticas["etiquetas"] = etiquetas
+                    if resto:
+                        impressora.write(resto)
+                    impressora.aguardar()
+                except ErroImpressora as erro:
+                    enviar(("falha", str(erro)))
+                    return
+            enviar(("fim", {"impressora": endereco, "etiquetas": etiquetas}))
+
+        async def responder(saida, upload_concluido):
+            tipo, valor = await saida.get()
+            if tipo == "erro":
+                raise ErroHttp(400, valor)
+            if tipo == "cancelado":
+                return
+            if tipo == "falha":
+                progresso.erro = valor
+                raise ErroHttp(502, valor)
+            await self._responder_json(writer, 200, valor)
+
+        await self._executar(trabalho, reader, writer, cabecalhos, progresso, responder)
+
+    def fechar(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._spooler is not None:
+            self._spooler.fechar()
+
+
+async def servir(host="127.0.0.1", porta=PORTA_PADRAO, impressoras=(),
+                 conversoes_simultaneas=CONVERSOES_SIMULTANEAS):
+    servidor = ServidorEtiquetas(impressoras, conversoes_simultaneas=conversoes_simultaneas)
+    try:
+        async with await asyncio.start_server(servidor.atender, host, porta) as tcp:
+            for sock in tcp.sockets:
+                endereco = sock.getsockname()
+                print(f"Servindo em http://{endereco[0]}:{endereco[1]}/")
+            await tcp.serve_forever()
+    finally:
+        servidor.fechar()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor local da interface web de etiquetas")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=PORTA_PADRAO)
+    parser.add_argument("--impressora", action="append", default=[], metavar="HOST[:PORTA]",
+                        help="impressora disponível para o botão Imprimir (pode repetir)")
+    parser.add_argument("--conversoes", type=int, default=CONVERSOES_SIMULTANEAS,
+                        help="conversões simultâneas")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(servir(args.host, args.porta, args.impressora, args.conversoes))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
-import csv
-from tkinter import Tk, filedialog
+import argparse
+from contextlib import nullcontext
+
+from conversor import ColunasRegistros, ler_arquivo
 
 class ZPL_Config:
     """Configurações de impressão baseadas no artigo técnico"""
@@ -25,11 +27,22 @@ class ZPL_Config:
         }
 
 class ZPL_Generator:
-    def __init__(self):
+    def __init__(self, instrumentacao=None):
         self.config = ZPL_Config()
-    
+        self.instrumentacao = instrumentacao
+
+    def _medir(self, etapa):
+        """Mede a etapa se houver instrumentação (ver instrumentacao.py)"""
+        if self.instrumentacao is None:
+            return nullcontext()
+        return self.instrumentacao.medir(etapa)
+
     def generate_label(self, left_data, right_data=None):
         """Gera uma etiqueta ZPL com duas colunas"""
+        with self._medir("formatacao"):
+            return self._generate_label(left_data, right_data)
+
+    def _generate_label(self, left_data, right_data=None):
         positions = self.config.get_x_positions()
         
         zpl = [
@@ -56,32 +69,47 @@ class ZPL_Generator:
         # Texto superior
         zpl.append(
             f"^FO{x_pos},{y_text}^A0N,30,30^FD"
-            f"{data['sku']} - {data['localizacao']} - {data['nome'][:15]}^FS"
+            f"{data.sku} - {data.local} - {data.nome[:15]}^FS"
         )
         
         # Código de barras
         zpl.append(
-            f"^FO{x_pos},{y_barcode}^BY2^BCN,80,Y,N,N^FD{data['gtin']}^FS"
+            f"^FO{x_pos},{y_barcode}^BY2^BCN,80,Y,N,N^FD{data.gtin}^FS"
         )
 
-def process_csv(csv_path):
+def process_csv(csv_path, instrumentacao=None):
     """Processa o arquivo CSV e gera etiquetas ZPL"""
-    generator = ZPL_Generator()
-    
-    with open(csv_path, 'r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        rows = list(reader)
-    
-    zpl_output = []
-    for i in range(0, len(rows), 2):
-        left = rows[i]
-        right = rows[i+1] if (i+1 < len(rows)) else None
-        zpl_output.append(generator.generate_label(left, right))
-    
-    return '\n\n'.join(zpl_output)
+    generator = ZPL_Generator(instrumentacao)
+    estatisticas = {}
+
+    with generator._medir("leitura"):
+        rows = ColunasRegistros(ler_arquivo(csv_path, estatisticas))
+
+    with generator._medir("pareamento"):
+        # rows.pares() é preguiçoso: a lista faz o pareamento acontecer aqui
+        # dentro, e não no tempo da formatação
+        pairs = list(rows.pares())
+
+    zpl_output = [generator.generate_label(left, right) for left, right in pairs]
+
+    with generator._medir("montagem"):
+        zpl_content = '\n\n'.join(zpl_output)
+
+    if instrumentacao is not None:
+        instrumentacao.contar("linhas", estatisticas["linhas"])
+        instrumentacao.contar("ignoradas", estatisticas["ignoradas"])
+        instrumentacao.contar("etiquetas", len(zpl_output))
+    return zpl_content
+
+def main(instrumentar=None):
+    """Fluxo principal de execução; com instrumentar, grava os tempos por etapa nesse JSON"""
+    instrumentacao = None
+    if instrumentar:
+        from instrumentacao import Instrumentacao
+        instrumentacao = Instrumentacao()
 
-def main():
-    """Fluxo principal de execução"""
+    # tkinter só no modo interativo: process_csv também é importado sem interface
+    from tkinter import Tk, filedialog
     Tk().withdraw()  # Esconder janela principal
     
     # Selecionar arquivo CSV
@@ -94,7 +122,7 @@ def main():
         return
     
     # Gerar conteúdo ZPL
-    zpl_content = process_csv(csv_path)
+    zpl_content = process_csv(csv_path, instrumentacao)
     
     # Salvar arquivo ZPL
     zpl_path = filedialog.asksaveasfilename(
@@ -105,8 +133,22 @@ def main():
     
     if zpl_path:
         with open(zpl_path, 'w', encoding='utf-8') as file:
+            if instrumentacao is not None:
+                file = instrumentacao.saida(file)
             file.write(zpl_content)
         print(f"Arquivo ZPL gerado com sucesso: {zpl_path}")
+        if instrumentacao is not None:
+            instrumentacao.salvar(instrumentar, arquivo=csv_path, saida=zpl_path)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Gera etiquetas ZPL de duas colunas a partir de um CSV")
+    parser.add_argument("--instrumentar", metavar="ARQUIVO",
+                        help="grava o tempo de leitura, pareamento, formatação e escrita neste JSON")
+    parser.add_argument("--profile", metavar="ARQUIVO",
+                        help="executa sob o cProfile e grava as estatísticas neste arquivo")
+    args = parser.parse_args()
+    if args.profile:
+        from instrumentacao import executar_com_profile
+        executar_com_profile(main, args.profile, args.instrumentar)
+    else:
+        main(args.instrumentar)
\ No newline at end of file
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+# Os módulos ficam soltos na pasta do projeto, sem pacote
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def csv_grande(tmp_path):
+    """CSV com 20.000 linhas (10.000 etiquetas) todas diferentes"""
+    caminho = tmp_path / "grande.csv"
+    with open(caminho, "w", encoding="utf-8", newline="") as arquivo:
+        arquivo.write("sku,local,gtin,nome\n")
+        for numero in range(20000):
+            arquivo.write(f"{numero},R{numero % 40:02d}-{numero % 7},"
+                          f"{7890000000000 + numero},Produto {numero}\n")
+    return str(caminho)
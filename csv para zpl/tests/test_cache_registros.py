@@ -0,0 +1,30 @@
+import os
+
+from cache_registros import CacheRegistros
+
+
+def _csv(caminho, linhas):
+    with open(caminho, "w", encoding="utf-8", newline="") as arquivo:
+        arquivo.write("sku,local,gtin,nome\n")
+        for numero in range(linhas):
+            arquivo.write(f"{numero},R{numero % 40:02d},{7890000000000 + numero},Produto {numero}\n")
+    return str(caminho)
+
+
+def test_ponteiros_saem_junto_com_os_instantaneos(tmp_path):
+    cache = CacheRegistros(str(tmp_path / "cache"), limite_bytes=1)
+    ponteiros = tmp_path / "cache" / "ponteiros"
+    primeiro = _csv(tmp_path / "ontem.csv", 1000)
+    segundo = _csv(tmp_path / "hoje.csv", 2000)
+
+    assert len(list(cache.registros(primeiro))) == 1000
+    assert len(os.listdir(ponteiros)) == 1
+    instantaneo = cache.caminho(cache.hash_conteudo(primeiro))
+    # O limite só comporta o instantâneo mais recente
+    assert len(list(cache.registros(segundo))) == 2000
+    assert not os.path.exists(instantaneo)
+    assert [os.path.basename(cache._caminho_ponteiro(segundo))] == os.listdir(ponteiros)
+
+    estatisticas = {}
+    assert len(list(cache.registros(segundo, estatisticas))) == 2000
+    assert estatisticas["cache_registros"] == "acerto"
@@ -0,0 +1,12 @@
+import pytest
+
+import cli
+
+
+@pytest.mark.parametrize("opcao", [["--validar-gtin"], ["--incremental", "indice"],
+                                   ["--cache-registros"], ["--instrumentar"], ["--paralelo"]])
+def test_impressora_recusa_opcoes_que_ignoraria(csv_grande, opcao, capsys):
+    with pytest.raises(SystemExit) as erro:
+        cli.main([csv_grande, "--impressora", "127.0.0.1:9"] + opcao)
+    assert erro.value.code == 2
+    assert opcao[0] in capsys.readouterr().err
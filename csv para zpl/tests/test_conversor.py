@@ -0,0 +1,29 @@
+import csv
+import io
+
+from conversor import dividir_linha, ler_registros
+
+
+def test_polegadas_no_meio_do_campo_nao_abrem_aspas():
+    texto = ('sku,local,gtin,nome\n1,A1,789,Cano 1/2" PVC\n2,A2,790,Luva\n'
+             '3,A3,791,Joelho 3/4" X\n4,A4,792,Te\n')
+    estatisticas = {}
+    registros = list(ler_registros(io.StringIO(texto), estatisticas))
+    assert [registro.nome for registro in registros] == ['Cano 1/2" PVC', "Luva", 'Joelho 3/4" X', "Te"]
+    assert estatisticas["linhas"] == 4
+    assert estatisticas["ignoradas"] == 0
+
+
+def test_campos_entre_aspas_como_no_modulo_csv():
+    linhas = ['a,"b,c",d', '"a""b",c', '"a"b,c', 'a,b"c,d', '"",x', '"""x""",y', 'a,',
+              '12,"Tubo 1/2"" X 3m",x', 'Joelho 3/4",", com vírgula"']
+    for linha in linhas:
+        assert dividir_linha(linha) == next(csv.reader([linha])), linha
+
+
+def test_quebra_de_linha_so_dentro_de_campo_entre_aspas():
+    texto = ('nome,local,sku,gtin\n"Nome,\nquebra",L0,S0,1\nRosca 1" macho,L1,S1,2\n'
+             'Bucha 2",L2,S2,3\n')
+    registros = list(ler_registros(io.StringIO(texto)))
+    esperados = list(csv.reader(io.StringIO(texto, newline="")))[1:]
+    assert [list(registro) for registro in registros] == esperados
@@ -0,0 +1,61 @@
+import codecs
+
+import pytest
+
+from conversor import CABECALHOS, converter_arquivo
+from deteccao import AMOSTRA, ERROS_UTF8, abrir_csv, detectar_formato
+from paralelo import converter_paralelo
+
+
+def _texto_com_acento_depois_da_amostra():
+    linhas = ["sku;local;gtin;nome\n"]
+    numero = 0
+    while sum(map(len, linhas)) < 2 * AMOSTRA:
+        linhas.append(f"{numero};A{numero % 9};{7890000000000 + numero};Produto {numero}\n")
+        numero += 1
+    linhas.append(f"{numero};Depósito;7890000099999;Ação com acentuação\n")
+    linhas.append(f"{numero + 1};B1;7890000099998;Último\n")
+    return "".join(linhas)
+
+
+@pytest.fixture
+def csv_cp1252_tardio(tmp_path):
+    """CSV cp1252 cujos primeiros AMOSTRA bytes são só ASCII, e a versão UTF-8 dele"""
+    texto = _texto_com_acento_depois_da_amostra()
+    cp1252, utf8 = tmp_path / "cp1252.csv", tmp_path / "utf8.csv"
+    cp1252.write_bytes(texto.encode("cp1252"))
+    utf8.write_bytes(texto.encode("utf-8"))
+    return str(cp1252), str(utf8)
+
+
+def test_amostra_ascii_usa_utf8_com_recuo_para_cp1252(csv_cp1252_tardio):
+    arquivo, formato = abrir_csv(csv_cp1252_tardio[0], CABECALHOS)
+    with arquivo:
+        texto = arquivo.read()
+    assert (formato.codificacao, formato.separador, formato.erros) == ("utf-8", ";", ERROS_UTF8)
+    assert "Ação com acentuação" in texto and "Último" in texto
+
+
+def test_cp1252_tardio_converte_igual_ao_utf8(csv_cp1252_tardio, tmp_path):
+    cp1252, utf8 = csv_cp1252_tardio
+    converter_arquivo(utf8, str(tmp_path / "ref.zpl"))
+    converter_arquivo(cp1252, str(tmp_path / "normal.zpl"))
+    converter_paralelo(cp1252, str(tmp_path / "paralelo.zpl"), processos=2, tamanho_pedaco=16 * 1024)
+    referencia = (tmp_path / "ref.zpl").read_bytes()
+    assert (tmp_path / "normal.zpl").read_bytes() == referencia
+    assert (tmp_path / "paralelo.zpl").read_bytes() == referencia
+
+
+def test_decodificador_incremental_com_acento_cortado_entre_blocos():
+    dados = "sku,local,gtin,nome\n1,Depósito,789,Ação\n".encode("cp1252")
+    formato = detectar_formato(dados[:20], CABECALHOS)
+    decodificador = codecs.getincrementaldecoder(formato.codificacao)(formato.erros)
+    texto = "".join(decodificador.decode(dados[i:i + 7]) for i in range(0, len(dados), 7))
+    texto += decodificador.decode(b"", final=True)
+    assert texto == dados.decode("cp1252")
+
+
+def test_utf8_valido_continua_utf8():
+    dados = "sku,local,gtin,nome\n1,Depósito,789,Ação\n".encode("utf-8")
+    formato = detectar_formato(dados, CABECALHOS, completa=True)
+    assert dados.decode(formato.codificacao, formato.erros).endswith("Ação\n")
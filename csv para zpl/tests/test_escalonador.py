@@ -0,0 +1,47 @@
+import threading
+
+from conversor import converter_arquivo
+from escalonador import EscalonadorImpressoras, _nao_confirmadas, dividir_faixas
+from impressora import ImpressoraFalsa
+from test_impressora import _esperar, _etiquetas
+
+
+def test_dividir_faixas_proporcional():
+    assert dividir_faixas(0, 10, [("a", 1), ("b", 2), ("c", 1)]) == \
+        [("a", 0, 3), ("b", 3, 8), ("c", 8, 10)]
+    assert dividir_faixas(5, 6, [("a", 1), ("b", 1)]) == [("a", 5, 6)]
+
+
+def test_nao_confirmadas_inclui_o_fim_das_faixas_anteriores():
+    assert _nao_confirmadas([(0, 100), (300, 400)], 250) == []
+    assert _nao_confirmadas([(0, 100), (300, 400)], 150) == [(350, 400)]
+    assert _nao_confirmadas([(0, 100), (300, 400)], 80) == [(80, 100), (300, 400)]
+    assert _nao_confirmadas([(0, 100)], -5) == [(0, 100)]
+
+
+def test_impressora_que_cai_tem_a_faixa_redistribuida(csv_grande, tmp_path):
+    saida = tmp_path / "saida.zpl"
+    converter_arquivo(csv_grande, str(saida))
+    esperadas = _etiquetas(saida.read_text(encoding="utf-8"))
+
+    with ImpressoraFalsa(guardar=True, atraso_por_bloco=0.002) as estavel, \
+            ImpressoraFalsa(guardar=True, atraso_por_bloco=0.002) as instavel:
+        enderecos = ["%s:%d" % f.endereco for f in (estavel, instavel)]
+        resultado = {}
+        with EscalonadorImpressoras(enderecos, etiquetas_por_lote=100) as escalonador:
+            envio = threading.Thread(target=lambda: resultado.update(
+                escalonador.imprimir_arquivo(csv_grande)))
+            envio.start()
+            # Uma queda de que a impressora volta e depois uma definitiva
+            _esperar(lambda: instavel.etiquetas_recebidas > 1000)
+            instavel.derrubar_conexoes()
+            _esperar(lambda: instavel.etiquetas_recebidas > 2500)
+            instavel.parar()
+            envio.join()
+        _esperar(lambda: not estavel._clientes and not instavel._clientes)
+        recebidas = _etiquetas((estavel.recebido + instavel.recebido).decode("utf-8"))
+
+    assert set(recebidas) == set(esperadas)
+    assert resultado["etiquetas"] == len(esperadas)
+    assert sum(resultado["impressoras"].values()) == len(esperadas)
+    assert resultado["impressoras"][enderecos[1]] < len(esperadas) // 2
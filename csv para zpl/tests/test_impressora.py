@@ -0,0 +1,47 @@
+import threading
+import time
+
+from conversor import converter_arquivo
+from impressora import ImpressoraFalsa, SpoolerImpressoras
+
+
+def _etiquetas(texto):
+    # Depois de uma queda a impressora pode ter recebido o começo de uma
+    # etiqueta que é reenviada inteira: vale o último ^XA antes de cada ^XZ
+    return [trecho[trecho.rfind("^XA"):] + "^XZ" for trecho in texto.split("^XZ")[:-1]]
+
+
+def _esperar(condicao, limite=30.0):
+    fim = time.monotonic() + limite
+    while not condicao():
+        assert time.monotonic() < fim, "tempo esgotado"
+        time.sleep(0.005)
+
+
+def test_queda_no_meio_do_trabalho_nao_perde_etiquetas(csv_grande, tmp_path):
+    saida = tmp_path / "saida.zpl"
+    converter_arquivo(csv_grande, str(saida))
+    esperadas = _etiquetas(saida.read_text(encoding="utf-8"))
+
+    with ImpressoraFalsa(atraso_por_bloco=0.002, guardar=True) as falsa:
+        endereco = "%s:%d" % falsa.endereco
+        resultado = {}
+        with SpoolerImpressoras() as spooler:
+            envio = threading.Thread(target=lambda: resultado.update(
+                spooler.imprimir_arquivo(csv_grande, endereco)))
+            envio.start()
+            for limite in (len(esperadas) // 4, len(esperadas) // 2):
+                _esperar(lambda: falsa.etiquetas_recebidas > limite)
+                falsa.derrubar_conexoes()
+            envio.join()
+            impressora = spooler.obter(endereco)
+            reconexoes = impressora.reconexoes
+            enviadas = impressora.etiquetas_enviadas
+        # recebido só fica completo quando a última conexão termina
+        _esperar(lambda: not falsa._clientes)
+        recebidas = _etiquetas(falsa.recebido.decode("utf-8"))
+
+    assert reconexoes >= 2
+    assert falsa.conexoes >= 3
+    assert set(recebidas) == set(esperadas)
+    assert enviadas == resultado["etiquetas"] == len(esperadas)
@@ -0,0 +1,98 @@
+import os
+import threading
+
+import pytest
+
+import lotes
+from conversor import converter_arquivo
+from impressora import ErroImpressora, Impressora, ImpressoraFalsa
+from test_impressora import _esperar, _etiquetas
+
+
+def test_lotes_juntos_formam_o_arquivo_convertido(csv_grande, tmp_path):
+    diretorio = str(tmp_path / "trabalho")
+    manifesto = lotes.gerar_trabalho(csv_grande, diretorio, etiquetas_por_lote=300, processos=2)
+    converter_arquivo(csv_grande, str(tmp_path / "ref.zpl"))
+
+    juntos = "".join(open(os.path.join(diretorio, lote["arquivo"]), encoding="utf-8").read()
+                     for lote in manifesto["lotes"])
+    assert juntos == (tmp_path / "ref.zpl").read_text(encoding="utf-8")
+    assert lotes.ler_checkpoint(diretorio) == 0
+    # Mesmo CSV e mesmas opções: o trabalho é reaproveitado
+    assert lotes.gerar_trabalho(csv_grande, diretorio, etiquetas_por_lote=300, processos=2) == manifesto
+
+
+def test_retoma_do_checkpoint_depois_de_perder_a_impressora(csv_grande, tmp_path):
+    diretorio = str(tmp_path / "trabalho")
+    manifesto = lotes.gerar_trabalho(csv_grande, diretorio, etiquetas_por_lote=200, processos=1)
+    converter_arquivo(csv_grande, str(tmp_path / "ref.zpl"))
+    esperadas = _etiquetas((tmp_path / "ref.zpl").read_text(encoding="utf-8"))
+
+    # A primeira impressora sai do ar de vez no meio do trabalho
+    primeira = ImpressoraFalsa(atraso_por_bloco=0.002, guardar=True).iniciar()
+    queda = threading.Thread(target=lambda: (
+        _esperar(lambda: primeira.etiquetas_recebidas > len(esperadas) // 3), primeira.parar()))
+    queda.start()
+    impressora = Impressora(*primeira.endereco, tentativas=1)
+    try:
+        with pytest.raises(ErroImpressora):
+            lotes.imprimir_trabalho(diretorio, None, impressora=impressora)
+    finally:
+        impressora.fechar()
+        queda.join()
+    _esperar(lambda: not primeira._clientes)
+
+    estado = lotes.estado_trabalho(diretorio)
+    assert 0 < estado["lotes_confirmados"] < len(manifesto["lotes"])
+    # Tudo o que o checkpoint dá como confirmado chegou de fato
+    recebidas_antes = set(_etiquetas(primeira.recebido.decode("utf-8")))
+    assert set(esperadas[:estado["etiquetas_confirmadas"]]) <= recebidas_antes
+
+    with ImpressoraFalsa(guardar=True) as segunda:
+        resultado = lotes.imprimir_trabalho(diretorio, "%s:%d" % segunda.endereco)
+    assert resultado["primeiro_lote"] == estado["lotes_confirmados"] + 1
+    assert lotes.estado_trabalho(diretorio)["lotes_confirmados"] == len(manifesto["lotes"])
+    recebidas = recebidas_antes | set(_etiquetas(segunda.recebido.decode("utf-8")))
+    assert recebidas == set(esperadas)
+
+
+def test_desde_etiqueta_comeca_no_lote_que_a_contem(csv_grande, tmp_path):
+    diretorio = str(tmp_path / "trabalho")
+    manifesto = lotes.gerar_trabalho(csv_grande, diretorio, etiquetas_por_lote=200, processos=1)
+    assert lotes.lote_da_etiqueta(manifesto, 1) == 0
+    assert lotes.lote_da_etiqueta(manifesto, 401) == 2
+    with pytest.raises(ValueError):
+        lotes.lote_da_etiqueta(manifesto, manifesto["etiquetas"] + 1)
+
+    with ImpressoraFalsa() as falsa:
+        resultado = lotes.imprimir_trabalho(diretorio, "%s:%d" % falsa.endereco, desde_etiqueta=401)
+    assert resultado["primeiro_lote"] == 3
+    assert resultado["etiquetas"] == manifesto["etiquetas"] - 400
+
+
+def test_desde_etiqueta_conta_as_copias_do_pq(tmp_path):
+    # 100 pares diferentes, cada um repetido 5 vezes: 100 blocos, 500 etiquetas
+    caminho = tmp_path / "repetidas.csv"
+    with open(caminho, "w", encoding="utf-8", newline="") as arquivo:
+        arquivo.write("sku,local,gtin,nome\n")
+        for numero in range(100):
+            for _ in range(5):
+                for lado in (2 * numero, 2 * numero + 1):
+                    arquivo.write(f"{lado},R{lado % 40:02d},{7890000000000 + lado},Produto {lado}\n")
+    diretorio = str(tmp_path / "trabalho")
+    manifesto = lotes.gerar_trabalho(str(caminho), diretorio, etiquetas_por_lote=20, processos=1,
+                                     agrupar=True)
+    assert manifesto["blocos"] == 100
+    assert manifesto["etiquetas"] == 500
+    assert [lote["primeira"] for lote in manifesto["lotes"][:3]] == [1, 101, 201]
+    assert lotes.lote_da_etiqueta(manifesto, 100) == 0
+    assert lotes.lote_da_etiqueta(manifesto, 101) == 1
+    assert lotes.lote_da_etiqueta(manifesto, 500) == 4
+    with pytest.raises(ValueError):
+        lotes.lote_da_etiqueta(manifesto, 501)
+
+    with ImpressoraFalsa() as falsa:
+        resultado = lotes.imprimir_trabalho(diretorio, "%s:%d" % falsa.endereco, desde_etiqueta=250)
+    assert resultado["primeiro_lote"] == 3
+    assert resultado["etiquetas"] == 300
+    assert lotes.estado_trabalho(diretorio)["etiquetas_confirmadas"] == 500
@@ -0,0 +1,71 @@
+import os
+import shutil
+import time
+
+import pytest
+
+from monitor_pasta import MonitorPasta
+
+ENTRADA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "entrada.csv")
+
+
+@pytest.fixture
+def monitor(tmp_path):
+    entrada, saida = tmp_path / "entrada", tmp_path / "saida"
+    entrada.mkdir()
+    monitor = MonitorPasta(str(entrada), str(saida), processos=1, tempo_estavel=0)
+    monitor._pool = monitor._criar_pool()
+    yield monitor
+    monitor._pool.shutdown()
+
+
+def _rodada(monitor):
+    """Duas varreduras (a primeira só registra o arquivo) e espera as conversões"""
+    monitor.varrer()
+    for nome, tamanho, mtime_ns, detectado in monitor.varrer():
+        monitor._despachar(nome, tamanho, mtime_ns, detectado)
+    return [monitor._concluir(nome) for nome in list(monitor._pendentes)]
+
+
+def _soltar(monitor, nome, origem=ENTRADA):
+    destino = os.path.join(monitor.entrada, nome)
+    shutil.copyfile(origem, destino)
+    # mtime diferente mesmo em sistemas de arquivos com resolução de segundos
+    agora = time.time_ns() + 10 ** 9
+    os.utime(destino, ns=(agora, agora))
+
+
+def test_soltar_de_novo_reimprime_se_o_zpl_foi_consumido(monitor):
+    _soltar(monitor, "a.csv")
+    assert [r["saida"] for r in _rodada(monitor)] == [os.path.join(monitor.saida, "a.zpl")]
+
+    # Mesmo conteúdo, .zpl ainda na saída: nada a fazer
+    _soltar(monitor, "a.csv")
+    assert _rodada(monitor) == []
+
+    os.remove(os.path.join(monitor.saida, "a.zpl"))
+    _soltar(monitor, "a.csv")
+    assert len(_rodada(monitor)) == 1
+    assert os.path.exists(os.path.join(monitor.saida, "a.zpl"))
+
+
+def test_mesmo_conteudo_com_outro_nome_gera_outra_saida(monitor):
+    _soltar(monitor, "a.csv")
+    _soltar(monitor, "b.csv")
+    resultados = _rodada(monitor)
+    assert sorted(os.path.basename(r["saida"]) for r in resultados) == ["a.zpl", "b.zpl"]
+    with open(os.path.join(monitor.saida, "a.zpl"), "rb") as a, \
+            open(os.path.join(monitor.saida, "b.zpl"), "rb") as b:
+        assert a.read() == b.read()
+
+
+def test_pool_quebrado_e_recriado(monitor, capsys):
+    for processo in list(monitor._pool._processes.values()):
+        processo.kill()
+        processo.join()
+    # O pool só percebe a morte do processo pela thread de gerenciamento
+    time.sleep(0.5)
+    _soltar(monitor, "a.csv")
+    resultados = _rodada(monitor)
+    assert len(resultados) == 1 and "erro" not in resultados[0]
+    assert "Pool de conversão quebrado" in capsys.readouterr().err
@@ -0,0 +1,47 @@
+import pytest
+
+from conversor import converter_arquivo
+from paralelo import converter_paralelo
+
+
+@pytest.fixture
+def csv_dificil(tmp_path):
+    """Aspas com vírgula e quebra de linha, polegadas ("), CRLF, linhas vazias e incompletas"""
+    linhas = ['sku,local,gtin,nome']
+    for numero in range(3000):
+        if numero % 5 == 0:
+            linhas.append(f'{numero},"A,{numero % 5}",{7890000000000 + numero},"Nome ""com""\nquebra"')
+        elif numero % 89 == 0:
+            linhas.append("")
+        elif numero % 83 == 0:
+            linhas.append(f"{numero},B1")
+        elif numero % 7 == 0:
+            # Aspas no meio do campo são um caractere comum, não abrem um campo
+            linhas.append(f'{numero},D{numero % 3},{7890000000000 + numero},Cano 3/4" PVC')
+        else:
+            linhas.append(f"{numero},C{numero % 11},{7890000000000 + numero},Produto {numero}")
+    caminho = tmp_path / "dificil.csv"
+    caminho.write_bytes("\r\n".join(linhas).encode("utf-8"))
+    return str(caminho)
+
+
+@pytest.mark.parametrize("armazenado", [False, True])
+@pytest.mark.parametrize("processos", [1, 3])
+def test_paralelo_igual_ao_sequencial(csv_dificil, tmp_path, armazenado, processos):
+    referencia = converter_arquivo(csv_dificil, str(tmp_path / "ref.zpl"), armazenado=armazenado)
+    resultado = converter_paralelo(csv_dificil, str(tmp_path / "par.zpl"), processos=processos,
+                                   armazenado=armazenado, tamanho_pedaco=4096)
+    assert (tmp_path / "par.zpl").read_bytes() == (tmp_path / "ref.zpl").read_bytes()
+    assert resultado["pedacos"] > 1
+    for chave in ("linhas", "ignoradas", "etiquetas"):
+        assert resultado[chave] == referencia[chave]
+    # Só as linhas vazias e as incompletas ficam de fora
+    completas = sum(1 for numero in range(3000) if numero % 5 == 0 or (numero % 89 and numero % 83))
+    assert resultado["linhas"] == completas
+    assert resultado["motivos"] == {"campos_faltando": sum(
+        1 for numero in range(3000) if numero % 5 and numero % 89 and not numero % 83)}
+
+
+def test_paralelo_recusa_agrupar(csv_dificil, tmp_path):
+    with pytest.raises(ValueError):
+        converter_paralelo(csv_dificil, str(tmp_path / "par.zpl"), agrupar=True)
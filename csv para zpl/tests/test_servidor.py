@@ -0,0 +1,60 @@
+import asyncio
+import json
+import socket
+import threading
+
+import pytest
+
+import servidor
+
+
+@pytest.fixture
+def porta():
+    pronto = threading.Event()
+    estado = {}
+
+    async def rodar():
+        etiquetas = servidor.ServidorEtiquetas([])
+        tcp = await asyncio.start_server(etiquetas.atender, "127.0.0.1", 0)
+        estado["porta"] = tcp.sockets[0].getsockname()[1]
+        estado["loop"] = asyncio.get_running_loop()
+        estado["tcp"] = tcp
+        pronto.set()
+        try:
+            await tcp.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            etiquetas.fechar()
+
+    thread = threading.Thread(target=asyncio.run, args=(rodar(),), daemon=True)
+    thread.start()
+    pronto.wait()
+    yield estado["porta"]
+    estado["loop"].call_soon_threadsafe(estado["tcp"].close)
+    thread.join(5)
+
+
+def _requisicao(porta, dados):
+    with socket.create_connection(("127.0.0.1", porta), timeout=10) as conexao:
+        conexao.sendall(dados)
+        resposta = b""
+        while parte := conexao.recv(65536):
+            resposta += parte
+    cabecalho, _, corpo = resposta.partition(b"\r\n\r\n")
+    return int(cabecalho.split()[1]), corpo
+
+
+@pytest.mark.parametrize("valor", [b"abc", b"-5", b"+5", b"1_0"])
+def test_content_length_invalido_responde_400(porta, valor):
+    status, corpo = _requisicao(porta, b"POST /converter HTTP/1.1\r\nContent-Length: " + valor
+                                + b"\r\n\r\nsku,local,gtin,nome\n")
+    assert status == 400
+    assert "Content-Length" in json.loads(corpo)["erro"]
+
+
+def test_chunked_invalido_responde_400(porta):
+    status, corpo = _requisicao(porta, b"POST /converter HTTP/1.1\r\nTransfer-Encoding: chunked"
+                                b"\r\n\r\nzz\r\nabc\r\n0\r\n\r\n")
+    assert status == 400
+    assert json.loads(corpo)["erro"] == "corpo chunked inválido"
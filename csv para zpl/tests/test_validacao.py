@@ -0,0 +1,27 @@
+import pytest
+
+from conversor import Registro
+from validacao import MOTIVOS, FiltroRejeitados, validar_gtins
+
+pytest.importorskip("numpy")
+
+
+def test_validar_gtins():
+    codigos = validar_gtins(["7898970315223", "", "123", "78989703152X3", "7898970315224",
+                             "96385074", "036000291452", "10012345678902"])
+    assert [MOTIVOS[c] for c in codigos] == ["ok", "vazio", "tamanho", "nao_numerico",
+                                             "digito_verificador", "ok", "ok", "ok"]
+
+
+def test_filtro_valida_em_trechos(tmp_path):
+    gtins = ["7898970315223", "7898970315224"] * 5
+    registros = [Registro(f"p{i}", "A1", str(i), gtin) for i, gtin in enumerate(gtins)]
+    relatorio = tmp_path / "rejeitados.csv"
+    filtro = FiltroRejeitados(str(relatorio), registros_por_trecho=3)
+
+    aprovados = list(filtro.filtrar(iter(registros)))
+
+    assert aprovados == registros[0::2]
+    assert filtro.contagem == {"digito_verificador": 5}
+    linhas = relatorio.read_text(encoding="utf-8").splitlines()
+    assert [linha.split(",")[0] for linha in linhas[1:]] == ["2", "4", "6", "8", "10"]
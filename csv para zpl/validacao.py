@@ -0,0 +1,157 @@
+"""Validação dos GTINs antes de gerar as etiquetas
+
+Na mesma leitura que gera as etiquetas, a coluna gtin de cada trecho de
+REGISTROS_POR_TRECHO registros vira um array do NumPy e tamanho, dígitos
+e dígito verificador GS1 (GTIN-8, GTIN-12/UPC, EAN-13 e GTIN-14) são
+conferidos numa passada vetorizada. As linhas rejeitadas não geram
+etiqueta e vão para um relatório CSV com o motivo.
+
+O NumPy só é importado quando a validação é usada; sem ele a conversão
+falha com ValueError, como os formatos de colunar.py sem pyarrow.
+"""
+import os
+import time
+from functools import lru_cache
+from itertools import islice
+
+from conversor import converter_arquivo
+
+# Códigos devolvidos por validar_gtins, na ordem em que são testados
+MOTIVOS = ("ok", "vazio", "tamanho", "nao_numerico", "digito_verificador")
+OK, VAZIO, TAMANHO, NAO_NUMERICO, DIGITO_VERIFICADOR = range(len(MOTIVOS))
+
+TAMANHOS_GTIN = (8, 12, 13, 14)
+
+# GTINs validados de uma vez; limita o array (14 caracteres UTF-32 por
+# GTIN) sem perder a vetorização
+REGISTROS_POR_TRECHO = 64 * 1024
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ValueError("validar os GTINs requer o pacote numpy (pip install numpy)") from None
+    return numpy
+
+
+@lru_cache(maxsize=None)
+def _tabelas_por_tamanho():
+    # Para cada tamanho de 0 a 14: quais das 14 colunas têm caractere e o
+    # peso GS1 de cada coluna (3, 1, 3... da direita para a esquerda a
+    # partir do dígito antes do verificador, que tem peso 0)
+    np = _numpy()
+    posicao = np.arange(14)
+    tamanho = np.arange(15)[:, None]
+    distancia = tamanho - 1 - posicao
+    dentro = posicao < tamanho
+    pesos = np.where(distancia > 0, 1 + 2 * (distancia & 1), 0).astype(np.uint8)
+    return dentro, pesos
+
+
+def validar_gtins(gtins):
+    """Devolve um array uint8 com o código de MOTIVOS de cada GTIN"""
+    np = _numpy()
+    dentro, pesos = _tabelas_por_tamanho()
+    texto = np.asarray(gtins, dtype=str)
+    if texto.size == 0:
+        return np.zeros(0, dtype=np.uint8)
+    if texto.dtype.itemsize < 14 * 4:
+        texto = texto.astype("<U14")
+
+    tamanho = np.char.str_len(texto)
+    codigos = np.full(texto.shape, OK, dtype=np.uint8)
+    codigos[~np.isin(tamanho, TAMANHOS_GTIN)] = TAMANHO
+    codigos[tamanho == 0] = VAZIO
+    # Daqui em diante só importam os de tamanho válido, que cabem em 14 colunas
+    tamanho = np.minimum(tamanho, 14)
+
+    # Cada caractere de um array <U é um uint32 com o code point, com zeros
+    # depois do fim do texto
+    pontos = texto.view(np.uint32).reshape(texto.size, -1)[:, :14] - np.uint32(ord("0"))
+    numericos = ((pontos <= 9) | ~dentro[tamanho]).all(axis=1)
+    codigos[(codigos == OK) & ~numericos] = NAO_NUMERICO
+
+    # Os pesos contam a partir da direita, o que dispensa alinhar GTINs de
+    # tamanhos diferentes
+    digitos = np.where(numericos[:, None], pontos, 0).astype(np.uint8)
+    soma = (digitos * pesos[tamanho]).sum(axis=1, dtype=np.uint16)
+    ultimo = np.take_along_axis(digitos, np.maximum(tamanho - 1, 0)[:, None], axis=1)[:, 0]
+    verificador = (10 - soma % 10) % 10
+    codigos[(codigos == OK) & (verificador != ultimo)] = DIGITO_VERIFICADOR
+    return codigos
+
+
+def _campo_csv(valor):
+    if any(c in valor for c in ',"\r\n'):
+        return '"' + valor.replace('"', '""') + '"'
+    return valor
+
+
+class FiltroRejeitados:
+    """Valida os GTINs em trechos, descarta os inválidos e os anota no relatório
+
+    O relatório só é criado se houver alguma rejeição. segundos soma o
+    tempo gasto na validação.
+    """
+
+    def __init__(self, relatorio_path, registros_por_trecho=REGISTROS_POR_TRECHO):
+        self.relatorio_path = relatorio_path
+        self.registros_por_trecho = registros_por_trecho
+        self.contagem = {}
+        self.segundos = 0.0
+
+    def filtrar(self, registros):
+        relatorio = None
+        numero = 0
+        try:
+            while True:
+                trecho = list(islice(registros, self.registros_por_trecho))
+                if not trecho:
+                    return
+                inicio = time.perf_counter()
+                codigos = validar_gtins([registro.gtin for registro in trecho])
+                self.segundos += time.perf_counter() - inicio
+                for registro, codigo in zip(trecho, codigos.tolist()):
+                    numero += 1
+                    if codigo == OK:
+                        yield registro
+                        continue
+                    motivo = MOTIVOS[codigo]
+                    self.contagem[motivo] = self.contagem.get(motivo, 0) + 1
+                    if relatorio is None:
+                        relatorio = open(self.relatorio_path, 'w', encoding='utf-8', newline='')
+                        relatorio.write("registro,sku,local,gtin,motivo\n")
+                    campos = (str(numero), registro.sku, registro.local, registro.gtin, motivo)
+                    relatorio.write(",".join(_campo_csv(c) for c in campos) + "\n")
+        finally:
+            if relatorio is not None:
+                relatorio.close()
+
+
+def caminho_rejeitados(output_path):
+    return os.path.splitext(output_path)[0] + ".rejeitados.csv"
+
+
+def converter_validado(csv_path, output_path, relatorio_path=None, converter=converter_arquivo,
+                       **opcoes):
+    """Valida os GTINs do CSV e converte só as linhas aprovadas
+
+    converter é a função de conversão usada em seguida (converter_arquivo
+    ou converter_incremental); ela precisa aceitar o parâmetro filtro.
+    """
+    if relatorio_path is None:
+        relatorio_path = caminho_rejeitados(output_path)
+    # Antes de abrir qualquer saída, para um ambiente sem NumPy falhar logo
+    _tabelas_por_tamanho()
+    if os.path.exists(relatorio_path):
+        os.remove(relatorio_path)
+
+    filtro = FiltroRejeitados(relatorio_path)
+    estatisticas = converter(csv_path, output_path, filtro=filtro.filtrar, **opcoes)
+    estatisticas["rejeitados"] = sum(filtro.contagem.values())
+    estatisticas["motivos_gtin"] = filtro.contagem
+    estatisticas["segundos_validacao"] = filtro.segundos
+    if filtro.contagem:
+        estatisticas["relatorio_rejeitados"] = relatorio_path
+    return estatisticas
@@ -0,0 +1,292 @@
+"""Pré-visualização local das etiquetas ZPL em PNG, sem impressora
+
+Entende o subconjunto de ZPL que o conversor gera: ^XA/^XZ, ^PW, ^LL, ^FO,
+^A0, ^BY, ^BC (Code 128), ^FD/^FS, ^PQ, a serialização com ^SF (só a
+máscara D) e os formatos armazenados ^DF/^XF/^FN.
+As barras são desenhadas com operações de array do NumPy (uma por código
+de barras), não com um retângulo por barra.
+
+Uso:
+    python visualizador.py dist/etiquetas.zpl -o previa --por-pagina 10
+"""
+import argparse
+import os
+import re
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Larguras (barra, espaço, barra...) dos 107 símbolos do Code 128
+PADROES_CODE128 = (
+    "212222 222122 222221 121223 121322 131222 122213 122312 132212 221213 "
+    "221312 231212 112232 122132 122231 113222 123122 123221 223211 221132 "
+    "221231 213212 223112 312131 311222 321122 321221 312212 322112 322211 "
+    "212123 212321 232121 111323 131123 131321 112313 132113 132311 211313 "
+    "231113 231311 112133 112331 132131 113123 113321 133121 313121 211331 "
+    "231131 213113 213311 213131 311123 311321 331121 312113 312311 332111 "
+    "314111 221411 431111 111224 111422 121124 121421 141122 141221 112214 "
+    "112412 122114 122411 142112 142211 241211 221114 413111 241112 134111 "
+    "111242 121142 121241 114212 124112 124211 411212 421112 421211 212141 "
+    "214121 412121 111143 111341 131141 114113 114311 411113 411311 113141 "
+    "114131 311141 411131 211412 211214 211232 2331112"
+).split()
+
+INICIO_B = 104
+PARADA = 106
+
+_COMANDO = re.compile(r"\^([A-Z@][A-Z0-9@])([^^]*)")
+
+
+@lru_cache(maxsize=None)
+def _fonte(altura):
+    # Carregar o TrueType a cada texto custava mais que desenhar a etiqueta;
+    # os tamanhos usados são poucos
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", altura)
+    except OSError:
+        try:
+            return ImageFont.load_default(size=altura)
+        except TypeError:
+            # Pillow antigo: fonte bitmap de tamanho fixo
+            return ImageFont.load_default()
+
+
+def modulos_code128(dados):
+    """Converte os dados em larguras de módulos (subconjunto B, com dígito verificador)"""
+    valores = [INICIO_B]
+    for caractere in dados:
+        codigo = ord(caractere)
+        if not 32 <= codigo <= 127:
+            raise ValueError(f"caractere fora do Code 128 B: {caractere!r}")
+        valores.append(codigo - 32)
+    verificador = (valores[0] + sum(i * v for i, v in enumerate(valores[1:], 1))) % 103
+    valores += [verificador, PARADA]
+    return np.array([int(d) for v in valores for d in PADROES_CODE128[v]], dtype=np.intp)
+
+
+def linha_de_barras(dados, largura_modulo):
+    """Linha de pixels (True = preto) de um código de barras, montada sem laço por barra"""
+    larguras = modulos_code128(dados)
+    # Elementos alternam barra/espaço começando por barra
+    cores = np.arange(larguras.size) % 2 == 0
+    return np.repeat(cores, larguras * largura_modulo)
+
+
+class Renderizador:
+    """Interpreta uma sequência de comandos ZPL e gera uma imagem por etiqueta"""
+
+    def __init__(self, largura_padrao=780, altura_padrao=240):
+        self.largura_padrao = largura_padrao
+        self.altura_padrao = altura_padrao
+        self.formatos = {}
+
+    def etiquetas(self, zpl):
+        """Gera uma imagem PIL (modo L) para cada etiqueta impressa (^PQ repete a imagem)"""
+        comandos = []
+        gravando = None
+        for match in _COMANDO.finditer(zpl):
+            comando, parametros = match.group(1), match.group(2).strip("\r\n")
+            if comando == "XA":
+                comandos = []
+                gravando = None
+            elif comando == "DF":
+                gravando = parametros.rstrip()
+            elif comando == "XZ":
+                if gravando is not None:
+                    self.formatos[gravando] = comandos
+                    gravando = None
+                elif comandos:
+                    expandido = self._expandir(comandos)
+                    quantidade = self._quantidade(comandos)
+                    if any(comando == "SF" for comando, _ in expandido):
+                        # Cada cópia tem os campos serializados incrementados
+                        for copia in range(quantidade):
+                            yield self._desenhar(_serializar(expandido, copia))
+                    else:
+                        imagem = self._desenhar(expandido)
+                        for _ in range(quantidade):
+                            yield imagem
+                comandos = []
+            else:
+                comandos.append((comando, parametros))
+
+    @staticmethod
+    def _quantidade(comandos):
+        for comando, parametros in comandos:
+            if comando == "PQ":
+                return max(1, int(parametros.split(",")[0] or 1))
+        return 1
+
+    def _expandir(self, comandos):
+        # Substitui ^XF pelo formato armazenado, com os campos ^FN preenchidos
+        if not comandos or comandos[0][0] != "XF":
+            return comandos
+        formato = self.formatos.get(comandos[0][1].rstrip(), [])
+        campos = {}
+        numero = None
+        for comando, parametros in comandos[1:]:
+            if comando == "FN":
+                numero = parametros
+            elif comando == "FD" and numero is not None:
+                campos[numero] = [("FD", parametros)]
+            elif comando == "SF" and numero is not None:
+                campos[numero].append(("SF", parametros))
+            elif comando == "FS":
+                numero = None
+        expandido = []
+        for comando, parametros in formato:
+            if comando == "FN":
+                expandido.extend(campos.get(parametros, [("FD", "")]))
+            else:
+                expandido.append((comando, parametros))
+        return expandido
+
+    def _desenhar(self, comandos):
+        largura, altura = self.largura_padrao, self.altura_padrao
+        for comando, parametros in comandos:
+            if comando == "PW":
+                largura = int(parametros)
+            elif comando == "LL":
+                altura = int(parametros)
+
+        pixels = np.zeros((altura, largura), dtype=bool)
+        textos = []
+        x = y = 0
+        fonte = (30, 30)
+        modulo, altura_barras = 2, 10
+        barras = None
+        dados = ""
+
+        for comando, parametros in comandos:
+            valores = parametros.split(",")
+            if comando == "FO":
+                x, y = int(valores[0] or 0), int(valores[1] or 0)
+            elif comando == "A0":
+                # ^A0N,altura,largura
+                fonte = (int(valores[1]), int(valores[2] or valores[1]))
+            elif comando == "BY":
+                modulo = int(valores[0] or modulo)
+                if len(valores) > 2 and valores[2]:
+                    altura_barras = int(valores[2])
+            elif comando == "BC":
+                # ^BCN,altura,linha_interpretacao,acima,verificador
+                altura_campo = int(valores[1]) if len(valores) > 1 and valores[1] else altura_barras
+                legenda = len(valores) < 3 or valores[2] != "N"
+                barras = (altura_campo, legenda)
+            elif comando == "FD":
+                dados = parametros
+            elif comando == "FS":
+                if barras is not None:
+                    if dados:
+                        self._barras(pixels, textos, x, y, dados, modulo, *barras)
+                elif dados:
+                    textos.append((x, y, dados, fonte[0]))
+                barras = None
+                dados = ""
+
+        imagem = Image.fromarray(np.where(pixels, 0, 255).astype(np.uint8), mode="L")
+        desenho = ImageDraw.Draw(imagem)
+        for tx, ty, texto, tamanho in textos:
+            desenho.text((tx, ty), texto, fill=0, font=_fonte(tamanho))
+        return imagem
+
+    def _barras(self, pixels, textos, x, y, dados, modulo, altura, legenda):
+        linha = linha_de_barras(dados, modulo)
+        altura_total, largura_total = pixels.shape
+        fim_x = min(x + linha.size, largura_total)
+        fim_y = min(y + altura, altura_total)
+        if fim_x <= x or fim_y <= y:
+            return
+        # Uma única atribuição com broadcasting pinta todas as barras
+        pixels[y:fim_y, x:fim_x] |= linha[:fim_x - x]
+        if legenda:
+            tamanho = max(10, 9 * modulo)
+            largura_texto = len(dados) * tamanho * 0.55
+            textos.append((x + max(0, (linha.size - largura_texto) / 2), fim_y + 2, dados, tamanho))
+
+
+def incrementar_campo(valor, mascara, incremento, vezes=1):
+    """Valor de um campo com ^SF depois de vezes incrementos
+
+    Máscara e valor são alinhados pela direita, assim como incremento e
+    máscara; as posições D formam um número decimal (com vai-um entre elas)
+    e as demais ficam como estão.
+    """
+    mascara = mascara[-len(valor):].rjust(len(valor), "%")
+    incremento = incremento[-len(mascara):].rjust(len(mascara), "0")
+    posicoes = [i for i, marca in enumerate(mascara) if marca == "D" and valor[i].isdigit()]
+    if not posicoes:
+        return valor
+    numero = int("".join(valor[i] for i in posicoes))
+    passo = int("".join(incremento[i] for i in posicoes if incremento[i].isdigit()) or 0)
+    novo = str((numero + passo * vezes) % 10 ** len(posicoes)).zfill(len(posicoes))
+    caracteres = list(valor)
+    for posicao, digito in zip(posicoes, novo):
+        caracteres[posicao] = digito
+    return "".join(caracteres)
+
+
+def _serializar(comandos, vezes):
+    serializado = []
+    for indice, (comando, parametros) in enumerate(comandos):
+        if comando == "FD" and indice + 1 < len(comandos) and comandos[indice + 1][0] == "SF":
+            mascara, _, incremento = comandos[indice + 1][1].partition(",")
+            parametros = incrementar_campo(parametros, mascara, incremento or "1", vezes)
+        serializado.append((comando, parametros))
+    return serializado
+
+
+def montar_paginas(imagens, por_pagina=10, margem=10):
+    """Empilha as etiquetas verticalmente em páginas de até por_pagina etiquetas"""
+    pagina = []
+    for imagem in imagens:
+        pagina.append(imagem)
+        if len(pagina) == por_pagina:
+            yield _juntar(pagina, margem)
+            pagina = []
+    if pagina:
+        yield _juntar(pagina, margem)
+
+
+def _juntar(imagens, margem):
+    largura = max(imagem.width for imagem in imagens)
+    altura = sum(imagem.height for imagem in imagens) + margem * (len(imagens) - 1)
+    pagina = Image.new("L", (largura, altura), 200)
+    y = 0
+    for imagem in imagens:
+        pagina.paste(imagem, (0, y))
+        y += imagem.height + margem
+    return pagina
+
+
+def renderizar_arquivo(zpl_path, output_dir, por_pagina=10):
+    """Gera os PNGs de pré-visualização de um .zpl e devolve a lista de arquivos criados"""
+    with open(zpl_path, 'r', encoding='utf-8') as arquivo:
+        zpl = arquivo.read()
+
+    os.makedirs(output_dir, exist_ok=True)
+    nome = os.path.splitext(os.path.basename(zpl_path))[0]
+    criados = []
+    imagens = Renderizador().etiquetas(zpl)
+    for numero, pagina in enumerate(montar_paginas(imagens, por_pagina), 1):
+        caminho = os.path.join(output_dir, f"{nome}_{numero:04d}.png")
+        pagina.save(caminho)
+        criados.append(caminho)
+    return criados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera PNGs de pré-visualização de arquivos ZPL")
+    parser.add_argument("arquivos", nargs="+", help="arquivos .zpl")
+    parser.add_argument("-o", "--saida", default="previa", help="diretório dos PNGs")
+    parser.add_argument("--por-pagina", type=int, default=10, help="etiquetas por página")
+    args = parser.parse_args(argv)
+
+    for zpl_path in args.arquivos:
+        criados = renderizar_arquivo(zpl_path, args.saida, args.por_pagina)
+        print(f"{zpl_path}: {len(criados)} páginas em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+// Interface do servidor.py: o CSV sobe em streaming para /converter e o ZPL
+// volta enquanto o upload ainda está em andamento; /progresso mostra o
+// andamento a cada meio segundo.
+
+const INTERVALO_PROGRESSO = 500;
+
+const btnSelecionar = document.getElementById("btn-selecionar-csv");
+const btnProcessar = document.getElementById("btn-processar");
+const btnSalvar = document.getElementById("btn-salvar-zpl");
+const btnImprimir = document.getElementById("btn-imprimir");
+const status = document.getElementById("status");
+
+const seletor = document.createElement("input");
+seletor.type = "file";
+seletor.accept = ".csv,text/csv";
+seletor.hidden = true;
+document.body.appendChild(seletor);
+
+let arquivoCsv = null;
+let zpl = null;
+let nomeZpl = "etiquetas.zpl";
+let impressoras = [];
+
+function mostrar(texto) {
+    status.textContent = texto;
+}
+
+function novoId() {
+    return Date.now().toString(36) + Math.random().toString(36).slice(2, 10);
+}
+
+async function mensagemDeErro(resposta) {
+    try {
+        return (await resposta.json()).erro;
+    } catch (erro) {
+        return `HTTP ${resposta.status}`;
+    }
+}
+
+function nomeDoArquivo(resposta) {
+    const disposicao = resposta.headers.get("Content-Disposition") || "";
+    const encontrado = disposicao.match(/filename\*=UTF-8''([^;]+)/);
+    return encontrado ? decodeURIComponent(encontrado[1]) : "etiquetas.zpl";
+}
+
+function acompanharProgresso(id) {
+    const temporizador = setInterval(async () => {
+        try {
+            const resposta = await fetch(`/progresso?id=${encodeURIComponent(id)}`);
+            if (!resposta.ok) {
+                return;
+            }
+            const progresso = await resposta.json();
+            const fracao = progresso.bytes_total
+                ? ` (${Math.floor(progresso.bytes_recebidos / progresso.bytes_total * 100)}% enviado)`
+                : "";
+            mostrar(`Processando${fracao}: ${progresso.linhas} linhas, ${progresso.etiquetas} etiquetas`);
+        } catch (erro) {
+            // A próxima consulta tenta de novo
+        }
+    }, INTERVALO_PROGRESSO);
+    return () => clearInterval(temporizador);
+}
+
+btnSelecionar.addEventListener("click", () => seletor.click());
+
+seletor.addEventListener("change", () => {
+    arquivoCsv = seletor.files[0] || null;
+    zpl = null;
+    btnProcessar.disabled = arquivoCsv === null;
+    btnSalvar.disabled = true;
+    btnImprimir.disabled = true;
+    mostrar(arquivoCsv ? `Arquivo selecionado: ${arquivoCsv.name}` : "");
+});
+
+btnProcessar.addEventListener("click", async () => {
+    const id = novoId();
+    const parar = acompanharProgresso(id);
+    btnProcessar.disabled = true;
+    btnSalvar.disabled = true;
+    btnImprimir.disabled = true;
+    zpl = null;
+    try {
+        const parametros = new URLSearchParams({ id: id, nome: arquivoCsv.name });
+        const resposta = await fetch(`/converter?${parametros}`, { method: "POST", body: arquivoCsv });
+        if (!resposta.ok) {
+            throw new Error(await mensagemDeErro(resposta));
+        }
+        nomeZpl = nomeDoArquivo(resposta);
+
+        // O corpo chega em pedaços enquanto o servidor converte
+        const partes = [];
+        let recebidos = 0;
+        const leitor = resposta.body.getReader();
+        for (;;) {
+            const { done, value } = await leitor.read();
+            if (done) {
+                break;
+            }
+            partes.push(value);
+            recebidos += value.length;
+        }
+        parar();
+        zpl = new Blob(partes, { type: "text/plain;charset=utf-8" });
+
+        const final = await fetch(`/progresso?id=${encodeURIComponent(id)}`).then(r => r.json());
+        mostrar(`Pronto: ${final.etiquetas} etiquetas, ${recebidos} bytes de ZPL`
+            + (final.ignoradas ? ` (${final.ignoradas} linhas ignoradas)` : ""));
+        btnSalvar.disabled = false;
+        btnImprimir.disabled = impressoras.length === 0;
+    } catch (erro) {
+        parar();
+        mostrar(`Erro: ${erro.message}`);
+    } finally {
+        btnProcessar.disabled = arquivoCsv === null;
+    }
+});
+
+btnSalvar.addEventListener("click", () => {
+    const link = document.createElement("a");
+    link.href = URL.createObjectURL(zpl);
+    link.download = nomeZpl;
+    document.body.appendChild(link);
+    link.click();
+    link.remove();
+    setTimeout(() => URL.revokeObjectURL(link.href), 0);
+});
+
+btnImprimir.addEventListener("click", async () => {
+    btnImprimir.disabled = true;
+    mostrar(`Enviando para ${impressoras[0]}...`);
+    try {
+        const parametros = new URLSearchParams({ impressora: impressoras[0] });
+        const resposta = await fetch(`/imprimir?${parametros}`, { method: "POST", body: zpl });
+        if (!resposta.ok) {
+            throw new Error(await mensagemDeErro(resposta));
+        }
+        const resultado = await resposta.json();
+        mostrar(`${resultado.etiquetas} etiquetas enviadas para ${resultado.impressora}`);
+    } catch (erro) {
+        mostrar(`Erro ao imprimir: ${erro.message}`);
+    } finally {
+        btnImprimir.disabled = false;
+    }
+});
+
+fetch("/config")
+    .then(resposta => resposta.json())
+    .then(config => { impressoras = config.impressoras || []; })
+    .catch(() => { impressoras = []; });